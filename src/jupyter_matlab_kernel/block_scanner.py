@@ -0,0 +1,220 @@
+# Copyright 2023 The MathWorks, Inc.
+# Scanner of the blocks of MATLAB code, used to tell whether code is complete
+# without a request to MATLAB
+
+import re
+
+# Number of spaces by which the body of a block is indented.
+INDENT = "    "
+
+# Keywords which open a block closed by "end".
+_BLOCK_KEYWORDS = frozenset(
+    ["if", "for", "parfor", "while", "switch", "try", "function", "spmd", "classdef"]
+)
+
+# Keywords which only open a block directly inside of another block. Elsewhere,
+# they are ordinary names, for example the function "properties".
+_NESTED_BLOCK_KEYWORDS = {
+    "properties": "classdef",
+    "methods": "classdef",
+    "events": "classdef",
+    "enumeration": "classdef",
+    "arguments": "function",
+}
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    |(?P<continuation>\.\.\.)
+    |(?P<comment>%)
+    |(?P<number>(?:\d+(?:\.(?!\.\.)\d*)?|\.\d+)(?:[eE][+-]?\d+)?[ij]?)
+    |(?P<word>[A-Za-z_]\w*)
+    |(?P<string>"(?:[^"]|"")*")
+    |(?P<unterminated>")
+    |(?P<open>[(\[{])
+    |(?P<close>[)\]}])
+    |(?P<quote>')
+    |(?P<transpose>\.')
+    |(?P<dot>\.)
+    |(?P<other>.)
+    """,
+    re.VERBOSE,
+)
+
+_CHAR_VECTOR_PATTERN = re.compile(r"'(?:[^']|'')*'")
+
+# Tokens after which a quote, without whitespace in between, is the transpose
+# operator instead of the start of a character vector.
+_TRANSPOSABLE_TOKENS = frozenset(["number", "word", "string", "close", "transpose"])
+
+
+class ScannerState:
+    """
+    State of the scanner after a number of complete lines.
+
+    Args:
+        blocks (Tuple(string)): Keywords of the open blocks, outermost first.
+        brackets (int): Number of open brackets, parentheses and braces.
+        block_comments (int): Depth of the open block comments.
+        is_continued (bool): Whether the last line ends with "...".
+        is_invalid (bool): Whether the code can not be valid whatever follows,
+                           for example because of an "end" without a block.
+    """
+
+    __slots__ = ("blocks", "brackets", "block_comments", "is_continued", "is_invalid")
+
+    def __init__(
+        self,
+        blocks=(),
+        brackets=0,
+        block_comments=0,
+        is_continued=False,
+        is_invalid=False,
+    ):
+        self.blocks = blocks
+        self.brackets = brackets
+        self.block_comments = block_comments
+        self.is_continued = is_continued
+        self.is_invalid = is_invalid
+
+    def copy(self):
+        return ScannerState(
+            self.blocks,
+            self.brackets,
+            self.block_comments,
+            self.is_continued,
+            self.is_invalid,
+        )
+
+
+class BlockScanner:
+    """
+    Tells whether MATLAB code is complete by tracking the blocks closed by "end",
+    line continuations, block comments, brackets and string literals. Used by
+    console frontends to decide whether to execute the code when Enter is pressed.
+
+    The state after the complete lines of the last scanned code is kept, so that
+    code which grows line by line, as typed in a console, is scanned once.
+    """
+
+    def __init__(self):
+        self._prefix = ""
+        self._state = ScannerState()
+
+    def check(self, code):
+        """
+        Returns whether the code is complete.
+
+        Args:
+            code (string): MATLAB code.
+
+        Returns:
+            Tuple (string, string): Status, "complete", "incomplete" or "invalid",
+                                    and the indentation of the next line when the
+                                    status is "incomplete", else an empty string.
+        """
+        # Resume from the state after the complete lines scanned last time.
+        if self._prefix and code.startswith(self._prefix):
+            state = self._state.copy()
+            start = len(self._prefix)
+        else:
+            state = ScannerState()
+            start = 0
+
+        lines = code[start:].split("\n")
+        for line in lines[:-1]:
+            scan_line(line, state)
+        end_of_complete_lines = len(code) - len(lines[-1])
+        self._prefix = code[:end_of_complete_lines]
+        self._state = state.copy()
+        scan_line(lines[-1], state)
+
+        if state.is_invalid:
+            return "invalid", ""
+        if state.blocks or state.brackets or state.block_comments or state.is_continued:
+            return "incomplete", INDENT * len(state.blocks)
+        return "complete", ""
+
+
+def scan_line(line, state):
+    """
+    Updates the state of the scanner with a line of code.
+
+    Args:
+        line (string): Line of code, without the line break.
+        state (ScannerState): State after the previous lines, updated in place.
+    """
+    # Block comments start and end with lines which only contain "%{" and "%}".
+    stripped = line.strip()
+    if stripped == "%{":
+        state.block_comments += 1
+        state.is_continued = False
+        return
+    if state.block_comments:
+        if stripped == "%}":
+            state.block_comments -= 1
+        return
+
+    state.is_continued = False
+    previous = None
+    pos = 0
+    length = len(line)
+    while pos < length:
+        match = _TOKEN_PATTERN.match(line, pos)
+        kind = match.lastgroup
+        pos = match.end()
+
+        if kind == "space":
+            previous = "space"
+            continue
+        if kind == "comment":
+            return
+        if kind == "continuation":
+            state.is_continued = True
+            return
+
+        if kind == "quote":
+            if previous in _TRANSPOSABLE_TOKENS:
+                kind = "transpose"
+            else:
+                string_match = _CHAR_VECTOR_PATTERN.match(line, match.start())
+                if string_match is None:
+                    # Character vectors can not span lines.
+                    state.is_invalid = True
+                    return
+                pos = string_match.end()
+                kind = "string"
+        elif kind == "unterminated":
+            # Strings can not span lines.
+            state.is_invalid = True
+            return
+        elif kind == "word" and previous != "dot":
+            _scan_keyword(match.group(), state)
+        elif kind == "open":
+            state.brackets += 1
+        elif kind == "close":
+            if state.brackets == 0:
+                state.is_invalid = True
+            else:
+                state.brackets -= 1
+        previous = kind
+
+
+def _scan_keyword(word, state):
+    # "end" inside of brackets is an index, for example x(end).
+    if state.brackets:
+        return
+
+    if word == "end":
+        if state.blocks:
+            state.blocks = state.blocks[:-1]
+        else:
+            state.is_invalid = True
+    elif word in _BLOCK_KEYWORDS:
+        state.blocks = state.blocks + (word,)
+    elif (
+        word in _NESTED_BLOCK_KEYWORDS
+        and state.blocks
+        and state.blocks[-1] == _NESTED_BLOCK_KEYWORDS[word]
+    ):
+        state.blocks = state.blocks + (word,)
@@ -0,0 +1,129 @@
+# Copyright 2023 The MathWorks, Inc.
+# Cache of Tab completion results received from MATLAB
+
+import collections
+import re
+
+# Identifier which is being completed, i.e. the word just before the cursor.
+_TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class CompletionCache:
+    """
+    Least recently used cache of Tab completion results received from MATLAB.
+
+    Results are keyed on the code surrounding the identifier being completed.
+    When the user types more characters of the same identifier, the cached
+    matches are narrowed down locally instead of asking MATLAB again.
+
+    Args:
+        max_size (int): Maximum number of cached completion results. A value of
+                        0 disables the cache.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+
+    def get(self, code, cursor_pos):
+        """
+        Returns the cached completion results for the code, if available.
+
+        Args:
+            code (string): MATLAB code on which Tab completion is requested.
+            cursor_pos (int): Position of the cursor when Tab completion is requested.
+
+        Returns:
+            Dict: Tab completion results in the format returned by
+                  mwi_comm_helpers.send_completion_request_to_matlab, or None
+                  if the results are not cached.
+        """
+        key, token, token_start = self._get_key(code, cursor_pos)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        cached_token, cached_results = entry
+        if token == cached_token:
+            results = _copy_results(cached_results)
+        elif (
+            cached_token
+            and token.startswith(cached_token)
+            and cached_results["start"] == token_start
+        ):
+            # The user typed more characters of the identifier which was completed
+            # earlier. Narrow down the earlier matches to the longer prefix.
+            results = _refine_results(cached_results, token, cursor_pos)
+            if not results["matches"]:
+                return None
+        else:
+            return None
+
+        self._entries.move_to_end(key)
+        return results
+
+    def put(self, code, cursor_pos, results):
+        """
+        Stores the completion results received from MATLAB for the code.
+
+        Args:
+            code (string): MATLAB code on which Tab completion was requested.
+            cursor_pos (int): Position of the cursor when Tab completion was requested.
+            results (dict): Tab completion results received from MATLAB.
+        """
+        if self.max_size <= 0:
+            return
+
+        key, token, _ = self._get_key(code, cursor_pos)
+        self._entries[key] = (token, _copy_results(results))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all cached completion results. Needs to be called whenever code
+        is executed in MATLAB, since the results depend on the MATLAB workspace.
+        """
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _get_key(code, cursor_pos):
+        # The key is the code before and after the identifier under completion,
+        # so that requests for longer prefixes of the same identifier share the
+        # same key.
+        match = _TOKEN_PATTERN.search(code, 0, cursor_pos)
+        token = match.group() if match else ""
+        token_start = cursor_pos - len(token)
+        return (code[:token_start], code[cursor_pos:]), token, token_start
+
+
+def _copy_results(results):
+    return {
+        "matches": list(results["matches"]),
+        "start": results["start"],
+        "end": results["end"],
+        "completions": [dict(completion) for completion in results["completions"]],
+    }
+
+
+def _refine_results(results, token, cursor_pos):
+    prefix = token.lower()
+    completions = []
+    for completion in results["completions"]:
+        if completion["text"].lower().startswith(prefix):
+            completion = dict(completion)
+            completion["end"] = cursor_pos
+            completions.append(completion)
+
+    return {
+        "matches": [
+            match for match in results["matches"] if match.lower().startswith(prefix)
+        ],
+        "start": results["start"],
+        "end": cursor_pos,
+        "completions": completions,
+    }
@@ -0,0 +1,148 @@
+# Copyright 2023 The MathWorks, Inc.
+# This file lists and exposes the environment variables which are used to
+# configure the MATLAB Kernel.
+
+import os
+
+
+def get_env_name_http_pool_size():
+    """Specifies the number of keep-alive HTTP connections each kernel keeps open to matlab-proxy"""
+    return "MWI_KERNEL_HTTP_POOL_SIZE"
+
+
+def get_env_name_http_max_retries():
+    """Specifies how many times a request is retried when the connection to matlab-proxy fails"""
+    return "MWI_KERNEL_HTTP_MAX_RETRIES"
+
+
+def get_env_name_stream_outputs():
+    """Set to true to publish the outputs of each section of a cell while MATLAB is still executing the cell"""
+    return "MWI_KERNEL_STREAM_OUTPUTS"
+
+
+def get_env_name_completion_cache_size():
+    """Specifies the number of Tab completion results cached by each kernel. Set to 0 to disable the cache"""
+    return "MWI_KERNEL_COMPLETION_CACHE_SIZE"
+
+
+def get_env_name_matlab_startup_timeout():
+    """Specifies the number of seconds to wait for MATLAB to start once licensing information is available"""
+    return "MWI_KERNEL_MATLAB_STARTUP_TIMEOUT"
+
+
+def get_env_name_eager_start():
+    """Set to true to wait for MATLAB to start in the background as soon as the kernel starts, instead of on the first execution request"""
+    return "MWI_KERNEL_EAGER_START"
+
+
+def get_env_name_figure_format():
+    """Specifies the image format of figures. Supported values are png and jpeg"""
+    return "MWI_KERNEL_FIGURE_FORMAT"
+
+
+def get_env_name_figure_max_width():
+    """Specifies the maximum width of figures in pixels. Larger figures are scaled down"""
+    return "MWI_KERNEL_FIGURE_MAX_WIDTH"
+
+
+def get_env_name_figure_max_height():
+    """Specifies the maximum height of figures in pixels. Larger figures are scaled down"""
+    return "MWI_KERNEL_FIGURE_MAX_HEIGHT"
+
+
+def get_env_name_figure_jpeg_quality():
+    """Specifies the quality, between 1 and 100, of figures when the figure format is jpeg"""
+    return "MWI_KERNEL_FIGURE_JPEG_QUALITY"
+
+
+def get_env_name_deduplicate_figures():
+    """Set to false to publish identical figures more than once in the outputs of a cell"""
+    return "MWI_KERNEL_DEDUPLICATE_FIGURES"
+
+
+def get_env_name_metrics_dir():
+    """Specifies the folder to which each kernel periodically writes the latency histograms of its requests"""
+    return "MWI_KERNEL_METRICS_DIR"
+
+
+def get_env_name_metrics_format():
+    """Specifies the format of the metrics files. Supported values are prometheus and json"""
+    return "MWI_KERNEL_METRICS_FORMAT"
+
+
+def get_env_name_metrics_interval():
+    """Specifies the minimum number of seconds between writes of the metrics file of a kernel"""
+    return "MWI_KERNEL_METRICS_INTERVAL"
+
+
+def get_env_name_fair_scheduling():
+    """Set to true to send the requests of all the kernels sharing a MATLAB in a fair order, with Tab completion ahead of executions"""
+    return "MWI_KERNEL_FAIR_SCHEDULING"
+
+
+def get_env_name_session_pool_size():
+    """Specifies the number of warm MATLAB sessions kept ready for new kernels. Set to a positive number to give each kernel a dedicated MATLAB"""
+    return "MWI_KERNEL_SESSION_POOL_SIZE"
+
+
+def get_env_name_execute_batch_size():
+    """Specifies the maximum number of queued cells executed by MATLAB in a single request. Set to 1 to disable batching"""
+    return "MWI_KERNEL_EXECUTE_BATCH_SIZE"
+
+
+def get_env_name_max_stream_output():
+    """Specifies the maximum number of characters of stream outputs published per cell. Set to 0 to disable the limit"""
+    return "MWI_KERNEL_MAX_STREAM_OUTPUT"
+
+
+def get_env_name_stream_flush_interval():
+    """Specifies the minimum number of milliseconds between two stream messages. Outputs received in the meantime are merged"""
+    return "MWI_KERNEL_STREAM_FLUSH_INTERVAL"
+
+
+def get_env_name_stream_overflow_dir():
+    """Specifies the folder to which the stream outputs beyond the limit per cell are written"""
+    return "MWI_KERNEL_STREAM_OVERFLOW_DIR"
+
+
+def get_env_name_json_decoder():
+    """Specifies the JSON library used to decode responses from MATLAB. Supported values are auto, orjson, ujson and json"""
+    return "MWI_KERNEL_JSON_DECODER"
+
+
+def get_env_name_history_file():
+    """Specifies the SQLite database in which the history of the code executed by the kernels is stored"""
+    return "MWI_KERNEL_HISTORY_FILE"
+
+
+def get_env_name_health_check_interval():
+    """Specifies the number of seconds between two checks of the status of MATLAB in the background. Set to 0 to disable the checks"""
+    return "MWI_KERNEL_HEALTH_CHECK_INTERVAL"
+
+
+def is_env_set_to_true(env_name):
+    """
+    Returns True if the value of an environment variable is a case insensitive
+    match to the string "True".
+
+    Args:
+        env_name (string): Name of the environment variable.
+    """
+    return os.environ.get(env_name, "false").lower() == "true"
+
+
+def get_int(env_name, default):
+    """
+    Returns the value of an environment variable as an integer.
+
+    Args:
+        env_name (string): Name of the environment variable.
+        default (int): Value to return when the variable is unset or not a valid integer.
+
+    Returns:
+        int: Value of the environment variable.
+    """
+    try:
+        return int(os.environ[env_name])
+    except (KeyError, ValueError):
+        return default
@@ -0,0 +1,128 @@
+# Copyright 2023 The MathWorks, Inc.
+# Options and bookkeeping for the figures which MATLAB sends to the notebook
+
+import hashlib
+import os
+
+from jupyter_matlab_kernel import environment_variables as kernel_env
+
+SUPPORTED_FIGURE_FORMATS = ("png", "jpeg")
+DEFAULT_FIGURE_FORMAT = "png"
+DEFAULT_FIGURE_JPEG_QUALITY = 75
+
+
+def get_figure_options():
+    """
+    Returns the figure options configured using environment variables, in the
+    format expected by +jupyter/execute.m. Only the options which differ from
+    the defaults are returned, so that figures are sent as captured by MATLAB
+    when nothing is configured.
+
+    Returns:
+        dict: Figure options to be sent along with the execution request.
+    """
+    options = {}
+
+    figure_format = os.environ.get(
+        kernel_env.get_env_name_figure_format(), DEFAULT_FIGURE_FORMAT
+    ).lower()
+    if figure_format == "jpg":
+        figure_format = "jpeg"
+    if figure_format in SUPPORTED_FIGURE_FORMATS and figure_format != "png":
+        options["figureFormat"] = figure_format
+        options["figureQuality"] = min(
+            max(
+                kernel_env.get_int(
+                    kernel_env.get_env_name_figure_jpeg_quality(),
+                    DEFAULT_FIGURE_JPEG_QUALITY,
+                ),
+                1,
+            ),
+            100,
+        )
+
+    max_width = kernel_env.get_int(kernel_env.get_env_name_figure_max_width(), 0)
+    if max_width > 0:
+        options["figureMaxWidth"] = max_width
+
+    max_height = kernel_env.get_int(kernel_env.get_env_name_figure_max_height(), 0)
+    if max_height > 0:
+        options["figureMaxHeight"] = max_height
+
+    return options
+
+
+def is_figure_deduplication_enabled():
+    """Returns False if deduplication of figures has been disabled by the user."""
+    return (
+        os.environ.get(kernel_env.get_env_name_deduplicate_figures(), "true").lower()
+        == "true"
+    )
+
+
+class FigureTracker:
+    """
+    Keeps track of the figures published while executing a cell.
+
+    Identical figures in the same cell are only published once, and the number
+    of bytes saved by resizing, re-encoding and deduplicating the figures is
+    accumulated so that it can be reported once the cell is executed.
+
+    Args:
+        deduplicate (bool): Whether to skip figures which were already published
+                            while executing the current cell.
+    """
+
+    def __init__(self, deduplicate=True):
+        self.deduplicate = deduplicate
+        self.reset()
+
+    def reset(self):
+        """Starts tracking the figures of a new cell."""
+        self._hashes = set()
+        self.figure_count = 0
+        self.duplicate_count = 0
+        self.bytes_saved = 0
+
+    def track(self, out):
+        """
+        Records an output received from MATLAB.
+
+        Args:
+            out (dict): An output of type "execute_result", as returned by MATLAB.
+
+        Returns:
+            bool: False if the output is a figure which was already published
+                  while executing the current cell, True otherwise.
+        """
+        images = [
+            value
+            for mimetype, value in zip(out["mimetype"], out["value"])
+            if mimetype.startswith("image/")
+        ]
+        if not images:
+            return True
+
+        size = sum(len(image) for image in images)
+
+        # MATLAB sends the size of the figure as captured, if the figure was
+        # resized or re-encoded.
+        original_size = out.get("originalSize")
+        if original_size:
+            self.bytes_saved += max(original_size - size, 0)
+
+        if self.deduplicate:
+            digest = hashlib.sha1()
+            for mimetype, value in zip(out["mimetype"], out["value"]):
+                digest.update(mimetype.encode("utf-8"))
+                digest.update(value.encode("utf-8"))
+            figure_hash = digest.hexdigest()
+
+            if figure_hash in self._hashes:
+                self.duplicate_count += 1
+                self.bytes_saved += size
+                return False
+            self._hashes.add(figure_hash)
+
+        self.figure_count += 1
+        return True
@@ -0,0 +1,334 @@
+# Copyright 2023 The MathWorks, Inc.
+# Watchdog which keeps the status of MATLAB up to date in the background, and
+# circuit breaker which fails executions fast while MATLAB is known to be down
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from jupyter_matlab_kernel import mwi_comm_helpers
+
+# Default number of seconds between two checks of the status of MATLAB while
+# MATLAB is available.
+DEFAULT_HEALTH_CHECK_INTERVAL = 30
+
+# Number of seconds between two checks of the status of MATLAB while MATLAB is
+# down, so that executions resume soon after MATLAB is up again.
+RECOVERY_CHECK_INTERVAL = 2
+
+# Number of seconds after which a status check of another kernel which did not
+# complete is considered abandoned.
+CHECK_LOCK_TIMEOUT = 10
+
+# Minimum number of seconds between two iterations of the watchdog.
+_MIN_WAIT = 0.1
+
+
+def get_status_file(runtime_dir, url):
+    """
+    Returns the file through which the kernels using the matlab-proxy at the
+    given url share its status.
+    """
+    digest = hashlib.sha1(url.encode()).hexdigest()[:16]
+    return os.path.join(runtime_dir, f"jupyter_matlab_kernel-status-{digest}.json")
+
+
+class HealthMonitor:
+    """
+    Keeps a timestamped status of MATLAB up to date on a background thread, and
+    trips a circuit breaker while MATLAB is known to be down, so that executions
+    fail in milliseconds instead of waiting for MATLAB to start.
+
+    The breaker trips when a request to matlab-proxy fails, when matlab-proxy
+    does not respond or reports an error, or when MATLAB goes down after having
+    been up. It resets once MATLAB is up or starting, or waits for licensing
+    information, according to a status checked after the breaker tripped.
+
+    The kernels using the same matlab-proxy share its status through a file. A
+    kernel only checks the status itself when the shared status is older than
+    the check interval, so that matlab-proxy is checked about once per interval
+    whatever the number of kernels.
+
+    Args:
+        url (string): Url of matlab-proxy.
+        headers (dict): HTTP headers required for communicating with matlab-proxy.
+        status_file (string): File through which the status is shared with other
+                              kernels, or None to not share it.
+        interval (int): Number of seconds between two checks of the status while
+                        MATLAB is available. The watchdog and the breaker are
+                        disabled if it is not positive.
+        on_down (callable): Optional function called when a status in which
+                            MATLAB is not up is recorded, for example because
+                            MATLAB is restarting. It may be called on the
+                            watchdog thread.
+    """
+
+    def __init__(self, url, headers, status_file=None, interval=None, on_down=None):
+        self.url = url
+        self.headers = headers
+        self.status_file = status_file
+        self.interval = DEFAULT_HEALTH_CHECK_INTERVAL if interval is None else interval
+        self.on_down = on_down
+
+        # Status of MATLAB, as a dict with the time at which it was checked.
+        self.status = None
+        self.is_tripped = False
+        self.trip_reason = None
+        self._trip_time = None
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+
+        # Status checks are not retried, a failed check is a verdict.
+        self._http_session = mwi_comm_helpers.create_http_session(
+            pool_size=1, max_retries=0
+        )
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def start(self):
+        """Starts the watchdog thread."""
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="matlab-kernel-watchdog", daemon=True
+            )
+            self._thread.start()
+
+    def close(self):
+        """Stops the watchdog thread."""
+        self._closed = True
+        self._wakeup.set()
+        self._http_session.close()
+
+    def update(self, is_matlab_licensed, matlab_status, matlab_proxy_has_error):
+        """
+        Records a status of MATLAB fetched by the kernel, and shares it with the
+        other kernels.
+        """
+        status = _make_status(is_matlab_licensed, matlab_status, matlab_proxy_has_error)
+        self._apply(status)
+        self._share(status)
+
+    def trip(self, error):
+        """
+        Trips the breaker after a request to matlab-proxy failed. The status of
+        MATLAB is checked right away by the watchdog.
+
+        Args:
+            error (Exception): Error of the failed request.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if not self.is_tripped:
+                self._set_tripped(f"A request to MATLAB failed. {error}".strip())
+        self._wakeup.set()
+
+    def get_failure(self):
+        """
+        Returns the message explaining why MATLAB is not available while the
+        breaker is tripped, else None.
+        """
+        with self._lock:
+            if not self.is_tripped:
+                return None
+            reason = self.trip_reason
+            status = self.status
+            trip_time = self._trip_time
+
+        checked = ""
+        if status is not None and status["time"] >= trip_time:
+            reason = _describe(status)
+            checked = f" (checked {time.time() - status['time']:.0f} s ago)"
+        return (
+            "Error: MATLAB is not available.\n"
+            f"Reason: {reason}{checked}\n"
+            "The kernel checks the status of MATLAB in the background, and "
+            "executions resume as soon as MATLAB is up. Check the status of MATLAB "
+            'by clicking the "Open MATLAB" button.'
+        )
+
+    def check(self):
+        """
+        Brings the status of MATLAB up to date, from the status shared by another
+        kernel if it is recent enough, else from matlab-proxy.
+        """
+        shared = self._read_shared_status()
+        if shared is not None and shared["time"] > self._get_status_time():
+            self._apply(shared)
+
+        # A status from before the breaker tripped does not tell whether MATLAB
+        # is available again. The breaker may trip at the same time, hence its
+        # state is read under the lock.
+        with self._lock:
+            status_time = self._get_status_time()
+            is_tripped = self.is_tripped
+            trip_time = self._trip_time
+        interval = RECOVERY_CHECK_INTERVAL if is_tripped else self.interval
+        if time.time() - status_time < interval and not (
+            is_tripped and status_time < trip_time
+        ):
+            return
+
+        # Only one of the kernels sharing the status checks it at a time. The
+        # other kernels read the status once it is shared.
+        if not self._acquire_check_lock():
+            return
+        try:
+            status = self._fetch_status()
+            self._apply(status)
+            self._share(status)
+        finally:
+            self._release_check_lock()
+
+    def _run(self):
+        while not self._closed:
+            try:
+                self.check()
+            except Exception:
+                # The watchdog must outlive any unexpected error.
+                pass
+            wait = self._get_check_interval() - (time.time() - self._get_status_time())
+            self._wakeup.wait(max(wait, _MIN_WAIT))
+            self._wakeup.clear()
+
+    def _get_check_interval(self):
+        return RECOVERY_CHECK_INTERVAL if self.is_tripped else self.interval
+
+    def _get_status_time(self):
+        status = self.status
+        return 0 if status is None else status["time"]
+
+    def _fetch_status(self):
+        try:
+            return _make_status(
+                *mwi_comm_helpers.fetch_matlab_proxy_status(
+                    self.url, self.headers, self._http_session
+                )
+            )
+        except Exception as e:
+            return _make_status(
+                False,
+                None,
+                False,
+                f"matlab-proxy did not respond ({type(e).__name__}).",
+            )
+
+    def _apply(self, status):
+        with self._lock:
+            is_applied = self._apply_locked(status)
+        if is_applied and self.on_down is not None and status["matlab_status"] != "up":
+            self.on_down()
+
+    def _apply_locked(self, status):
+        previous = self.status
+        if previous is not None and status["time"] < previous["time"]:
+            return False
+        self.status = status
+        if not self.enabled:
+            return True
+
+        went_down = (
+            status["matlab_status"] == "down"
+            and status["is_matlab_licensed"]
+            and previous is not None
+            and previous["matlab_status"] == "up"
+        )
+        if _is_unreachable(status) or went_down:
+            if not self.is_tripped:
+                self._set_tripped(_describe(status), status["time"])
+        elif self.is_tripped and status["time"] >= self._trip_time:
+            if (
+                status["matlab_status"] in ("up", "starting")
+                or not status["is_matlab_licensed"]
+            ):
+                self.is_tripped = False
+                self.trip_reason = None
+        return True
+
+    def _set_tripped(self, reason, trip_time=None):
+        self.is_tripped = True
+        self.trip_reason = reason
+        self._trip_time = time.time() if trip_time is None else trip_time
+
+    def _acquire_check_lock(self):
+        if self.status_file is None:
+            return True
+        lock_file = self.status_file + ".lock"
+        try:
+            if time.time() - os.path.getmtime(lock_file) > CHECK_LOCK_TIMEOUT:
+                os.remove(lock_file)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(lock_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+            return True
+        except OSError:
+            return False
+
+    def _release_check_lock(self):
+        if self.status_file is None:
+            return
+        try:
+            os.remove(self.status_file + ".lock")
+        except OSError:
+            pass
+
+    def _read_shared_status(self):
+        if self.status_file is None:
+            return None
+        try:
+            with open(self.status_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _share(self, status):
+        # The file is replaced atomically, so that readers never see a partially
+        # written status.
+        if self.status_file is None:
+            return
+        try:
+            fd, temp_file = tempfile.mkstemp(
+                dir=os.path.dirname(self.status_file), suffix=".tmp"
+            )
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(status, f)
+            os.replace(temp_file, self.status_file)
+        except OSError:
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+
+
+def _make_status(is_matlab_licensed, matlab_status, matlab_proxy_has_error, error=None):
+    return {
+        "time": time.time(),
+        "is_matlab_licensed": is_matlab_licensed,
+        "matlab_status": matlab_status,
+        "matlab_proxy_has_error": matlab_proxy_has_error,
+        "error": error,
+    }
+
+
+def _is_unreachable(status):
+    return status["error"] is not None or status["matlab_proxy_has_error"]
+
+
+def _describe(status):
+    if status["error"] is not None:
+        return status["error"]
+    if status["matlab_proxy_has_error"]:
+        return "matlab-proxy reported an error."
+    return f"MATLAB is {status['matlab_status']}."
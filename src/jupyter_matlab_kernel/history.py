@@ -0,0 +1,274 @@
+# Copyright 2023 The MathWorks, Inc.
+# Persistent history of the code executed by the MATLAB kernels, kept across
+# kernel restarts in a SQLite database
+
+import functools
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from jupyter_matlab_kernel import environment_variables as kernel_env
+
+# Maximum number of entries written to the database in a single transaction.
+WRITE_BATCH_SIZE = 256
+
+# Number of entries returned by "tail" requests which do not specify it.
+DEFAULT_TAIL_SIZE = 10
+
+# Entries are indexed by session and line, for "tail" and "range" requests, and
+# by source, for "search" requests with a pattern which starts with literal text.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session INTEGER PRIMARY KEY AUTOINCREMENT,
+    start REAL
+);
+CREATE TABLE IF NOT EXISTS history (
+    session INTEGER,
+    line INTEGER,
+    source TEXT,
+    PRIMARY KEY (session, line)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS history_source ON history (source);
+"""
+
+# Queued to stop the background thread.
+_CLOSE = object()
+
+
+def get_history_file():
+    """
+    Returns the path of the database of the history, shared by all the kernels
+    of the user, or None if the Jupyter data directory is not known.
+    """
+    history_file = os.environ.get(kernel_env.get_env_name_history_file())
+    if history_file:
+        return history_file
+
+    try:
+        from jupyter_core.paths import jupyter_data_dir
+    except ImportError:
+        return None
+    return os.path.join(jupyter_data_dir(), "jupyter_matlab_kernel", "history.sqlite")
+
+
+class HistoryStore:
+    """
+    History of the code executed by a kernel, stored in a SQLite database.
+
+    The database is only accessed by a background thread, so that storing the
+    code of an execution only queues it. Queries are queued behind the pending
+    writes, hence they always see the code stored before them.
+
+    Each kernel is a new session of the history. Lines are numbered by the
+    execution count of the kernel.
+    """
+
+    def __init__(self, history_file):
+        self.history_file = history_file
+        self.session = None
+        self._queue = queue.Queue()
+        self._thread = None
+        if history_file is not None:
+            self._thread = threading.Thread(
+                target=self._run, name="matlab-kernel-history", daemon=True
+            )
+            self._thread.start()
+
+    @property
+    def enabled(self):
+        return self._thread is not None
+
+    def store(self, line, source):
+        """
+        Queues the code of an execution to be written to the database.
+
+        Args:
+            line (int): Execution count of the code.
+            source (string): The code.
+        """
+        if self.enabled:
+            self._queue.put((line, source))
+
+    def request(
+        self,
+        hist_access_type,
+        session=None,
+        start=None,
+        stop=None,
+        n=None,
+        pattern=None,
+        unique=False,
+    ):
+        """
+        Queues a query of the history, as defined by the history request of the
+        Jupyter messaging protocol.
+
+        Args:
+            hist_access_type (string): "tail", "range" or "search".
+            session (int): For "range", the session to query. 0 or None is the
+                           current session, and negative values are relative to
+                           the current session.
+            start (int): For "range", the first line.
+            stop (int): For "range", the line after the last line, or None for
+                        all the lines after the first line.
+            n (int): For "tail" and "search", the maximum number of entries.
+            pattern (string): For "search", glob pattern matched against the code.
+            unique (bool): For "search", whether to omit duplicated code.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the list of entries, each a
+                                       tuple of session, line and code, in the
+                                       order in which the code was executed.
+        """
+        future = Future()
+        if hist_access_type == "tail":
+            query = functools.partial(self._get_tail, n=n)
+        elif hist_access_type == "range":
+            query = functools.partial(
+                self._get_range, session=session, start=start, stop=stop
+            )
+        elif hist_access_type == "search":
+            query = functools.partial(self._search, pattern=pattern, n=n, unique=unique)
+        else:
+            query = None
+
+        if self.enabled and query is not None:
+            self._queue.put(functools.partial(_answer, future, query))
+        else:
+            future.set_result([])
+        return future
+
+    def close(self, timeout=1):
+        """
+        Writes the pending entries and stops the background thread.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait for the writes.
+        """
+        if self.enabled:
+            self._queue.put(_CLOSE)
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            connection = self._connect()
+        except (OSError, sqlite3.Error):
+            # The history is not stored, but the kernel is unaffected.
+            self._thread = None
+            self._drain()
+            return
+
+        # The queue holds entries, as tuples of line and code, queries, as
+        # callables, and _CLOSE once the store is closed.
+        next_item = None
+        try:
+            while True:
+                item = next_item if next_item is not None else self._queue.get()
+                next_item = None
+                if item is _CLOSE:
+                    return
+                if callable(item):
+                    item(connection)
+                    continue
+
+                # Write the consecutive pending entries in a single transaction.
+                entries = [(self.session,) + item]
+                while len(entries) < WRITE_BATCH_SIZE:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if not isinstance(item, tuple):
+                        next_item = item
+                        break
+                    entries.append((self.session,) + item)
+                try:
+                    with connection:
+                        connection.executemany(
+                            "INSERT OR REPLACE INTO history VALUES (?, ?, ?)",
+                            entries,
+                        )
+                except sqlite3.Error:
+                    pass
+        finally:
+            connection.close()
+            self._drain()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.history_file)), exist_ok=True)
+        connection = sqlite3.connect(self.history_file, timeout=10)
+        # Kernels of the same user share the database. The write-ahead log lets
+        # a kernel read while another kernel writes.
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with connection:
+            connection.executescript(_SCHEMA)
+            self.session = connection.execute(
+                "INSERT INTO sessions (start) VALUES (?)", (time.time(),)
+            ).lastrowid
+        return connection
+
+    def _drain(self):
+        # Queries queued after the store was closed get no entries.
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if callable(item):
+                item(None)
+
+    def _get_tail(self, connection, n):
+        rows = connection.execute(
+            "SELECT session, line, source FROM history "
+            "ORDER BY session DESC, line DESC LIMIT ?",
+            (DEFAULT_TAIL_SIZE if n is None else n,),
+        ).fetchall()
+        rows.reverse()
+        return rows
+
+    def _get_range(self, connection, session, start, stop):
+        if not session or session < 0:
+            session = self.session + (session or 0)
+        query = (
+            "SELECT session, line, source FROM history WHERE session = ? AND line >= ?"
+        )
+        args = (session, start or 0)
+        if stop is not None:
+            query += " AND line < ?"
+            args += (stop,)
+        return connection.execute(query + " ORDER BY line", args).fetchall()
+
+    def _search(self, connection, pattern, n, unique):
+        cursor = connection.execute(
+            "SELECT session, line, source FROM history WHERE source GLOB ? "
+            "ORDER BY session DESC, line DESC",
+            (pattern or "*",),
+        )
+        # Rows are read from the most recent, and only until n are found.
+        rows = []
+        sources = set()
+        for row in cursor:
+            if unique:
+                if row[2] in sources:
+                    continue
+                sources.add(row[2])
+            rows.append(row)
+            if n is not None and len(rows) >= n:
+                break
+        cursor.close()
+        rows.reverse()
+        return rows
+
+
+def _answer(future, query, connection):
+    if connection is None:
+        future.set_result([])
+        return
+    try:
+        future.set_result(query(connection))
+    except sqlite3.Error as e:
+        future.set_exception(e)
@@ -0,0 +1,79 @@
+# Copyright 2023 The MathWorks, Inc.
+# Decoding of the JSON responses received from matlab-proxy
+
+import importlib
+import os
+
+from jupyter_matlab_kernel import environment_variables as kernel_env
+
+# JSON libraries which can decode responses, fastest first. Only the standard
+# library is a dependency of the kernel, the others are used when installed.
+SUPPORTED_JSON_DECODERS = ("orjson", "ujson", "json")
+
+_decoder = None
+
+
+def get_json_decoder(name=None):
+    """
+    Returns the name and the function of the JSON library used to decode responses.
+
+    Args:
+        name (string): Name of the library, one of SUPPORTED_JSON_DECODERS or
+                       "auto" for the fastest installed library. Defaults to
+                       the value of MWI_KERNEL_JSON_DECODER or "auto".
+
+    Returns:
+        Tuple (string, callable): Name of the library, and a function which
+                                  decodes JSON from bytes or a string.
+    """
+    if name is None:
+        name = os.environ.get(kernel_env.get_env_name_json_decoder(), "auto").lower()
+
+    # Fallback to the fastest installed library if the requested one is unknown
+    # or not installed.
+    candidates = SUPPORTED_JSON_DECODERS
+    if name in SUPPORTED_JSON_DECODERS:
+        candidates = (name,) + SUPPORTED_JSON_DECODERS
+
+    for candidate in candidates:
+        try:
+            module = importlib.import_module(candidate)
+        except ImportError:
+            continue
+        return candidate, module.loads
+
+
+def loads(data):
+    """
+    Decodes JSON with the configured library. Decoding from the bytes of a
+    response avoids a decoded copy of the response as a string.
+
+    Args:
+        data (bytes or string): JSON encoded data.
+
+    Returns:
+        Any: The decoded data.
+    """
+    global _decoder
+    if _decoder is None:
+        _, _decoder = get_json_decoder()
+    return _decoder(data)
+
+
+def decode_response(resp, key):
+    """
+    Returns the responses of one type from the JSON body of a response of the
+    MVM endpoint of matlab-proxy. Other parts of the body are released as soon
+    as the body is decoded.
+
+    Args:
+        resp (requests.Response): Response of the MVM endpoint.
+        key (string): Type of the responses, for example "FEvalResponse".
+
+    Returns:
+        List(dict): The responses of the type, in request order.
+
+    Raises:
+        KeyError: Occurs when the body does not contain responses of the type.
+    """
+    return loads(resp.content)["messages"][key]
@@ -2,17 +2,84 @@
 # Implementation of MATLAB Kernel
 
 # Import Python Standard Library
+import asyncio
+import functools
+import json
 import os
+import secrets
 import sys
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Import Dependencies
 import ipykernel.kernelbase
+from ipykernel.comm import CommManager
 import psutil
 import requests
 from requests.exceptions import HTTPError
 
+from jupyter_matlab_kernel import environment_variables as kernel_env
 from jupyter_matlab_kernel import mwi_comm_helpers
+from jupyter_matlab_kernel import figures, health, history, metrics, scheduler
+from jupyter_matlab_kernel import session_pool, streams
+from jupyter_matlab_kernel import block_scanner, workspace_cache
+from jupyter_matlab_kernel.completion_cache import CompletionCache
+
+# Interval in seconds at which the outputs file of a streaming execution is read.
+STREAMING_POLL_INTERVAL = 0.1
+
+# Default number of Tab completion results cached by the kernel.
+DEFAULT_COMPLETION_CACHE_SIZE = 128
+
+# Default time in seconds to wait for MATLAB to start once licensing information
+# is available.
+DEFAULT_MATLAB_STARTUP_TIMEOUT = 120
+
+# Intervals in seconds at which the status of matlab-proxy is polled while waiting
+# for MATLAB to start. The interval grows by STARTUP_POLL_BACKOFF after every poll
+# up to STARTUP_POLL_MAX_INTERVAL while MATLAB is starting, and up to
+# LICENSING_POLL_MAX_INTERVAL while waiting for the user to provide licensing
+# information.
+STARTUP_POLL_INITIAL_INTERVAL = 0.1
+STARTUP_POLL_MAX_INTERVAL = 0.5
+LICENSING_POLL_MAX_INTERVAL = 2.0
+STARTUP_POLL_BACKOFF = 1.5
+
+# Name of the comm target through which the frontend requests pages of the rows
+# of large variables, and the number of rows in a page.
+VARIABLE_PAGER_TARGET = "jupyter_matlab_kernel.variable_pager"
+DEFAULT_VARIABLE_PAGE_SIZE = 20
+MAX_VARIABLE_PAGE_SIZE = 1000
+
+# Since ipykernel 7, shell messages are handed to Kernel.shell_main before they
+# wait for their turn, which lets the kernel see the execution requests queued
+# behind the cell being executed. Batching is disabled with earlier versions.
+HAS_SHELL_MAIN_HOOK = hasattr(ipykernel.kernelbase.Kernel, "shell_main")
+
+# Shell messages which are handled right away while a cell is being executed,
+# instead of waiting for the execution to complete. They do not execute code.
+CONCURRENT_SHELL_MESSAGES = frozenset(
+    ["complete_request", "inspect_request", "kernel_info_request"]
+)
+
+# Interval at which a request checks whether it is its turn to be sent to MATLAB,
+# and the time after which the user is told that the execution is waiting.
+SCHEDULER_POLL_INTERVAL = 0.01
+SCHEDULER_WAIT_NOTICE_DELAY = 1
+
+# Number of seconds to wait for the matlab-proxy of a MATLAB session from the
+# pool to accept requests.
+MATLAB_PROXY_STARTUP_TIMEOUT = 60
+
+# Default maximum number of queued cells executed by MATLAB in a single request.
+# Batching is disabled by default.
+DEFAULT_EXECUTE_BATCH_SIZE = 1
+
+# Number of seconds after which the idle connection reserved for interrupts is
+# re-opened when an execution starts, as matlab-proxy and the Jupyter server
+# close idle connections.
+INTERRUPT_CONNECTION_IDLE_TIMEOUT = 30
 
 
 class MATLABConnectionError(Exception):
@@ -29,21 +96,60 @@ class MATLABConnectionError(Exception):
         super().__init__(message)
 
 
-def start_matlab_proxy():
+def _get_jupyter_server_pid():
+    # The kernel is spawned by the Jupyter server.
+    jupyter_server_pid = os.getppid()
+
+    # On Windows platforms using venv/virtualenv an intermediate python process spaws the kernel.
+    # jupyter_server ---spawns---> intermediate_process ---spawns---> jupyter_matlab_kernel
+    # Thus we need to go one level higher to acquire the process id of the jupyter server.
+    # Note: conda environments do not require this, and for these environments sys.prefix == sys.base_prefix
+    is_virtual_env = sys.prefix != sys.base_prefix
+    if sys.platform == "win32" and is_virtual_env:
+        jupyter_server_pid = psutil.Process(jupyter_server_pid).ppid()
+
+    return jupyter_server_pid
+
+
+def _get_jupyter_runtime_dir():
+    try:
+        from jupyter_core.paths import jupyter_runtime_dir
+
+        return jupyter_runtime_dir()
+    except ImportError:
+        return None
+
+
+def _find_jupyter_server(jupyter_server_pid):
     """
-    Start matlab-proxy registered with the jupyter server which started the
-    current kernel process.
+    Finds the information about the Jupyter server with the given process id.
 
-    Raises:
-        MATLABConnectionError: Occurs when kernel is not started by jupyter server.
-        HTTPError: Occurs when kernel cannot connect with matlab-proxy.
+    Jupyter servers write their information to a file named after their process
+    id in the Jupyter runtime directory. This file is read directly. Listing all
+    the running servers, which reads every file in the runtime directory, is only
+    used as a fallback.
+
+    Args:
+        jupyter_server_pid (int): Process id of the Jupyter server.
 
     Returns:
-        Tuple (string, string, dict):
-            url (string): Complete URL to send HTTP requests to matlab-proxy
-            base_url (string): Complete base url for matlab-proxy provided by jupyter server
-            headers (dict): HTTP headers required while sending HTTP requests to matlab-proxy
+        dict: Information about the Jupyter server, or None if it was not found.
     """
+    runtime_dir = _get_jupyter_runtime_dir()
+    if runtime_dir is not None:
+        # "jupyter_server" names the files jpserver-<pid>.json, while "notebook"
+        # names them nbserver-<pid>.json
+        for prefix in ("jpserver", "nbserver"):
+            server_file = os.path.join(
+                runtime_dir, f"{prefix}-{jupyter_server_pid}.json"
+            )
+            try:
+                with open(server_file, "r") as f:
+                    server = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if server.get("pid") == jupyter_server_pid:
+                return server
 
     nb_server_list = []
 
@@ -60,28 +166,174 @@ def start_matlab_proxy():
     except ImportError:
         pass
 
-    # Use parent process id of the kernel to filter Jupyter Server from the list.
-    jupyter_server_pid = os.getppid()
-
-    # On Windows platforms using venv/virtualenv an intermediate python process spaws the kernel.
-    # jupyter_server ---spawns---> intermediate_process ---spawns---> jupyter_matlab_kernel
-    # Thus we need to go one level higher to acquire the process id of the jupyter server.
-    # Note: conda environments do not require this, and for these environments sys.prefix == sys.base_prefix
-    is_virtual_env = sys.prefix != sys.base_prefix
-    if sys.platform == "win32" and is_virtual_env:
-        jupyter_server_pid = psutil.Process(jupyter_server_pid).ppid()
-
-    nb_server = dict()
-    found_nb_server = False
+    # Use process id to filter Jupyter Server from the list.
     for server in nb_server_list:
         if server["pid"] == jupyter_server_pid:
-            found_nb_server = True
-            nb_server = server
-            # Stop iterating over the server list
-            break
+            return server
+
+    return None
+
+
+def _get_session_pool_dir(jupyter_server_pid):
+    runtime_dir = _get_jupyter_runtime_dir()
+    if runtime_dir is None:
+        return None
+    return os.path.join(runtime_dir, f"jupyter_matlab_kernel-{jupyter_server_pid}-pool")
+
+
+def _wait_for_matlab_proxy(url, headers, session=None):
+    """
+    Waits until a matlab-proxy which has just been launched accepts requests.
+
+    Raises:
+        MATLABConnectionError: Occurs when matlab-proxy does not accept requests
+                               within MATLAB_PROXY_STARTUP_TIMEOUT seconds.
+    """
+    deadline = time.monotonic() + MATLAB_PROXY_STARTUP_TIMEOUT
+    while True:
+        try:
+            _verify_matlab_proxy(url, headers, session)
+            return
+        except requests.ConnectionError:
+            if time.monotonic() > deadline:
+                raise MATLABConnectionError(
+                    """
+                    Error: MATLAB Kernel could not communicate with MATLAB.\n
+                    Reason: The MATLAB session assigned to the kernel did not start.
+                    """
+                )
+            time.sleep(0.2)
+
+
+def _get_scheduler_queue_dir(jupyter_server_pid):
+    runtime_dir = _get_jupyter_runtime_dir()
+    if runtime_dir is None:
+        return None
+    return os.path.join(
+        runtime_dir, f"jupyter_matlab_kernel-{jupyter_server_pid}-queue"
+    )
+
+
+def _get_connection_cache_file(jupyter_server_pid):
+    runtime_dir = _get_jupyter_runtime_dir()
+    if runtime_dir is None:
+        return None
+    return os.path.join(runtime_dir, f"jupyter_matlab_kernel-{jupyter_server_pid}.json")
+
+
+def _read_connection_cache(jupyter_server_pid):
+    """
+    Reads the connection information to matlab-proxy which was resolved by a
+    previous kernel started by the same Jupyter server.
+
+    Returns:
+        Tuple (string, string, dict): url, base_url and headers, or None if not cached.
+    """
+    cache_file = _get_connection_cache_file(jupyter_server_pid)
+    if cache_file is None:
+        return None
+
+    try:
+        with open(cache_file, "r") as f:
+            cache = json.load(f)
+        return cache["url"], cache["base_url"], cache["headers"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _write_connection_cache(jupyter_server_pid, url, base_url, headers):
+    """
+    Writes the connection information to matlab-proxy, to be reused by kernels
+    started later by the same Jupyter server. The file contains the Jupyter
+    token, hence it is only readable by the current user, like the files which
+    Jupyter writes to the runtime directory.
+    """
+    cache_file = _get_connection_cache_file(jupyter_server_pid)
+    if cache_file is None:
+        return
+
+    try:
+        fd = os.open(cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"url": url, "base_url": base_url, "headers": headers}, f)
+    except OSError:
+        pass
+
+
+def _verify_matlab_proxy(url, headers, session=None):
+    """
+    Sends a request to matlab-proxy to make sure it is available. If matlab-proxy
+    is not started, jupyter-server starts it at this point. The small JSON
+    environment configuration of matlab-proxy is requested instead of its index
+    page.
+
+    Raises:
+        MATLABConnectionError: Occurs when the response is not from matlab-proxy.
+        HTTPError: Occurs when kernel cannot connect with matlab-proxy.
+    """
+    from jupyter_matlab_proxy.jupyter_config import config
+
+    http_client = requests if session is None else session
+    resp = http_client.get(url + "/get_env_config", headers=headers, verify=False)
+    if resp.status_code == requests.codes.OK:
+        # Verify that the response is the configuration of matlab-proxy started
+        # for Jupyter. An invalid Jupyter token results in a login page instead.
+        try:
+            env_config = resp.json()
+        except ValueError:
+            env_config = None
+        if (
+            not isinstance(env_config, dict)
+            or env_config.get("extension_name") != config["extension_name"]
+        ):
+            raise MATLABConnectionError(
+                """
+                Error: MATLAB Kernel could not communicate with MATLAB.
+                Reason: Possibly due to invalid jupyter security tokens.
+                """
+            )
+    else:
+        resp.raise_for_status()
+
+
+def start_matlab_proxy(session=None):
+    """
+    Start matlab-proxy registered with the jupyter server which started the
+    current kernel process.
+
+    The resolved connection information is cached in the Jupyter runtime directory
+    and reused by kernels which are started later by the same Jupyter server.
+
+    Args:
+        session (requests.Session): Optional session used to send the HTTP request.
+
+    Raises:
+        MATLABConnectionError: Occurs when kernel is not started by jupyter server.
+        HTTPError: Occurs when kernel cannot connect with matlab-proxy.
+
+    Returns:
+        Tuple (string, string, dict):
+            url (string): Complete URL to send HTTP requests to matlab-proxy
+            base_url (string): Complete base url for matlab-proxy provided by jupyter server
+            headers (dict): HTTP headers required while sending HTTP requests to matlab-proxy
+    """
+    jupyter_server_pid = _get_jupyter_server_pid()
+
+    # Reuse the connection information resolved by a previous kernel, if it is
+    # still valid.
+    cached_connection = _read_connection_cache(jupyter_server_pid)
+    if cached_connection is not None:
+        url, base_url, headers = cached_connection
+        try:
+            _verify_matlab_proxy(url, headers, session)
+            return url, base_url, headers
+        except (MATLABConnectionError, requests.RequestException):
+            pass
+
+    nb_server = _find_jupyter_server(jupyter_server_pid)
 
     # Error out if the server is not found!
-    if found_nb_server == False:
+    if nb_server is None:
         raise MATLABConnectionError(
             """
             Error: MATLAB Kernel for Jupyter was unable to find the notebook server from which it was spawned!\n
@@ -128,25 +380,9 @@ def start_matlab_proxy():
     else:
         headers = None
 
-    # This is content that is present in the matlab-proxy index.html page which
-    # can be used to validate a proper response.
-    matlab_proxy_index_page_identifier = "MWI_MATLAB_PROXY_IDENTIFIER"
-
-    # send request to the matlab-proxy endpoint to make sure it is available.
-    # If matlab-proxy is not started, jupyter-server starts it at this point.
-    resp = requests.get(url, headers=headers, verify=False)
-    if resp.status_code == requests.codes.OK:
-        # Verify that the returned value is correct
-        if matlab_proxy_index_page_identifier not in resp.text:
-            raise MATLABConnectionError(
-                """
-                Error: MATLAB Kernel could not communicate with MATLAB.
-                Reason: Possibly due to invalid jupyter security tokens.
-                """
-            )
-        return url, nb_server["base_url"], headers
-    else:
-        resp.raise_for_status()
+    _verify_matlab_proxy(url, headers, session)
+    _write_connection_cache(jupyter_server_pid, url, nb_server["base_url"], headers)
+    return url, nb_server["base_url"], headers
 
 
 class MATLABKernel(ipykernel.kernelbase.Kernel):
@@ -171,32 +407,275 @@ class MATLABKernel(ipykernel.kernelbase.Kernel):
     headers = dict()
     startup_error = None
     startup_checks_completed: bool = False
+    is_kernel_path_added: bool = False
+    startup_timings = dict()
+    prewarm_future = None
+    health_monitor = None
 
     def __init__(self, *args, **kwargs):
         # Call superclass constructor to initialize ipykernel infrastructure
         super(MATLABKernel, self).__init__(*args, **kwargs)
+
+        # Pool of keep-alive connections used for all communication with matlab-proxy.
+        self.http_session = mwi_comm_helpers.create_http_session()
+
+        # Connection reserved for interrupts, so that an interrupt is sent right
+        # away even when the connections of the pool are busy. It is opened by
+        # the first status check and kept open while executions are running.
+        self.interrupt_session = mwi_comm_helpers.create_http_session(pool_size=1)
+        self.interrupt_connection_time = 0
+
+        # Priority of the requests of the kernel which were sent to MATLAB and did
+        # not complete, by their request id, and the time of the last interrupt
+        # request.
+        self.inflight_requests = dict()
+        self.interrupt_time = None
+
+        # Requests to matlab-proxy block until MATLAB responds. They are run on
+        # worker threads so that the event loop of the kernel remains responsive
+        # while MATLAB is busy. The number of workers matches the connection pool.
+        self.executor = ThreadPoolExecutor(
+            max_workers=mwi_comm_helpers.get_http_pool_size(),
+            thread_name_prefix="matlab-kernel",
+        )
+
+        # Publish the outputs of each section of a cell while MATLAB is executing it.
+        self.stream_outputs = kernel_env.is_env_set_to_true(
+            kernel_env.get_env_name_stream_outputs()
+        )
+
+        # Time to wait for MATLAB to start once licensing information is available.
+        self.matlab_startup_timeout = kernel_env.get_int(
+            kernel_env.get_env_name_matlab_startup_timeout(),
+            DEFAULT_MATLAB_STARTUP_TIMEOUT,
+        )
+
+        # Tab completion results are served from the cache until the next execution.
+        self.completion_cache = CompletionCache(
+            kernel_env.get_int(
+                kernel_env.get_env_name_completion_cache_size(),
+                DEFAULT_COMPLETION_CACHE_SIZE,
+            )
+        )
+
+        # Variables are inspected using the metadata which MATLAB sends along with
+        # the outputs of each execution. The key identifies the kernel to MATLAB,
+        # which is shared with other kernels.
+        self.workspace_cache = workspace_cache.WorkspaceCache()
+        self.workspace_key = secrets.token_hex(8)
+
+        # Console frontends ask whether code is complete after each key press of
+        # Enter, which is answered without a request to MATLAB.
+        self.block_scanner = block_scanner.BlockScanner()
+
+        # The code of each execution is stored in a persistent history, which is
+        # shared across kernel restarts. Writes happen on a background thread.
+        self.history = history.HistoryStore(history.get_history_file())
+
+        # Figures are resized and re-encoded by MATLAB according to these options,
+        # and identical figures are only published once per cell.
+        self.figure_options = figures.get_figure_options()
+        self.figure_tracker = figures.FigureTracker(
+            figures.is_figure_deduplication_enabled()
+        )
+
+        # Consecutive stream outputs are merged into fewer messages, and the
+        # stream outputs of a cell beyond a limit are suppressed.
+        self.stream_coalescer = streams.create_stream_coalescer()
+
+        # Time spent in each stage of the requests, periodically written to a
+        # file if enabled by the user.
+        self.metrics = metrics.KernelMetrics(
+            metrics.get_metrics_file(),
+            kernel_env.get_int(
+                kernel_env.get_env_name_metrics_interval(),
+                metrics.DEFAULT_METRICS_DUMP_INTERVAL,
+            ),
+        )
+        self.matlab_seconds = 0
+
+        # Each kernel is assigned a dedicated MATLAB from a pool of warm MATLAB
+        # sessions, if enabled by the user.
+        self.session_pool = None
+        self.matlab_session = None
+        self.session_future = None
+        session_pool_size = kernel_env.get_int(
+            kernel_env.get_env_name_session_pool_size(), 0
+        )
+
+        # Requests of all the kernels started by the same Jupyter server are sent
+        # to their shared MATLAB in a fair order, if enabled by the user. This is
+        # not required when each kernel has a dedicated MATLAB.
+        self.scheduler = None
+        if session_pool_size <= 0 and kernel_env.is_env_set_to_true(
+            kernel_env.get_env_name_fair_scheduling()
+        ):
+            queue_dir = _get_scheduler_queue_dir(_get_jupyter_server_pid())
+            if queue_dir is not None:
+                self.scheduler = scheduler.RequestScheduler(queue_dir)
+
+        # Cells queued behind the cell being executed, for example by "Run All",
+        # are executed by MATLAB in the same request, if enabled by the user.
+        # The outputs of the queued cells are published when their turn comes.
+        self.execute_batch_size = kernel_env.get_int(
+            kernel_env.get_env_name_execute_batch_size(), DEFAULT_EXECUTE_BATCH_SIZE
+        )
+        if self.execute_batch_size > 1 and not HAS_SHELL_MAIN_HOOK:
+            self.log.warning(
+                "Executing queued cells in batches requires ipykernel 7 or later. "
+                "Cells are executed one at a time."
+            )
+            self.execute_batch_size = 1
+        self.queued_shell_messages = []
+        self.batched_outputs = dict()
+        self.is_executing = False
+
+        # Pages of large variables are served on demand through a comm, so that
+        # only the first rows of a variable are part of the outputs of a cell.
+        self.comm_manager = CommManager(parent=self, kernel=self)
+        for msg_type in ("comm_open", "comm_msg", "comm_close"):
+            self.shell_handlers[msg_type] = getattr(self.comm_manager, msg_type)
+        self.comm_manager.register_target(
+            VARIABLE_PAGER_TARGET, self.open_variable_pager
+        )
+
+        if session_pool_size > 0:
+            # The session is claimed on its own thread, since its matlab-proxy
+            # can take up to a minute to start. Requests to MATLAB wait for it,
+            # see wait_for_matlab_session. MATLAB is warmed up right after the
+            # session is claimed, if enabled by the user.
+            startup_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="matlab-kernel-claim"
+            )
+            self.session_future = startup_executor.submit(
+                self.claim_matlab_session, session_pool_size
+            )
+            if kernel_env.is_env_set_to_true(kernel_env.get_env_name_eager_start()):
+                self.prewarm_future = startup_executor.submit(
+                    self.prewarm_claimed_session,
+                    self.session_future,
+                    self.matlab_startup_timeout,
+                )
+            startup_executor.shutdown(wait=False)
+            return
+
         try:
             # Start matlab-proxy using the jupyter-matlab-proxy registered endpoint
-            self.murl, self.server_base_url, self.headers = start_matlab_proxy()
-            (
-                self.is_matlab_licensed,
-                self.matlab_status,
-                self.matlab_proxy_has_error,
-            ) = mwi_comm_helpers.fetch_matlab_proxy_status(self.murl, self.headers)
+            self.murl, self.server_base_url, self.headers = start_matlab_proxy(
+                self.http_session
+            )
+            self.health_monitor = self.create_health_monitor()
+            self.update_matlab_status(
+                *mwi_comm_helpers.fetch_matlab_proxy_status(
+                    self.murl, self.headers, self.interrupt_session
+                )
+            )
+            self.interrupt_connection_time = time.monotonic()
         except (MATLABConnectionError, HTTPError) as err:
             self.startup_error = err
 
+        # Keep the status of MATLAB up to date in the background, so that
+        # executions fail fast while MATLAB is known to be down.
+        if self.health_monitor is not None:
+            self.health_monitor.start()
+
+        # Wait for MATLAB to start in the background, so that the first execution
+        # request only waits for the remainder of the startup time.
+        # The background startup runs on its own thread, so that it never waits
+        # for the workers which send the requests of the kernel.
+        if self.startup_error is None and kernel_env.is_env_set_to_true(
+            kernel_env.get_env_name_eager_start()
+        ):
+            prewarm_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="matlab-kernel-prewarm"
+            )
+            self.prewarm_future = prewarm_executor.submit(
+                self.prewarm_matlab,
+                self.murl,
+                self.headers,
+                self.is_matlab_licensed,
+                self.matlab_startup_timeout,
+            )
+            prewarm_executor.shutdown(wait=False)
+
     # ipykernel Interface API
     # https://ipython.readthedocs.io/en/stable/development/wrapperkernels.html
 
+    async def shell_main(self, subshell_id, msg):
+        """
+        Keeps track of the shell messages which are waiting to be handled, so
+        that execution requests queued behind the current one can be batched.
+        Shell messages are handled one at a time by ipykernel, except for
+        completion, inspection and kernel info requests received while a cell
+        is being executed, which are handled right away.
+        """
+        is_batching = self.execute_batch_size > 1 and subshell_id is None
+        if not (is_batching or self.is_executing):
+            return await super().shell_main(subshell_id, msg)
+
+        queued_message = self.peek_shell_message(msg)
+        if (
+            self.is_executing
+            and queued_message["msg_type"] in CONCURRENT_SHELL_MESSAGES
+        ):
+            # The message is handled in a task, whose copy of the context keeps
+            # the parent of the cell being executed unchanged.
+            return await asyncio.ensure_future(
+                self.dispatch_shell(msg, subshell_id=subshell_id)
+            )
+        if not is_batching:
+            return await super().shell_main(subshell_id, msg)
+
+        self.queued_shell_messages.append(queued_message)
+        try:
+            return await super().shell_main(subshell_id, msg)
+        finally:
+            self.queued_shell_messages.remove(queued_message)
+            # Outputs of an execution request which was aborted are discarded,
+            # along with the changes of the workspace which they carry.
+            if self.batched_outputs.pop(queued_message["msg_id"], None) is not None:
+                self.workspace_cache.invalidate()
+
+    async def execute_request(self, stream, ident, parent):
+        """
+        Keeps track of the execution of a cell, during which completion,
+        inspection and kernel info requests are handled right away.
+        """
+        self.is_executing = True
+        try:
+            return await super().execute_request(stream, ident, parent)
+        finally:
+            self.is_executing = False
+
     async def interrupt_request(self, stream, ident, parent):
         """
         Custom handling of interrupt request sent by Jupyter. For more info, look at
         https://jupyter-client.readthedocs.io/en/stable/messaging.html#kernel-interrupt
+
+        The requests of the kernel which were sent to MATLAB are interrupted, and
+        its executions which wait for their turn are cancelled. The cells queued
+        behind the interrupted cell are aborted once MATLAB has stopped, see
+        do_execute.
         """
+        # Executions which wait for their turn, and cells which are executed
+        # while MATLAB stops, check the time of the interrupt.
+        self.interrupt_time = time.perf_counter()
+        request_id = self.get_current_request_id()
         try:
-            # Send interrupt request to MATLAB
-            mwi_comm_helpers.send_interrupt_request_to_matlab(self.murl, self.headers)
+            # Only a request of this kernel is interrupted. When none is in
+            # flight, MATLAB may be running a request of another kernel.
+            if request_id is None:
+                self.log.info("No request to MATLAB in flight, nothing to interrupt")
+            else:
+                with self.metrics.span("interrupt"):
+                    mwi_comm_helpers.send_interrupt_request_to_matlab(
+                        self.murl,
+                        self.headers,
+                        request_id,
+                        self.interrupt_session,
+                    )
+                self.interrupt_connection_time = time.monotonic()
+                self.log.info(f"Interrupted request {request_id} to MATLAB")
 
             # Set the response to interrupt request.
             content = {"status": "ok"}
@@ -210,8 +689,9 @@ class MATLABKernel(ipykernel.kernelbase.Kernel):
             }
 
         self.session.send(stream, "interrupt_reply", content, parent, ident=ident)
+        self.metrics.dump()
 
-    def do_execute(
+    async def do_execute(
         self,
         code,
         silent,
@@ -225,48 +705,101 @@ class MATLABKernel(ipykernel.kernelbase.Kernel):
         Used by ipykernel infrastructure for execution. For more info, look at
         https://jupyter-client.readthedocs.io/en/stable/messaging.html#execute
         """
+        # Executing code can change the MATLAB workspace and path, which
+        # invalidates the cached Tab completion results and the names which
+        # MATLAB had no help for.
+        self.completion_cache.clear()
+        self.workspace_cache.forget_missing_help()
+        self.figure_tracker.reset()
+        self.stream_coalescer.reset()
+        self.matlab_seconds = 0
+        start_time = time.perf_counter()
+        if store_history and not silent:
+            self.history.store(self.execution_count, code)
+
         try:
+            await self.wait_for_matlab_session()
+
+            # Fail right away while MATLAB is known to be down, instead of
+            # waiting for it to start in the startup checks.
+            failure = self.get_matlab_failure()
+            if failure is not None:
+                self.startup_checks_completed = False
+                self.is_kernel_path_added = False
+                raise MATLABConnectionError(failure)
+
             # Complete one-time startup checks before sending request to MATLAB.
-            # Blocking call, returns after MATLAB is started.
+            # Returns after MATLAB is started.
             if not self.startup_checks_completed:
-                self.perform_startup_checks()
-                self.display_output(
-                    {
-                        "type": "stream",
-                        "content": {
-                            "name": "stdout",
-                            "text": "Executing ...",
-                        },
-                    }
-                )
+                with self.metrics.span("execute.startup"):
+                    await self.wait_for_prewarm()
+                    await self.perform_startup_checks()
+                self.display_notice("Executing ...")
                 self.startup_checks_completed = True
 
-            # Perform execution and categorization of outputs in MATLAB. Blocks
-            # until execution results are received from MATLAB.
-            outputs = mwi_comm_helpers.send_execution_request_to_matlab(
-                self.murl, self.headers, code
-            )
+            if self.stream_outputs:
+                # Outputs are published while MATLAB is executing, hence the
+                # request and publishing cannot be timed separately.
+                with self.metrics.span("execute.streaming"):
+                    await self.execute_with_streaming(code)
+            else:
+                # Perform execution and categorization of outputs in MATLAB. Waits
+                # until execution results are received from MATLAB, unless the
+                # cell was executed in the batch of a previous cell.
+                request_start_time = time.perf_counter()
+                outputs = self.pop_batched_outputs()
+                batch_size = 0
+                if outputs is None:
+                    outputs, batch_size = await self.fetch_execution_outputs(code)
+                request_seconds = time.perf_counter() - request_start_time
 
-            # Clear the output area of the current cell. This removes any previous
-            # outputs before publishing new outputs.
-            self.display_output({"type": "clear_output", "content": {"wait": False}})
+                with self.metrics.span("execute.publish"):
+                    # Clear the output area of the current cell. This removes any previous
+                    # outputs before publishing new outputs.
+                    self.display_output(
+                        {"type": "clear_output", "content": {"wait": False}}
+                    )
 
-            # Display all the outputs produced during the execution of code.
-            for data in outputs:
-                # Ignore empty values returned from MATLAB.
-                if not data:
-                    continue
-                self.display_output(data)
+                    # Display all the outputs produced during the execution of code.
+                    for data in outputs:
+                        # Ignore empty values returned from MATLAB.
+                        if not data:
+                            continue
+                        self.display_output(data)
+
+                # The time spent outside of MATLAB is spent in the HTTP requests
+                # through Jupyter server and matlab-proxy, and decoding the response.
+                # The request of a batch is timed as a whole, by its first cell.
+                if batch_size > 0:
+                    self.metrics.observe("execute.request", request_seconds)
+                if self.matlab_seconds and batch_size == 1:
+                    self.metrics.observe(
+                        "execute.transport",
+                        max(request_seconds - self.matlab_seconds, 0),
+                    )
         except Exception as e:
-            if isinstance(e, HTTPError):
-                # If exception is an HTTPError, it means MATLAB is unavailable.
-                # Replace the HTTPError with MATLABConnectionError to give
-                # meaningful error message to the user
-                e = MATLABConnectionError()
+            # The changes of the workspace made by the execution are not known.
+            self.workspace_cache.invalidate()
+
+            if isinstance(e, (HTTPError, requests.ConnectionError)):
+                # If exception is an HTTPError or a connection error, it means
+                # MATLAB is unavailable. Replace it with MATLABConnectionError to
+                # give meaningful error message to the user
+                if self.health_monitor is not None:
+                    self.health_monitor.trip(e)
+                e = MATLABConnectionError(self.get_matlab_failure())
 
                 # Since MATLAB is not available, we need to perform the startup
                 # checks for subsequent execution requests
                 self.startup_checks_completed = False
+                self.is_kernel_path_added = False
+            elif self.is_interrupted_since(start_time):
+                # Confirm the interrupt, instead of the error of the request.
+                e = Exception(
+                    "Execution interrupted. MATLAB stopped "
+                    f"{(time.perf_counter() - self.interrupt_time) * 1000:.0f} ms "
+                    "after the interrupt request."
+                )
 
             # Send the exception message to the user.
             self.display_output({"type": "clear_output", "content": {"wait": False}})
@@ -279,6 +812,28 @@ class MATLABKernel(ipykernel.kernelbase.Kernel):
                     },
                 }
             )
+
+        if self.is_interrupted_since(start_time):
+            self.metrics.observe(
+                "interrupt.stop", time.perf_counter() - self.interrupt_time
+            )
+            self.cancel_queued_executions()
+
+        self.flush_stream_outputs(final=True)
+        if self.stream_coalescer.suppressed_size:
+            self.log.info(
+                f"Suppressed {self.stream_coalescer.suppressed_size} characters of output"
+            )
+
+        if self.figure_tracker.figure_count or self.figure_tracker.duplicate_count:
+            self.log.info(
+                f"Published {self.figure_tracker.figure_count} figure(s) and skipped "
+                f"{self.figure_tracker.duplicate_count} duplicate(s), saving "
+                f"{self.figure_tracker.bytes_saved} bytes"
+            )
+
+        self.metrics.observe("execute", time.perf_counter() - start_time)
+        self.metrics.dump()
         return {
             "status": "ok",
             "execution_count": self.execution_count,
@@ -286,7 +841,7 @@ class MATLABKernel(ipykernel.kernelbase.Kernel):
             "user_expressions": {},
         }
 
-    def do_complete(self, code, cursor_pos):
+    async def do_complete(self, code, cursor_pos):
         """
         Used by ipykernel infrastructure for tab completion. For more info, look
         at https://jupyter-client.readthedocs.io/en/stable/messaging.html#completion
@@ -304,14 +859,24 @@ class MATLABKernel(ipykernel.kernelbase.Kernel):
             "completions": [],
         }
 
-        # Fetch tab completion results. Blocks untils either tab completion
-        # results are received from MATLAB or communication with MATLAB fails.
-        try:
-            completion_results = mwi_comm_helpers.send_completion_request_to_matlab(
-                self.murl, self.headers, code, cursor_pos
-            )
-        except HTTPError as e:
-            pass
+        # Serve the results from the cache if the same code, or a longer prefix
+        # of the identifier being completed, was completed since the last execution.
+        start_time = time.perf_counter()
+        cached_results = self.completion_cache.get(code, cursor_pos)
+        if cached_results is not None:
+            completion_results = cached_results
+        else:
+            # Fetch tab completion results. Waits untils either tab completion
+            # results are received from MATLAB or communication with MATLAB fails.
+            try:
+                with self.metrics.span("complete.request"):
+                    completion_results = await self.fetch_completion_results(
+                        code, cursor_pos
+                    )
+            except (HTTPError, MATLABConnectionError) as e:
+                pass
+        self.metrics.observe("complete", time.perf_counter() - start_time)
+        self.metrics.dump()
 
         return {
             "status": "ok",
@@ -324,14 +889,53 @@ class MATLABKernel(ipykernel.kernelbase.Kernel):
         }
 
     def do_is_complete(self, code):
-        # TODO: Seems like indentation rules. https://jupyter-client.readthedocs.io/en/stable/messaging.html#code-completeness
-        return super().do_is_complete(code)
+        """
+        Used by ipykernel infrastructure to tell console frontends whether to
+        execute the code or to continue it on a new line. For more info, look at
+        https://jupyter-client.readthedocs.io/en/stable/messaging.html#code-completeness
 
-    def do_inspect(self, code, cursor_pos, detail_level=0, omit_sections=...):
-        # TODO: Implement Shift+Tab functionality. Can be used to provide any contextual information.
-        return super().do_inspect(code, cursor_pos, detail_level, omit_sections)
+        The blocks of the code are scanned locally, without a request to MATLAB.
+        """
+        start_time = time.perf_counter()
+        status, indent = self.block_scanner.check(code)
+        self.metrics.observe("is_complete", time.perf_counter() - start_time)
+        if status == "incomplete":
+            return {"status": status, "indent": indent}
+        return {"status": status}
+
+    async def do_inspect(self, code, cursor_pos, detail_level=0, omit_sections=()):
+        """
+        Used by ipykernel infrastructure for inspection (Shift+Tab). For more
+        info, look at https://jupyter-client.readthedocs.io/en/stable/messaging.html#introspection
 
-    def do_history(
+        Variables are described from the metadata of the workspace cached by the
+        kernel. The help text of functions is fetched from MATLAB once, and then
+        served from the cache.
+        """
+        reply = {"status": "ok", "found": False, "data": {}, "metadata": {}}
+        name = workspace_cache.get_name_at_cursor(code, cursor_pos)
+        if name is None:
+            return reply
+
+        start_time = time.perf_counter()
+        text = self.workspace_cache.describe_variable(name)
+        if text is None:
+            text = self.workspace_cache.get_help(name)
+        if text is None and self.startup_checks_completed:
+            try:
+                with self.metrics.span("inspect.request"):
+                    text = await self.fetch_help(name)
+            except Exception as e:
+                self.log.debug(f"Failed to fetch the help of {name}: {e}")
+        self.metrics.observe("inspect", time.perf_counter() - start_time)
+        self.metrics.dump()
+
+        if text:
+            reply["found"] = True
+            reply["data"] = {"text/plain": text}
+        return reply
+
+    async def do_history(
         self,
         hist_access_type,
         output,
@@ -343,19 +947,827 @@ class MATLABKernel(ipykernel.kernelbase.Kernel):
         pattern=None,
         unique=False,
     ):
-        # TODO: Implement accessing history in Notebook. Usually this history is related to the code typed in notebook.
-        # However, we may also choose to associate with MATLAB History stored on disk.
-        return super().do_history(
-            hist_access_type, output, raw, session, start, stop, n, pattern, unique
+        """
+        Used by ipykernel infrastructure for history requests, for example from
+        console frontends. For more info, look at
+        https://jupyter-client.readthedocs.io/en/stable/messaging.html#history
+
+        The history stores the code of the executions, not their outputs.
+        """
+        entries = await asyncio.wrap_future(
+            self.history.request(
+                hist_access_type, session, start, stop, n, pattern, unique
+            )
         )
+        if output:
+            entries = [
+                (session, line, (source, None)) for session, line, source in entries
+            ]
+        return {"status": "ok", "history": entries}
 
     def do_shutdown(self, restart):
-        # TODO: Implement clean-up
+        # Return the dedicated MATLAB to the pool, with a clean workspace. A
+        # session which is still being claimed is cleared by the next kernel
+        # which claims it, once the claim of this kernel is found stale.
+        if self.session_future is not None and self.session_future.done():
+            if self.session_future.exception() is None:
+                pool, matlab_session, _ = self.session_future.result()
+                pool.release(matlab_session, is_reset=not matlab_session["needs_reset"])
+            self.session_future = None
+        if self.matlab_session is not None:
+            is_reset = True
+            try:
+                mwi_comm_helpers.reset_matlab_session(
+                    self.murl, self.headers, self.http_session
+                )
+            except Exception:
+                is_reset = False
+            self.session_pool.release(self.matlab_session, is_reset=is_reset)
+            self.matlab_session = None
+
+        # Stop the worker threads and close the pooled connections to matlab-proxy.
+        self.executor.shutdown(wait=False)
+        self.http_session.close()
+        self.interrupt_session.close()
+        self.history.close()
+        if self.health_monitor is not None:
+            self.health_monitor.close()
+        self.metrics.close()
         return super().do_shutdown(restart)
 
     # Helper functions
 
-    def perform_startup_checks(self):
+    def claim_matlab_session(self, pool_size):
+        """
+        Claims a dedicated MATLAB session from the pool, and refills the pool in
+        the background for the next kernels. A session left by a kernel which
+        did not clear it is cleared first. Runs on a dedicated thread while the
+        kernel starts, and does not change the state of the kernel. The result
+        is applied by wait_for_matlab_session, on the event loop of the kernel.
+
+        Args:
+            pool_size (int): Number of unclaimed sessions to keep in the pool.
+
+        Returns:
+            Tuple (SessionPool, dict, Tuple): The pool, the claimed session and
+                the status of its MATLAB, as returned by
+                mwi_comm_helpers.fetch_matlab_proxy_status.
+
+        Raises:
+            MATLABConnectionError: Occurs when the session cannot be started.
+        """
+        pool_dir = _get_session_pool_dir(_get_jupyter_server_pid())
+        if pool_dir is None:
+            raise MATLABConnectionError(
+                """
+                Error: MATLAB Kernel could not start a MATLAB session.\n
+                Reason: The Jupyter runtime directory is not available.
+                """
+            )
+
+        http_session = mwi_comm_helpers.create_http_session(pool_size=1)
+        try:
+            pool = session_pool.SessionPool(pool_dir, pool_size)
+            matlab_session = pool.claim()
+            pool.refill()
+
+            url, headers = matlab_session["url"], matlab_session["headers"]
+            _wait_for_matlab_proxy(url, headers, http_session)
+            status = mwi_comm_helpers.fetch_matlab_proxy_status(
+                url, headers, http_session
+            )
+            if matlab_session["needs_reset"] and status[1] == "up":
+                mwi_comm_helpers.reset_matlab_session(url, headers, http_session)
+                matlab_session["needs_reset"] = False
+            return pool, matlab_session, status
+        except MATLABConnectionError:
+            raise
+        except Exception as err:
+            raise MATLABConnectionError(
+                f"""
+                Error: MATLAB Kernel could not start a MATLAB session.\n
+                Reason: {err}
+                """
+            ) from err
+        finally:
+            http_session.close()
+
+    async def wait_for_matlab_session(self):
+        """
+        Waits for the dedicated MATLAB session claimed in the background while
+        the kernel started, and connects the kernel to its matlab-proxy. An
+        error is kept as the startup error of the kernel.
+        """
+        future = self.session_future
+        if future is None:
+            return
+        try:
+            pool, matlab_session, status = await asyncio.wrap_future(future)
+        except Exception as err:
+            if self.session_future is future:
+                self.session_future = None
+                self.startup_error = err
+            return
+        if self.session_future is not future:
+            return
+        self.session_future = None
+
+        self.session_pool = pool
+        self.matlab_session = matlab_session
+        self.murl = matlab_session["url"]
+        self.headers = matlab_session["headers"]
+        self.health_monitor = self.create_health_monitor()
+        self.update_matlab_status(*status)
+        self.health_monitor.start()
+
+    async def run_in_executor(self, func, *args, **kwargs):
+        """
+        Runs a blocking function, usually a request to matlab-proxy, on a worker
+        thread and waits for its result without blocking the event loop.
+
+        Args:
+            func (callable): Function to be run.
+            args, kwargs: Arguments passed to func.
+
+        Returns:
+            Any: Value returned by func.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def run_matlab_request(self, priority, func, *args, on_wait=None, **kwargs):
+        """
+        Runs a request to MATLAB on a worker thread, once it is the turn of the
+        request if requests are scheduled. See scheduler.RequestScheduler.
+
+        Args:
+            priority (int): scheduler.PRIORITY_INTERACTIVE or scheduler.PRIORITY_EXECUTE
+            func (callable): Function which sends the request.
+            on_wait (callable): Optional function called with the number of requests
+                                ahead, if the request waits for longer than
+                                SCHEDULER_WAIT_NOTICE_DELAY seconds.
+            args, kwargs: Arguments passed to func, which also accepts the id of
+                          the request as the "request_id" keyword argument.
+
+        Returns:
+            Any: Value returned by func.
+
+        Raises:
+            Exception: Occurs when an execution is cancelled by an interrupt
+                       while waiting for its turn.
+        """
+        if priority == scheduler.PRIORITY_EXECUTE:
+            self.open_interrupt_connection()
+
+        if self.scheduler is None:
+            return await self.send_matlab_request(priority, func, *args, **kwargs)
+
+        ticket = self.scheduler.enqueue(priority)
+        try:
+            start_time = time.perf_counter()
+            is_wait_notified = False
+            while True:
+                is_acquired, ahead = self.scheduler.try_acquire(ticket)
+                if is_acquired:
+                    break
+                if (
+                    priority == scheduler.PRIORITY_EXECUTE
+                    and self.is_interrupted_since(start_time)
+                ):
+                    raise Exception("Execution cancelled by interrupt.")
+                wait_seconds = time.perf_counter() - start_time
+                if (
+                    on_wait is not None
+                    and not is_wait_notified
+                    and wait_seconds > SCHEDULER_WAIT_NOTICE_DELAY
+                ):
+                    on_wait(ahead)
+                    is_wait_notified = True
+                await asyncio.sleep(SCHEDULER_POLL_INTERVAL)
+
+            wait_seconds = time.perf_counter() - start_time
+            self.metrics.observe(
+                "schedule.wait.execute"
+                if priority == scheduler.PRIORITY_EXECUTE
+                else "schedule.wait.interactive",
+                wait_seconds,
+            )
+            if is_wait_notified:
+                self.log.info(
+                    f"Request waited {wait_seconds:.2f} seconds for requests of other kernels"
+                )
+            return await self.send_matlab_request(priority, func, *args, **kwargs)
+        finally:
+            self.scheduler.release(ticket)
+
+    async def send_matlab_request(self, priority, func, *args, **kwargs):
+        """
+        Runs a request to MATLAB on a worker thread, and keeps track of it while
+        it is in flight so that it can be interrupted. See run_matlab_request.
+        """
+        request_id = mwi_comm_helpers.generate_request_id()
+        self.inflight_requests[request_id] = priority
+        try:
+            return await self.run_in_executor(
+                func, *args, request_id=request_id, **kwargs
+            )
+        finally:
+            self.inflight_requests.pop(request_id, None)
+
+    def get_current_request_id(self):
+        """
+        Returns the id of the request to MATLAB which an interrupt stops: the
+        execution in flight if any, else the latest request in flight, or None
+        when no request is in flight.
+        """
+        request_id = None
+        for inflight_id, priority in self.inflight_requests.items():
+            request_id = inflight_id
+            if priority == scheduler.PRIORITY_EXECUTE:
+                break
+        return request_id
+
+    def open_interrupt_connection(self):
+        """
+        Re-opens the connection reserved for interrupts in the background, if it
+        has been idle for long enough to have been closed.
+        """
+        now = time.monotonic()
+        if now - self.interrupt_connection_time < INTERRUPT_CONNECTION_IDLE_TIMEOUT:
+            return
+        self.interrupt_connection_time = now
+        self.executor.submit(
+            mwi_comm_helpers.fetch_matlab_proxy_status,
+            self.murl,
+            self.headers,
+            self.interrupt_session,
+        )
+
+    def is_interrupted_since(self, start_time):
+        """Returns whether an interrupt was requested after the given time."""
+        interrupt_time = self.interrupt_time
+        return interrupt_time is not None and interrupt_time >= start_time
+
+    def cancel_queued_executions(self):
+        """
+        Aborts the execution requests queued behind the cell being executed, so
+        that the cells of a "Run All" do not keep MATLAB busy after an interrupt.
+        """
+        # Kernel._abort_queues is private to ipykernel, hence it is only used if
+        # the installed version provides it.
+        abort_queues = getattr(self, "_abort_queues", None)
+        if abort_queues is None:
+            self.log.warning(
+                "The queued execution requests cannot be aborted with the "
+                "installed version of ipykernel"
+            )
+            return
+        self.log.info("Aborting the queued execution requests after an interrupt")
+        abort_queues()
+
+    def peek_shell_message(self, msg):
+        """
+        Returns the id, type and code of a shell message without consuming it.
+        The content is only unpacked for execution requests, and the signature of
+        the message is not recorded so that ipykernel can handle the message.
+        """
+        try:
+            _, msg_list = self.session.feed_identities(msg, copy=False)
+            message = self.session.deserialize(msg_list, content=False, copy=False)
+            header = message["header"]
+            queued_message = {
+                "msg_id": header["msg_id"],
+                "msg_type": header["msg_type"],
+                "code": None,
+            }
+            if header["msg_type"] == "execute_request":
+                content = self.session.unpack(message["content"])
+                if not content.get("silent", False):
+                    queued_message["code"] = content["code"]
+        except Exception:
+            # Invalid messages are reported by ipykernel.
+            queued_message = {"msg_id": None, "msg_type": None, "code": None}
+        return queued_message
+
+    def get_current_msg_id(self):
+        """Returns the id of the shell message being handled."""
+        return self.get_parent("shell").get("header", {}).get("msg_id")
+
+    def get_queued_executions(self):
+        """
+        Returns the execution requests queued right behind the shell message
+        being handled, up to the batch size. Requests queued behind any other
+        message, such as a Tab completion request, are not included so that
+        messages are still handled in order.
+
+        Returns:
+            List(dict): Id and code of the queued execution requests.
+        """
+        msg_ids = [message["msg_id"] for message in self.queued_shell_messages]
+        msg_id = self.get_current_msg_id()
+        if msg_id is None or msg_id not in msg_ids:
+            return []
+
+        queued_executions = []
+        for message in self.queued_shell_messages[msg_ids.index(msg_id) + 1 :]:
+            if len(queued_executions) + 1 >= self.execute_batch_size:
+                break
+            if message["code"] is None:
+                break
+            queued_executions.append(message)
+        return queued_executions
+
+    def pop_batched_outputs(self):
+        """
+        Returns the outputs of the cell being executed if MATLAB executed it in
+        the batch of a previous cell, else None.
+
+        Raises:
+            Exception: The error of the batch, if the batch failed before the
+                       cell was executed.
+        """
+        outputs = self.batched_outputs.pop(self.get_current_msg_id(), None)
+        if isinstance(outputs, Exception):
+            raise outputs
+        return outputs
+
+    async def fetch_execution_outputs(self, code):
+        """
+        Executes MATLAB code and returns its outputs. Cells queued behind the cell
+        are executed in the same request, and their outputs are kept until their
+        turn comes. MATLAB stops at the first cell which errors, and the cells
+        after it are executed by their own request.
+
+        Args:
+            code (string): MATLAB code to be executed.
+
+        Returns:
+            Tuple (List(dict), int): Outputs captured during the execution of the
+                                     code, and the number of cells in the request.
+
+        Raises:
+            HTTPError: Occurs when connection to matlab-proxy cannot be established.
+        """
+        queued_executions = self.get_queued_executions()
+        if not queued_executions:
+            outputs = await self.run_matlab_request(
+                scheduler.PRIORITY_EXECUTE,
+                mwi_comm_helpers.send_execution_request_to_matlab,
+                self.murl,
+                self.headers,
+                code,
+                self.http_session,
+                add_kernel_path=not self.is_kernel_path_added,
+                options=self.get_execution_options(),
+                on_wait=self.notify_execution_wait,
+            )
+            self.is_kernel_path_added = True
+            return outputs, 1
+
+        try:
+            results = await self.run_matlab_request(
+                scheduler.PRIORITY_EXECUTE,
+                mwi_comm_helpers.send_batch_execution_request_to_matlab,
+                self.murl,
+                self.headers,
+                [code] + [execution["code"] for execution in queued_executions],
+                self.http_session,
+                add_kernel_path=not self.is_kernel_path_added,
+                options=self.get_execution_options(),
+                on_wait=self.notify_execution_wait,
+            )
+        except Exception as e:
+            # It is not known which cells of the batch were executed before the
+            # failure, for example an interrupt. The queued cells report the
+            # failure instead of being executed a second time.
+            for execution in queued_executions:
+                self.batched_outputs[execution["msg_id"]] = e
+            raise
+        self.is_kernel_path_added = True
+
+        self.log.debug(
+            f"Executed {len(results)} of {len(queued_executions) + 1} cell(s) in a batch"
+        )
+        for execution, result in zip(queued_executions, results[1:]):
+            self.batched_outputs[execution["msg_id"]] = result["outputs"]
+        outputs = results[0]["outputs"] if results else []
+        return outputs, len(queued_executions) + 1
+
+    def notify_execution_wait(self, ahead):
+        """Tells the user that the execution waits for requests of other notebooks."""
+        self.display_notice(
+            f"Waiting for MATLAB to process {ahead} request(s) from other notebooks ...\n"
+        )
+
+    async def fetch_completion_results(self, code, cursor_pos):
+        """
+        Fetches Tab completion results from MATLAB and caches them.
+
+        Args:
+            code (string): MATLAB code on which Tab completion is requested.
+            cursor_pos (int): Position of the cursor when Tab completion is requested.
+
+        Returns:
+            Dict: Tab completion results, see mwi_comm_helpers.send_completion_request_to_matlab
+
+        Raises:
+            HTTPError: Occurs when connection to matlab-proxy cannot be established.
+            MATLABConnectionError: Occurs when the kernel failed to start.
+        """
+        await self.wait_for_matlab_session()
+        if self.startup_error is not None:
+            raise self.startup_error
+
+        completion_results = await self.run_matlab_request(
+            scheduler.PRIORITY_INTERACTIVE,
+            mwi_comm_helpers.send_completion_request_to_matlab,
+            self.murl,
+            self.headers,
+            code,
+            cursor_pos,
+            self.http_session,
+            add_kernel_path=not self.is_kernel_path_added,
+        )
+        self.is_kernel_path_added = True
+        self.completion_cache.put(code, cursor_pos, completion_results)
+        return completion_results
+
+    async def fetch_help(self, name):
+        """
+        Fetches the help text of a function from MATLAB and caches it.
+
+        Args:
+            name (string): Name of the function, class or package.
+
+        Returns:
+            string: The help text, empty if MATLAB does not know the name.
+
+        Raises:
+            HTTPError: Occurs when connection to matlab-proxy cannot be established.
+        """
+        text = await self.run_matlab_request(
+            scheduler.PRIORITY_INTERACTIVE,
+            mwi_comm_helpers.send_help_request_to_matlab,
+            self.murl,
+            self.headers,
+            name,
+            self.http_session,
+            add_kernel_path=not self.is_kernel_path_added,
+        )
+        self.is_kernel_path_added = True
+        self.workspace_cache.put_help(name, text)
+        return text
+
+    def get_execution_options(self, **options):
+        """
+        Returns the options sent to MATLAB along with execution requests. See
+        +jupyter/execute.m for the supported options.
+
+        Args:
+            options: Options specific to the request, for example "outputFile".
+        """
+        options = dict(self.figure_options, **options)
+        if self.metrics.enabled:
+            options["collectTimings"] = True
+        options["workspaceKey"] = self.workspace_key
+        if not self.workspace_cache.is_synced:
+            options["workspaceReset"] = True
+        return options
+
+    def open_variable_pager(self, comm, msg):
+        """
+        Handles a comm opened by the frontend to page through large variables.
+        Each message sent over the comm requests a page of rows of a variable,
+        which is replied to with a message on the same comm. The message which
+        opens the comm can also carry a request.
+
+        Request Example:
+            {"variable": "x", "start_row": 21, "page_size": 20}
+
+        Args:
+            comm (ipykernel.comm.Comm): The comm opened by the frontend.
+            msg (dict): The comm_open message.
+        """
+
+        def on_msg(msg):
+            # Requests to MATLAB are sent from a worker thread, to keep the kernel
+            # responsive while MATLAB is busy.
+            asyncio.ensure_future(self.send_variable_page(comm, msg["content"]["data"]))
+
+        comm.on_msg(on_msg)
+        if msg["content"].get("data"):
+            on_msg(msg)
+
+    async def send_variable_page(self, comm, request):
+        """Fetches the page of a variable requested over a comm and replies with it."""
+        comm.send(await self.fetch_variable_page(request))
+
+    async def fetch_variable_page(self, request):
+        """
+        Fetches a page of rows of a variable from MATLAB.
+
+        Args:
+            request (dict): Request received from the frontend, with the name of the
+                            variable and optionally the first row (starting from 1)
+                            and the number of rows of the page.
+
+        Returns:
+            Dict: The rows of the page, or an error message if the page could not
+                  be fetched.
+                  Example: {
+                    "variable": "x",
+                    "rows": 1000,
+                    "columns": 3,
+                    "start_row": 21,
+                    "end_row": 40,
+                    "text": "..."
+                  }
+        """
+        name = request.get("variable", "")
+        try:
+            start_row = int(request.get("start_row", 1))
+            page_size = min(
+                max(int(request.get("page_size", DEFAULT_VARIABLE_PAGE_SIZE)), 1),
+                MAX_VARIABLE_PAGE_SIZE,
+            )
+            page = await self.run_matlab_request(
+                scheduler.PRIORITY_INTERACTIVE,
+                mwi_comm_helpers.send_variable_page_request_to_matlab,
+                self.murl,
+                self.headers,
+                name,
+                start_row,
+                page_size,
+                self.http_session,
+                add_kernel_path=not self.is_kernel_path_added,
+            )
+            self.is_kernel_path_added = True
+        except Exception as e:
+            return {"variable": name, "error": str(e)}
+
+        return {
+            "variable": page["name"],
+            "rows": page["rows"],
+            "columns": page["columns"],
+            "start_row": page["startRow"],
+            "end_row": page["endRow"],
+            "text": page["text"],
+        }
+
+    async def execute_with_streaming(self, code):
+        """
+        Executes MATLAB code and publishes the outputs of each section of the code
+        as soon as MATLAB finishes executing the section. MATLAB appends the outputs
+        to a file which is read by the kernel while the execution is in progress,
+        hence only one output at a time is held in memory by the kernel.
+
+        Args:
+            code (string): MATLAB code to be executed.
+
+        Raises:
+            HTTPError: Occurs when connection to matlab-proxy cannot be established.
+        """
+        fd, outputs_file_path = tempfile.mkstemp(
+            prefix="jupyter_matlab_kernel_", suffix=".jsonl"
+        )
+        os.close(fd)
+
+        is_output_cleared = False
+
+        def display_streamed_output(data):
+            nonlocal is_output_cleared
+            # Clear the output area of the current cell before publishing the
+            # first output.
+            if not is_output_cleared:
+                self.display_output(
+                    {"type": "clear_output", "content": {"wait": False}}
+                )
+                is_output_cleared = True
+            if data:
+                self.display_output(data)
+
+        try:
+            execution = asyncio.ensure_future(
+                self.run_matlab_request(
+                    scheduler.PRIORITY_EXECUTE,
+                    mwi_comm_helpers.send_execution_request_to_matlab,
+                    self.murl,
+                    self.headers,
+                    code,
+                    self.http_session,
+                    add_kernel_path=not self.is_kernel_path_added,
+                    options=self.get_execution_options(outputFile=outputs_file_path),
+                    on_wait=self.notify_execution_wait,
+                )
+            )
+            with open(outputs_file_path, "r", encoding="utf-8") as outputs_file:
+                while True:
+                    # Read the file once more after the execution is complete to
+                    # publish the outputs of the last section.
+                    is_execution_complete = execution.done()
+                    for data in mwi_comm_helpers.read_streamed_outputs(outputs_file):
+                        display_streamed_output(data)
+                    self.flush_stream_outputs()
+                    if is_execution_complete:
+                        break
+                    await asyncio.wait([execution], timeout=STREAMING_POLL_INTERVAL)
+
+            # Outputs returned in the response, for example kernel errors.
+            outputs = execution.result()
+            self.is_kernel_path_added = True
+        finally:
+            try:
+                os.remove(outputs_file_path)
+            except OSError:
+                pass
+
+        for data in outputs:
+            display_streamed_output(data)
+        if not is_output_cleared:
+            display_streamed_output(None)
+
+    def update_matlab_status(
+        self, is_matlab_licensed, matlab_status, matlab_proxy_has_error
+    ):
+        """
+        Updates the state of the kernel with the status of MATLAB reported by
+        matlab-proxy.
+
+        Args:
+            is_matlab_licensed (bool): True if matlab-proxy has license information, else False.
+            matlab_status (string): Status of MATLAB. Values could be "up", "down" and "starting"
+            matlab_proxy_has_error (bool): True if matlab-proxy faced any issues and unable to
+                                           start MATLAB
+        """
+        self.is_matlab_licensed = is_matlab_licensed
+        self.matlab_status = matlab_status
+        self.matlab_proxy_has_error = matlab_proxy_has_error
+
+        # A MATLAB which is not up is either stopped or being (re)started. The
+        # MATLAB code shipped with the kernel needs to be added to the path of
+        # the new MATLAB session.
+        if matlab_status != "up":
+            self.is_kernel_path_added = False
+
+        if self.health_monitor is not None:
+            self.health_monitor.update(
+                is_matlab_licensed, matlab_status, matlab_proxy_has_error
+            )
+
+    def create_health_monitor(self):
+        """
+        Creates the monitor of the status of the matlab-proxy of the kernel. The
+        status is shared with the other kernels using the same matlab-proxy
+        through a file in the Jupyter runtime directory.
+        """
+        runtime_dir = _get_jupyter_runtime_dir()
+        status_file = None
+        if runtime_dir is not None and os.path.isdir(runtime_dir):
+            status_file = health.get_status_file(runtime_dir, self.murl)
+        return health.HealthMonitor(
+            self.murl,
+            self.headers,
+            status_file,
+            kernel_env.get_int(
+                kernel_env.get_env_name_health_check_interval(),
+                health.DEFAULT_HEALTH_CHECK_INTERVAL,
+            ),
+            on_down=self.forget_kernel_path,
+        )
+
+    def forget_kernel_path(self):
+        """
+        Adds the MATLAB code shipped with the kernel to the path again with the
+        next request, as MATLAB was found not up, possibly because it restarted.
+        Called by the health monitor, which checks MATLAB in the background.
+        """
+        self.is_kernel_path_added = False
+
+    def get_matlab_failure(self):
+        """
+        Returns the message explaining why MATLAB is not available while MATLAB
+        is known to be down, else None.
+        """
+        if self.health_monitor is None:
+            return None
+        return self.health_monitor.get_failure()
+
+    async def fetch_matlab_status(self):
+        """
+        Fetches the status of MATLAB from matlab-proxy and updates the state of
+        the kernel.
+
+        Raises:
+            HTTPError: Occurs when connection to matlab-proxy cannot be established.
+        """
+        self.update_matlab_status(
+            *await self.run_in_executor(
+                mwi_comm_helpers.fetch_matlab_proxy_status,
+                self.murl,
+                self.headers,
+                self.http_session,
+            )
+        )
+
+    def prewarm_matlab(self, url, headers, is_matlab_licensed, startup_timeout):
+        """
+        Waits for MATLAB to start, adds the MATLAB code shipped with the kernel
+        to the MATLAB path and starts loading the page which converts symbolic
+        outputs. Runs on a dedicated thread after the kernel has started, when
+        MWI_KERNEL_EAGER_START is set to true.
+
+        The state of the kernel is not changed by this thread. The result is
+        applied by wait_for_prewarm, on the event loop of the kernel.
+
+        Waiting for licensing information is left to the first execution request,
+        which displays the licensing window.
+
+        Returns:
+            dict: The last "status" of MATLAB, as returned by
+                  mwi_comm_helpers.fetch_matlab_proxy_status, and whether the
+                  kernel path was added ("is_kernel_path_added").
+        """
+        http_session = mwi_comm_helpers.create_http_session(pool_size=1)
+        try:
+            status = None
+            if is_matlab_licensed:
+                status = self._wait_for_matlab_up(
+                    url, headers, http_session, startup_timeout
+                )
+            if status is None or status[1] != "up" or status[2]:
+                return {"status": status, "is_kernel_path_added": False}
+
+            mwi_comm_helpers.add_kernel_path_to_matlab(url, headers, http_session)
+
+            # Preparing MATLAB for later requests is only an optimization.
+            try:
+                mwi_comm_helpers.send_warmup_request_to_matlab(
+                    url, headers, http_session, add_kernel_path=False
+                )
+            except Exception as e:
+                self.log.debug(f"Failed to warm up MATLAB: {e}")
+            return {"status": status, "is_kernel_path_added": True}
+        finally:
+            http_session.close()
+
+    def prewarm_claimed_session(self, session_future, startup_timeout):
+        """
+        Warms up the MATLAB session claimed in the background, like
+        prewarm_matlab. Runs on the thread which claimed the session, once the
+        session is claimed.
+        """
+        _, matlab_session, status = session_future.result()
+        if matlab_session["needs_reset"]:
+            # MATLAB is cleared by the startup checks once it is up.
+            return {"status": None, "is_kernel_path_added": False}
+        return self.prewarm_matlab(
+            matlab_session["url"],
+            matlab_session["headers"],
+            status[0],
+            startup_timeout,
+        )
+
+    @staticmethod
+    def _wait_for_matlab_up(url, headers, http_session, startup_timeout):
+        # Polls the status of MATLAB like wait_for_matlab_startup, without
+        # changing the state of the kernel.
+        deadline = time.monotonic() + startup_timeout
+        poll_interval = STARTUP_POLL_INITIAL_INTERVAL
+        status = mwi_comm_helpers.fetch_matlab_proxy_status(url, headers, http_session)
+        while status[1] != "up" and not status[2] and time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            poll_interval = min(
+                poll_interval * STARTUP_POLL_BACKOFF, STARTUP_POLL_MAX_INTERVAL
+            )
+            status = mwi_comm_helpers.fetch_matlab_proxy_status(
+                url, headers, http_session
+            )
+        return status
+
+    async def wait_for_prewarm(self):
+        """
+        Waits for the background startup of MATLAB started by the kernel to
+        finish, and applies its result to the state of the kernel. Any error is
+        ignored here, as it is reported by the startup checks which follow.
+        """
+        if self.prewarm_future is None:
+            return
+
+        if not self.prewarm_future.done():
+            self.display_notice("Starting MATLAB ...\n")
+        try:
+            result = await asyncio.wrap_future(self.prewarm_future)
+            if result["status"] is not None:
+                self.update_matlab_status(*result["status"])
+            if result["is_kernel_path_added"]:
+                self.is_kernel_path_added = True
+        except Exception as err:
+            self.log.debug("Background startup of MATLAB failed: %s", err)
+        self.prewarm_future = None
+
+    async def perform_startup_checks(self):
         """
         One time checks triggered during the first execution request. Displays
         login window if matlab is not licensed using matlab-proxy.
@@ -368,11 +1780,19 @@ class MATLABKernel(ipykernel.kernelbase.Kernel):
         if self.startup_error is not None:
             raise self.startup_error
 
-        (
-            self.is_matlab_licensed,
-            self.matlab_status,
-            self.matlab_proxy_has_error,
-        ) = mwi_comm_helpers.fetch_matlab_proxy_status(self.murl, self.headers)
+        await self.fetch_matlab_status()
+
+        # The matlab-proxy of a MATLAB session from the pool is not reachable
+        # from the browser, hence licensing information must be provided
+        # beforehand.
+        if not self.is_matlab_licensed and self.matlab_session is not None:
+            raise MATLABConnectionError(
+                """
+                Error: MATLAB Kernel could not start MATLAB.\n
+                Reason: MATLAB is not licensed.\n
+                Resolution: Provide licensing information by clicking "Open MATLAB" in the Jupyter launcher, or by setting the environment variable MLM_LICENSE_FILE, and restart the kernel.
+                """
+            )
 
         # Display iframe containing matlab-proxy to show login window if MATLAB
         # is not licensed using matlab-proxy. The iframe is removed after MATLAB
@@ -398,39 +1818,85 @@ class MATLABKernel(ipykernel.kernelbase.Kernel):
             )
 
         # Wait until MATLAB is started before sending requests.
-        timeout = 0
-        MATLAB_STARTUP_MAX_TIMEOUT = 120
-        while (
-            self.matlab_status != "up"
-            and timeout != MATLAB_STARTUP_MAX_TIMEOUT
-            and not self.matlab_proxy_has_error
-        ):
+        await self.wait_for_matlab_startup()
+
+        # Clear the dedicated MATLAB, if the kernel which used it before did not.
+        if self.matlab_session is not None and self.matlab_session["needs_reset"]:
+            await self.run_in_executor(
+                mwi_comm_helpers.reset_matlab_session,
+                self.murl,
+                self.headers,
+                self.http_session,
+            )
+            self.matlab_session["needs_reset"] = False
+
+    async def wait_for_matlab_startup(self, display_progress=True):
+        """
+        Waits until MATLAB is up by polling the status of matlab-proxy. The polling
+        interval starts small and grows up to a limit, so that a MATLAB which is
+        almost ready is detected quickly while a MATLAB waiting for licensing
+        information is not polled more often than necessary.
+
+        The startup timeout is measured in wall-clock time from the moment the
+        licensing information is available, either through user input or through
+        the matlab-proxy cache. The duration of each startup phase is logged and
+        stored in self.startup_timings.
+
+        Args:
+            display_progress (bool): Whether to display a message in the output of
+                                     the current cell while MATLAB is starting.
+
+        Raises:
+            HTTPError, MATLABConnectionError: Occurs when matlab-proxy is not started or
+                                              MATLAB does not start within the timeout.
+        """
+        loop = asyncio.get_running_loop()
+        wait_start_time = loop.time()
+        licensed_time = wait_start_time if self.is_matlab_licensed else None
+        poll_interval = STARTUP_POLL_INITIAL_INTERVAL
+        is_starting_message_displayed = False
+
+        while self.matlab_status != "up" and not self.matlab_proxy_has_error:
             if self.is_matlab_licensed:
-                if timeout == 0:
+                if licensed_time is None:
+                    # Licensing information was just provided, poll quickly again.
+                    licensed_time = loop.time()
+                    poll_interval = STARTUP_POLL_INITIAL_INTERVAL
+
+                if display_progress and not is_starting_message_displayed:
+                    is_starting_message_displayed = True
                     self.display_output(
                         {"type": "clear_output", "content": {"wait": False}}
                     )
-                    self.display_output(
-                        {
-                            "type": "stream",
-                            "content": {
-                                "name": "stdout",
-                                "text": f"Starting MATLAB ...\n",
-                            },
-                        }
-                    )
-                timeout += 1
-            time.sleep(1)
-            (
-                self.is_matlab_licensed,
-                self.matlab_status,
-                self.matlab_proxy_has_error,
-            ) = mwi_comm_helpers.fetch_matlab_proxy_status(self.murl, self.headers)
-
-        # If MATLAB is not available after 15 seconds of licensing information
-        # being available either through user input or through matlab-proxy cache,
-        # then display connection error to the user.
-        if timeout == MATLAB_STARTUP_MAX_TIMEOUT or self.matlab_proxy_has_error:
+                    self.display_notice("Starting MATLAB ...\n")
+
+                # If MATLAB is not available within the timeout, display connection
+                # error to the user.
+                if loop.time() - licensed_time >= self.matlab_startup_timeout:
+                    break
+                max_poll_interval = STARTUP_POLL_MAX_INTERVAL
+            else:
+                max_poll_interval = LICENSING_POLL_MAX_INTERVAL
+
+            await asyncio.sleep(poll_interval)
+            poll_interval = min(poll_interval * STARTUP_POLL_BACKOFF, max_poll_interval)
+            await self.fetch_matlab_status()
+
+        end_time = loop.time()
+        if licensed_time is None:
+            licensed_time = end_time
+        self.startup_timings = {
+            "licensing": licensed_time - wait_start_time,
+            "matlab_startup": end_time - licensed_time,
+        }
+        self.log.info(
+            "MATLAB startup wait finished with status '%s'. Waited %.2fs for licensing and %.2fs for MATLAB to start.",
+            self.matlab_status,
+            self.startup_timings["licensing"],
+            self.startup_timings["matlab_startup"],
+        )
+
+        if self.matlab_status != "up" or self.matlab_proxy_has_error:
             raise MATLABConnectionError
 
     def display_output(self, out):
@@ -458,14 +1924,84 @@ class MATLABKernel(ipykernel.kernelbase.Kernel):
             out (dict): A dictionary containing the type of output and the content of the output.
         """
         msg_type = out["type"]
+        if msg_type == "workspace":
+            # Changes of the workspace, which are not shown to the user.
+            self.workspace_cache.apply(out["content"])
+            return
+
+        if msg_type == "timings":
+            # Time spent by MATLAB on the request, which is not shown to the user.
+            for span, seconds in out["content"].items():
+                self.metrics.observe(f"matlab.{span}", seconds)
+                self.matlab_seconds += seconds
+            return
+
         if msg_type == "execute_result":
             assert len(out["mimetype"]) == len(out["value"])
+            # Skip figures which were already published in the outputs of the cell.
+            if not self.figure_tracker.track(out):
+                return
+
+            # Only the first rows of large variables are displayed. Let the
+            # frontend know that it can request the other rows.
+            metadata = {}
+            if "pageable" in out:
+                metadata[VARIABLE_PAGER_TARGET] = {
+                    "variable": out["pageable"]["name"],
+                    "rows": out["pageable"]["rows"],
+                    "columns": out["pageable"]["columns"],
+                    "page_size": DEFAULT_VARIABLE_PAGE_SIZE,
+                }
+
             response = {
                 # Use zip to create a tuple of KV pair of mimetype and value.
                 "data": dict(zip(out["mimetype"], out["value"])),
-                "metadata": {},
+                "metadata": metadata,
                 "execution_count": self.execution_count,
             }
+        elif msg_type == "stream":
+            for name, text in self.stream_coalescer.write(
+                out["content"]["name"], out["content"]["text"]
+            ):
+                self.send_response(
+                    self.iopub_socket, "stream", {"name": name, "text": text}
+                )
+            return
         else:
             response = out["content"]
+
+        # Publish the stream outputs received before this output first.
+        self.flush_stream_outputs(force=True)
         self.send_response(self.iopub_socket, msg_type, response)
+
+    def display_notice(self, text):
+        """
+        Displays a notice of the kernel in the output of the current cell right
+        away, as the kernel usually waits for MATLAB after displaying it.
+
+        Args:
+            text (string): Text of the notice.
+        """
+        self.display_output(
+            {"type": "stream", "content": {"name": "stdout", "text": text}}
+        )
+        self.flush_stream_outputs(force=True)
+
+    def flush_stream_outputs(self, force=False, final=False):
+        """
+        Publishes the stream outputs merged by the stream coalescer, if the flush
+        interval has elapsed since the last stream message.
+
+        Args:
+            force (bool): Publish the outputs regardless of the flush interval.
+            final (bool): Whether the cell is executed. Also publishes a summary of
+                          the outputs which were suppressed.
+        """
+        if force or final:
+            messages = self.stream_coalescer.flush(final=final)
+        else:
+            messages = self.stream_coalescer.flush_due()
+        for name, text in messages:
+            self.send_response(
+                self.iopub_socket, "stream", {"name": name, "text": text}
+            )
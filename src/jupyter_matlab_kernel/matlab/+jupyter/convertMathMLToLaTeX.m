@@ -0,0 +1,96 @@
+% IMPORTANT NOTICE:
+% This file may contain calls to MathWorks internal APIs which are subject to
+% change without any prior notice. Usage of these undocumented APIs outside of
+% these files is not supported.
+
+function latex = convertMathMLToLaTeX(mathml)
+% CONVERTMATHMLTOLATEX A helper function to convert the MathML representation of
+% symbolic expressions to LaTeX, using the EquationRenderer JS API of the page
+% of the Live Editor loaded in a webwindow. All the expressions are converted
+% in a single call to the page, and the conversions are cached so that
+% expressions which were already converted, for example when a cell is
+% executed again, do not require a call to the page.
+%   Inputs:
+%       mathml - cell array - MathML of each expression. When called without
+%                             inputs, the page is loaded in the background and
+%                             the function returns immediately.
+%   Outputs:
+%       latex  - cell array - LaTeX of each expression. The elements are empty
+%                             if the page could not be loaded.
+
+% Copyright 2023 The MathWorks, Inc.
+
+% Use persistent variables to avoid loading multiple webwindows.
+persistent webwindow;
+persistent idler;
+persistent cache;
+persistent cacheKeys;
+
+% Maximum number of conversions kept in the cache. The oldest conversions are
+% removed first.
+maxCacheSize = 256;
+
+if isempty(webwindow)
+    url = 'toolbox/matlab/codetools/liveeditor/index.html';
+
+    % MATLAB versions R2020b and R2021a requires specifying the base url.
+    % Not doing so results in the URL not being loaded with the error
+    %"Not found. Request outside of context root".
+    if verLessThan('matlab','9.11')
+        url = strcat(getenv("MWI_BASE_URL"), '/', url);
+    end
+    webwindow = matlab.internal.cef.webwindow(connector.getUrl(url));
+    idler = jupyter.Idler;
+    webwindow.PageLoadFinishedCallback = @(a,b) pageLoadCallback(a,b,idler);
+    cache = containers.Map('KeyType', 'char', 'ValueType', 'char');
+    cacheKeys = {};
+end
+
+if nargin == 0
+    latex = {};
+    return
+end
+
+latex = repmat({''}, size(mathml));
+hashes = cellfun(@hashMathML, mathml, 'UniformOutput', false);
+isCached = cellfun(@(hash) isKey(cache, hash), hashes);
+latex(isCached) = values(cache, hashes(isCached));
+if all(isCached)
+    return
+end
+
+% This will block the thread until stop loading is called. The values are logical
+pageLoaded = idler.startIdling(10);
+if ~pageLoaded
+    return
+end
+
+% Convert each distinct expression once, in a single call to the page.
+[uncachedMathML, firstIndices, uniqueIndices] = unique(mathml(~isCached));
+converted = jsondecode(webwindow.executeJS(sprintf([ ...
+    'eq = require("equationrenderercore/EquationRenderer"); ' ...
+    '%s.map(function (mathml) { return eq.convertMathMLToLaTeX(mathml); })'], ...
+    jsonencode(uncachedMathML))));
+converted = cellstr(converted);
+latex(~isCached) = converted(uniqueIndices);
+
+uncachedHashes = hashes(~isCached);
+for ii = 1:length(converted)
+    hash = uncachedHashes{firstIndices(ii)};
+    cache(hash) = converted{ii};
+    cacheKeys{end+1} = hash; %#ok<AGROW>
+end
+if length(cacheKeys) > maxCacheSize
+    remove(cache, cacheKeys(1:end-maxCacheSize));
+    cacheKeys = cacheKeys(end-maxCacheSize+1:end);
+end
+
+% Helper function to compute the key of an expression in the cache.
+function key = hashMathML(mathml)
+digest = java.security.MessageDigest.getInstance('SHA-1');
+hash = typecast(digest.digest(unicode2native(char(mathml), 'UTF-8')), 'uint8');
+key = sprintf('%02x', hash);
+
+% Helper function to notify browser page load finished
+function pageLoadCallback(~,~,idler)
+idler.stopIdling();
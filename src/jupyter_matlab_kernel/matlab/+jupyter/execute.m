@@ -3,7 +3,7 @@
 % change without any prior notice. Usage of these undocumented APIs outside of
 % these files is not supported.
 
-function result = execute(code)
+function [result, hasError] = execute(code, options)
 % EXECUTE A helper function for handling execution of MATLAB code and post-processing
 % the outputs to conform to Jupyter API. We use the Live Editor API for majority
 % of the work.
@@ -11,9 +11,99 @@ function result = execute(code)
 % The entire MATLAB code given by user is treated as code within a single cell
 % of a unique Live Script. Hence, each execution request can be considered as
 % creating and running a new Live Script file.
+%
+% hasError is true if the code errored.
+%
+% options is an optional struct with the following fields:
+%   outputFile - string - When present, the sections of the code are executed
+%                         one after the other and the outputs of each section are
+%                         appended to this file as soon as the section finishes,
+%                         one JSON encoded output per line. The kernel reads the
+%                         file while the code is executing to stream the outputs
+%                         to the notebook. An empty result is returned.
+%   figureFormat - string - Image format of figures, 'png' or 'jpeg'. Figures
+%                           are captured as PNG images by default.
+%   figureQuality - double - Quality, between 1 and 100, of JPEG figures.
+%   figureMaxWidth - double - Maximum width of figures in pixels.
+%   figureMaxHeight - double - Maximum height of figures in pixels. Larger
+%                              figures are scaled down to fit.
+%   collectTimings - logical - When true, an output of type 'timings' is
+%                              appended to the outputs of each region, with
+%                              the seconds spent evaluating the region and
+%                              post-processing its outputs.
+%   workspaceKey - string - When present, an output of type 'workspace' is
+%                           appended to the outputs, with the changes of the
+%                           base workspace since the previous execution with the
+%                           same key. See +jupyter/getWorkspaceChanges.m
+%   workspaceReset - logical - When true, the output of type 'workspace' lists
+%                              all the variables of the base workspace.
 
 % Copyright 2023 The MathWorks, Inc.
 
+if nargin < 2
+    options = struct();
+end
+
+% Disable Hotlinks in the output captured. The hotlinks do not have a purpose
+% in Jupyter notebooks.
+hotlinksPreviousState = feature('hotlinks','off');
+hotlinksCleanupObj = onCleanup(@() feature('hotlinks', hotlinksPreviousState));
+
+if isfield(options, 'outputFile')
+    hasError = executeSections(code, options);
+    result = {};
+else
+    [result, hasError] = evaluateRegion(code, code, 1, options);
+end
+
+if isfield(options, 'workspaceKey')
+    result{end+1} = jupyter.getWorkspaceChanges(options.workspaceKey, ...
+        isfield(options, 'workspaceReset') && options.workspaceReset);
+end
+
+% Helper function to execute the sections of the code one after the other and
+% write the outputs of each section to the outputFile. Like in a Live Script,
+% execution stops at the first section which errors.
+function hasError = executeSections(code, options)
+hasError = false;
+[sections, lineNumbers] = splitSections(code);
+for ii = 1:length(sections)
+    [outputs, hasError] = evaluateRegion(sections{ii}, code, lineNumbers(ii), options);
+    appendOutputs(options.outputFile, outputs);
+    if hasError
+        break
+    end
+end
+
+% Helper function to split the code at section breaks i.e. lines starting with
+% "%%". Returns the code of each section and the line number at which it starts.
+function [sections, lineNumbers] = splitSections(code)
+codeLines = splitlines(string(code));
+breakLines = find(~cellfun(@isempty, regexp(cellstr(codeLines), '^\s*%%(\s|$)', 'once')));
+startLines = unique([1; breakLines(:)]);
+endLines = [startLines(2:end) - 1; length(codeLines)];
+sections = cell(1, length(startLines));
+for ii = 1:length(startLines)
+    sections{ii} = char(join(codeLines(startLines(ii):endLines(ii)), newline));
+end
+lineNumbers = startLines;
+
+% Helper function to append outputs to the outputFile, one JSON encoded output
+% per line. The file is closed after writing so that the outputs are visible to
+% the kernel immediately.
+function appendOutputs(outputFile, outputs)
+fid = fopen(outputFile, 'a', 'n', 'UTF-8');
+fileCleanupObj = onCleanup(@() fclose(fid));
+for ii = 1:length(outputs)
+    if ~isempty(outputs{ii})
+        fprintf(fid, '%s\n', jsonencode(outputs{ii}));
+    end
+end
+
+% Helper function to execute a region of the code using the Live Editor API and
+% post-process its outputs. fullText is the complete code of the cell and
+% lineNumber is the line of fullText at which the region starts.
+function [result, hasError] = evaluateRegion(code, fullText, lineNumber, options)
 % Embed user MATLAB code in a try-catch block for MATLAB versions less than R2022b.
 % This is will disable inbuilt ErrorRecovery mechanism. Any exceptions created in
 % user code would be handled by +jupyter/getOrStashExceptions.m
@@ -33,30 +123,36 @@ fileToShowErrors = 'Notebook';
 
 % Prepare the input for the Live Editor API.
 jsonedRegionList = jsonencode(struct(...
-    'regionLineNumber',1,...
+    'regionLineNumber',lineNumber,...
     'regionString',code,...
     'regionNumber',0,...
     'endOfSection',true,...
     'sectionNumber',1));
 request = struct('requestId', 'jupyter_matlab_kernel',...
     'regionArray', jsonedRegionList,...
-    'fullText', code,...
+    'fullText', fullText,...
     'fullFilePath', fileToShowErrors);
 
-% Disable Hotlinks in the output captured. The hotlinks do not have a purpose
-% in Jupyter notebooks.
-hotlinksPreviousState = feature('hotlinks','off');
-hotlinksCleanupObj = onCleanup(@() feature('hotlinks', hotlinksPreviousState));
-
 % Use the Live editor API for execution of MATLAB code and capturing the outputs
+evaluateTimer = tic;
 resp = jsondecode(matlab.internal.editor.evaluateSynchronousRequest(request));
+evaluateTime = toc(evaluateTimer);
 
 % Post-process the outputs to conform to Jupyter API.
-result = processOutputs(resp.outputs);
+processTimer = tic;
+[result, hasError] = processOutputs(resp.outputs, options);
+
+if isfield(options, 'collectTimings') && options.collectTimings
+    timings.type = 'timings';
+    timings.content = struct('evaluate', evaluateTime, 'process_outputs', toc(processTimer));
+    result{end+1} = timings;
+end
 
-function result = processOutputs(outputs)
+function [result, hasError] = processOutputs(outputs, options)
 result =cell(1,length(outputs));
+hasError = false;
 figureTrackingMap = containers.Map;
+symbolicIndices = [];
 
 % Post process each captured output based on its type.
 for ii = 1:length(outputs)
@@ -70,9 +166,12 @@ for ii = 1:length(outputs)
         case 'variableString'
             result{ii} = processVariable(outputData);
         case 'symbolic'
-            result{ii} = processSymbolic(outputData);
+            % Symbolic outputs are converted together once all the outputs
+            % are processed.
+            symbolicIndices(end+1) = ii; %#ok<AGROW>
         case 'error'
             result{ii} = processStream('stderr', outputData.text);
+            hasError = true;
         case 'warning'
             result{ii} = processStream('stderr', outputData.text);
         case 'text'
@@ -97,14 +196,19 @@ for ii = 1:length(outputs)
                 else
                     idx = ii;
                 end
-                result{idx} = processFigure(outputData.figureImage);
+                result{idx} = processFigure(outputData.figureImage, options);
             end
     end
 end
 
+if ~isempty(symbolicIndices)
+    result(symbolicIndices) = processSymbolic({outputs(symbolicIndices).outputData});
+end
+
 ME = jupyter.getOrStashExceptions([], true);
 if ~isempty(ME)
     result{end+1} = processStream('stderr', ME.message);
+    hasError = true;
 end
 
 % Helper functions to post process output of type 'matrix', 'variable' and
@@ -117,63 +221,81 @@ result.value = [sprintf("<html><body><pre>%s</pre></body></html>",text), text];
 
 function result = processMatrix(output)
 text = sprintf("%s = %s %s\n%s", output.name, output.header, output.type, output.value);
-if output.rows > 10 || output.columns > 30
+isTruncated = output.rows > 10 || output.columns > 30;
+if isTruncated
     text = strcat(text, "...");
 end
 result = processText(text);
 
+% Only the first rows of large matrices are displayed. The kernel serves the
+% remaining rows on request, hence the size of the variable is sent along.
+if isTruncated && ~isempty(output.name)
+    result.pageable = struct('name', output.name, 'rows', output.rows, 'columns', output.columns);
+end
+
 function result = processVariable(output)
 text = sprintf("%s = %s\n   %s", output.name, output.header, strtrim(output.value));
 result = processText(text);
 
-% Helper function for post-processing symbolic outputs. The captured output
-% contains MathML representation of symbolic expressions. Since Jupyter and
-% GitHub have native support for LaTeX, we use EquationRenderer JS API to
-% convert the MathML to LaTeX values.
-function result = processSymbolic(output)
-% Use persistent variables to avoid loading multiple webwindows.
-persistent webwindow;
-persistent idler;
-
-if isempty(webwindow)
-    url = 'toolbox/matlab/codetools/liveeditor/index.html';
-
-    % MATLAB versions R2020b and R2021a requires specifying the base url.
-    % Not doing so results in the URL not being loaded with the error
-    %"Not found. Request outside of context root".
-    if verLessThan('matlab','9.11')
-        url = strcat(getenv("MWI_BASE_URL"), '/', url);
-    end
-    webwindow = matlab.internal.cef.webwindow(connector.getUrl(url));
-    idler = jupyter.Idler;
-    webwindow.PageLoadFinishedCallback = @(a,b) pageLoadCallback(a,b,idler);
+% Large tables, cell arrays and arrays with more than two dimensions are also
+% only partially displayed. Their size is read from the base workspace.
+pageable = getPageable(output.name);
+if ~isempty(pageable)
+    result.pageable = pageable;
 end
 
-% This will block the thread until stop loading is called. The values are logical
-pageLoaded = idler.startIdling(10);
-
-% If page is not loaded succesfully. We fallback to embedding MathML inside HTML.
-% This will render the symbolic output in JupyterLab and Classic Notebook but not
-% in GitHub.
-if ~pageLoaded
-    result = processText(output.value);
+% Helper function which returns the size of a variable of the base workspace
+% which has more rows than are displayed in the outputs, or [] if the variable
+% is displayed in full or cannot be paged.
+function pageable = getPageable(name)
+pageable = [];
+if isempty(name) || ~isvarname(name) || ...
+        ~evalin('base', sprintf('exist(''%s'', ''var'')', name))
     return
 end
 
-%  Use the EquationRenderer JS API to convert MathML to LaTeX.
-webwindow.executeJS('eq = require("equationrenderercore/EquationRenderer")');
-latexcode = jsondecode(webwindow.executeJS(sprintf('eq.convertMathMLToLaTeX(%s)', jsonencode(output.value))));
-if isempty(output.name)
-    % If there is no variable name captured, then we only display the symbolic equation.
-    % This happens in cases such as "disp(exp(b))".
-    latexcode = strcat('$',latexcode,'$');
-else
-    latexcode = strcat('$',output.name,' = ',latexcode,'$');
+value = evalin('base', name);
+isArray = isnumeric(value) || islogical(value) || ischar(value) || isstring(value);
+if ~(isArray || istable(value) || istimetable(value) || iscell(value)) || ...
+        size(value, 1) <= 10
+    return
 end
+pageable = struct('name', name, 'rows', size(value, 1), 'columns', size(value, 2));
 
-result.type = 'execute_result';
-result.mimetype = {"text/latex"};
-result.value = {latexcode};
+% Helper function for post-processing symbolic outputs. The captured outputs
+% contain MathML representation of symbolic expressions. Since Jupyter and
+% GitHub have native support for LaTeX, we use EquationRenderer JS API to
+% convert the MathML to LaTeX values. All the symbolic outputs of the code are
+% converted together.
+function result = processSymbolic(outputs)
+mathml = cellfun(@(output) char(output.value), outputs, 'UniformOutput', false);
+latex = jupyter.convertMathMLToLaTeX(mathml);
+
+result = cell(1, length(outputs));
+for ii = 1:length(outputs)
+    output = outputs{ii};
+
+    % If the expression could not be converted, for example when the page
+    % could not be loaded, we fallback to embedding MathML inside HTML. This
+    % will render the symbolic output in JupyterLab and Classic Notebook but not
+    % in GitHub.
+    if isempty(latex{ii})
+        result{ii} = processText(output.value);
+        continue
+    end
+
+    if isempty(output.name)
+        % If there is no variable name captured, then we only display the symbolic equation.
+        % This happens in cases such as "disp(exp(b))".
+        latexcode = strcat('$',latex{ii},'$');
+    else
+        latexcode = strcat('$',output.name,' = ',latex{ii},'$');
+    end
+
+    result{ii}.type = 'execute_result';
+    result{ii}.mimetype = {"text/latex"};
+    result{ii}.value = {latexcode};
+end
 
 % Helper function for processing outputs of stream type such as 'stdout' and 'stderr'
 function result = processStream(stream, text)
@@ -183,12 +305,85 @@ result.content.text = text;
 
 % Helper function for processing figure outputs.
 % base64Data will be "data:image/png;base64,<base64_value>"
-function result = processFigure(base64Data)
+function result = processFigure(base64Data, options)
 result.type = 'execute_result';
 base64DataSplit = split(base64Data,";");
-result.mimetype = {extractAfter(base64DataSplit{1},5)};
-result.value = {extractAfter(base64DataSplit{2},7)};
+mimetype = extractAfter(base64DataSplit{1},5);
+value = extractAfter(base64DataSplit{2},7);
+
+% Resize and re-encode the figure if requested. The size of the figure as
+% captured is sent along, so that the kernel can report the bytes saved.
+if any(isfield(options, {'figureFormat', 'figureMaxWidth', 'figureMaxHeight'}))
+    try
+        [newMimetype, newValue] = transcodeFigure(value, options);
+        % Keep the captured figure if re-encoding it in the same format did
+        % not make it smaller.
+        if ~strcmp(newMimetype, mimetype) || strlength(newValue) < strlength(value)
+            result.originalSize = strlength(value);
+            mimetype = newMimetype;
+            value = newValue;
+        end
+    catch
+        % Fallback to the captured figure if it could not be re-encoded.
+    end
+end
+
+result.mimetype = {mimetype};
+result.value = {value};
+
+% Helper function to resize a base64 encoded PNG figure to fit within the
+% maximum width and height, and encode it in the requested format. The figure
+% is scaled down by sampling its rows and columns, which does not require
+% any toolbox.
+function [mimetype, value] = transcodeFigure(value, options)
+inputFile = [tempname '.png'];
+outputFile = tempname;
+filesCleanupObj = onCleanup(@() deleteFiles({inputFile, outputFile}));
 
-% Helper function to notify browser page load finished
-function pageLoadCallback(~,~,idler)
-idler.stopIdling();
+fid = fopen(inputFile, 'w');
+fwrite(fid, matlab.net.base64decode(value), 'uint8');
+fclose(fid);
+
+[img, map] = imread(inputFile);
+if ~isempty(map)
+    img = uint8(255 * ind2rgb(img, map));
+end
+
+[height, width, ~] = size(img);
+scale = 1;
+if isfield(options, 'figureMaxWidth')
+    scale = min(scale, options.figureMaxWidth / width);
+end
+if isfield(options, 'figureMaxHeight')
+    scale = min(scale, options.figureMaxHeight / height);
+end
+if scale < 1
+    rows = round(linspace(1, height, max(1, floor(height * scale))));
+    columns = round(linspace(1, width, max(1, floor(width * scale))));
+    img = img(rows, columns, :);
+end
+
+if isfield(options, 'figureFormat') && strcmp(options.figureFormat, 'jpeg')
+    quality = 75;
+    if isfield(options, 'figureQuality')
+        quality = options.figureQuality;
+    end
+    imwrite(img, outputFile, 'jpg', 'Quality', quality);
+    mimetype = "image/jpeg";
+else
+    imwrite(img, outputFile, 'png');
+    mimetype = "image/png";
+end
+
+fid = fopen(outputFile, 'r');
+imageBytes = fread(fid, Inf, '*uint8');
+fclose(fid);
+value = string(matlab.net.base64encode(imageBytes));
+
+% Helper function to delete temporary files, if they exist.
+function deleteFiles(files)
+for ii = 1:length(files)
+    if isfile(files{ii})
+        delete(files{ii});
+    end
+end
@@ -0,0 +1,30 @@
+function result = executeBatch(codes, options)
+% EXECUTEBATCH A helper function to execute the MATLAB code of several cells,
+% one after the other, in a single request from the kernel. Used by the kernel
+% when several execution requests are queued, for example by "Run All".
+%   Inputs:
+%       codes   - cell array - MATLAB code of each cell, in execution order
+%       options - struct     - (Optional) execution options, see +jupyter/execute.m
+%   Outputs:
+%       cell array - struct for each executed cell. Like in a Live Script,
+%                    execution stops at the first cell which errors, hence the
+%                    result has fewer elements than codes when a cell errors.
+%                    The cell which errored is included.
+%           - outputs  - cell array - outputs of the cell, see +jupyter/execute.m
+%           - hasError - logical    - true if the cell errored
+
+% Copyright 2023 The MathWorks, Inc.
+
+if nargin < 2
+    options = struct();
+end
+
+codes = cellstr(codes);
+result = {};
+for ii = 1:length(codes)
+    [outputs, hasError] = jupyter.execute(codes{ii}, options);
+    result{end+1} = struct('outputs', {outputs}, 'hasError', hasError); %#ok<AGROW>
+    if hasError
+        break
+    end
+end
@@ -0,0 +1,51 @@
+function result = getVariablePage(name, startRow, numRows)
+% GETVARIABLEPAGE A helper function to display a page of rows of a variable in
+% the base workspace. Used by the kernel to let users page through variables
+% which are too large to be displayed in full in the outputs of a cell. Arrays
+% with more than two dimensions are paged along their first dimension.
+%   Inputs:
+%       name     - string - name of the variable in the base workspace
+%       startRow - number - first row of the page, starting from 1
+%       numRows  - number - maximum number of rows in the page
+%   Outputs:
+%       struct
+%           - name     - string - name of the variable
+%           - rows     - number - total number of rows of the variable
+%           - columns  - number - total number of columns of the variable
+%           - startRow - number - first row of the page
+%           - endRow   - number - last row of the page
+%           - text     - string - display text of the rows of the page
+
+% Copyright 2023 The MathWorks, Inc.
+
+if ~isvarname(name) || ~evalin('base', sprintf('exist(''%s'', ''var'')', name))
+    error('jupyter:getVariablePage:UndefinedVariable', ...
+        'Variable ''%s'' does not exist in the MATLAB workspace.', name);
+end
+
+value = evalin('base', name);
+rows = size(value, 1);
+columns = size(value, 2);
+startRow = max(1, min(double(startRow), rows));
+endRow = min(rows, startRow + double(numRows) - 1);
+
+% Disable Hotlinks in the output captured. The hotlinks do not have a purpose
+% in Jupyter notebooks.
+hotlinksPreviousState = feature('hotlinks','off');
+hotlinksCleanupObj = onCleanup(@() feature('hotlinks', hotlinksPreviousState));
+
+if rows == 0
+    text = '';
+else
+    % Keep the other dimensions of arrays with more than two dimensions.
+    otherDims = repmat({':'}, 1, ndims(value) - 1);
+    page = value(startRow:endRow, otherDims{:}); %#ok<NASGU>
+    text = evalc('disp(page)');
+end
+
+result.name = name;
+result.rows = rows;
+result.columns = columns;
+result.startRow = startRow;
+result.endRow = endRow;
+result.text = text;
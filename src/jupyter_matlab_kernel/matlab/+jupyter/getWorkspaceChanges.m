@@ -0,0 +1,80 @@
+function result = getWorkspaceChanges(key, reset)
+% GETWORKSPACECHANGES A helper function to describe the changes of the variables
+% in the base workspace since the previous call with the same key. Used by the
+% kernel after each execution to keep a cache of the metadata of the variables,
+% which serves inspection requests without a request to MATLAB. Only the
+% variables which were added, changed or removed are returned.
+%   Inputs:
+%       key   - string  - identifies the kernel. Kernels which share a MATLAB
+%                         each receive the changes since their own previous call.
+%       reset - logical - (Optional) when true, all the variables are returned
+%                         as if there was no previous call.
+%   Outputs:
+%       struct
+%           - type    - string - 'workspace'
+%           - content - struct
+%               - reset   - logical    - true if all the variables are returned,
+%                                        and the variables of the kernel's cache
+%                                        which are not returned are removed.
+%               - changed - cell array - struct with name, class, size (for
+%                                        example '3x3') and bytes of each added
+%                                        or changed variable
+%               - removed - cell array - names of the removed variables
+
+% Copyright 2023 The MathWorks, Inc.
+
+% Snapshots of the metadata of the variables of the last call, by key.
+persistent snapshots;
+persistent snapshotKeys;
+
+% Maximum number of snapshots kept. The snapshots of the oldest keys, usually of
+% kernels which have exited, are removed first.
+maxSnapshots = 16;
+
+if isempty(snapshots)
+    snapshots = containers.Map('KeyType', 'char', 'ValueType', 'any');
+    snapshotKeys = {};
+end
+if nargin < 2
+    reset = false;
+end
+
+key = char(key);
+variables = evalin('base', 'whos');
+current = containers.Map('KeyType', 'char', 'ValueType', 'any');
+for ii = 1:length(variables)
+    current(variables(ii).name) = struct( ...
+        'name', variables(ii).name, ...
+        'class', variables(ii).class, ...
+        'size', strjoin(arrayfun(@num2str, variables(ii).size, 'UniformOutput', false), 'x'), ...
+        'bytes', variables(ii).bytes);
+end
+
+reset = reset || ~isKey(snapshots, key);
+if reset
+    previous = containers.Map('KeyType', 'char', 'ValueType', 'any');
+else
+    previous = snapshots(key);
+end
+
+changed = {};
+names = keys(current);
+for ii = 1:length(names)
+    variable = current(names{ii});
+    if ~isKey(previous, names{ii}) || ~isequal(previous(names{ii}), variable)
+        changed{end+1} = variable; %#ok<AGROW>
+    end
+end
+removed = setdiff(keys(previous), names);
+
+if ~isKey(snapshots, key)
+    snapshotKeys{end+1} = key;
+    if length(snapshotKeys) > maxSnapshots
+        remove(snapshots, snapshotKeys{1});
+        snapshotKeys(1) = [];
+    end
+end
+snapshots(key) = current;
+
+result.type = 'workspace';
+result.content = struct('reset', reset, 'changed', {changed}, 'removed', {removed});
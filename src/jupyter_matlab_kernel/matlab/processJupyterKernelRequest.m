@@ -3,17 +3,37 @@ function result = processJupyterKernelRequest(request_type, execution_request_ty
 % features such as code execution, code completion etc.
 %   Inputs:
 %       request_type - string     - identifier to differentiate multiple features.
-%                                   Supported values are "execute" and "complete"
+%                                   Supported values are "execute",
+%                                   "execute_batch", "complete", "page",
+%                                   "help" and "warmup"
 %       execution_request_type - string - identifier to differentiate how this
-%                                   function is run in MATLAB. Supported values
-%                                   are "feval" and "eval"
+%                                   function is run in MATLAB. Supported value
+%                                   is "feval"
 %       varargin     - cell array - additional inputs which vary in number based
 %                                   on value of input request_type
 %                                   - "execute"
 %                                      - string - MATLAB code to be executed
+%                                      - string - (Optional) JSON encoded struct
+%                                                 of execution options. See
+%                                                 +jupyter/execute.m
+%                                   - "execute_batch"
+%                                      - string - JSON encoded array of the MATLAB
+%                                                 code of each cell
+%                                      - string - (Optional) JSON encoded struct
+%                                                 of execution options. See
+%                                                 +jupyter/execute.m
 %                                   - "complete"
 %                                      - string - MATLAB code
 %                                      - number - cursor position
+%                                   - "page"
+%                                      - string - name of a variable in the
+%                                                 base workspace
+%                                      - number - first row of the page
+%                                      - number - number of rows in the page
+%                                   - "help"
+%                                      - string - name of a function, class or
+%                                                 package
+%                                   - "warmup" - no inputs
 %   Outputs:
 %       - cell array on struct
 %           - type      - string - jupyter output type. Supported values are
@@ -33,24 +53,41 @@ function result = processJupyterKernelRequest(request_type, execution_request_ty
 % Lock the function on the first use to prevent it from being cleared from the memory
 mlock;
 
-code = varargin{1};
-
-% If the code is received through an eval request, it will be JSON encoded to
-% prevent the eval string to be broken down by MATLAB due to formatting. We need
-% to decode the received code to get the original user code. For example
-% "processJupyterKernelRequest('execute', 'eval', 'a = "Hello\\n''world''"')".
-if execution_request_type == "eval"
-    code = jsondecode(code);
+code = '';
+if ~isempty(varargin)
+    code = varargin{1};
 end
 
 % Delegate feature work based on request type
 try
     switch(request_type)
         case 'execute'
-            output = jupyter.execute(code);
+            if length(varargin) > 1
+                output = jupyter.execute(code, jsondecode(varargin{2}));
+            else
+                output = jupyter.execute(code);
+            end
+        case 'execute_batch'
+            if length(varargin) > 1
+                output = jupyter.executeBatch(jsondecode(code), jsondecode(varargin{2}));
+            else
+                output = jupyter.executeBatch(jsondecode(code));
+            end
         case 'complete'
             cursorPosition = varargin{2};
             output = jupyter.complete(code, cursorPosition);
+        case 'page'
+            output = jupyter.getVariablePage(code, varargin{2}, varargin{3});
+        case 'help'
+            % Help text of the function, empty if the name is unknown.
+            output = help(code);
+        case 'warmup'
+            % Load the page which converts symbolic outputs to LaTeX in the
+            % background, so that the first symbolic output does not wait for it.
+            if license('test', 'Symbolic_Toolbox') && ~isempty(ver('symbolic'))
+                jupyter.convertMathMLToLaTeX();
+            end
+            output = {};
     end
 catch ME
     % The code withing try block should be exception safe. In case anything we
@@ -61,20 +98,46 @@ catch ME
     output = {errorMessage};
 end
 
-if execution_request_type == "feval"
-    result = output;
-elseif execution_request_type == "eval"
-    % Create a temporary file to store the current results.
-    tname = [tempname(getenv("MATLAB_LOG_DIR")) '.txt'];
+% Earlier versions of the kernel wrote the results of eval requests to
+% temporary files, which were left behind when the kernel exited before reading
+% them.
+deleteOrphanedResultFiles();
+
+result = output;
+
+end
+
+% Helper function to delete the result files which were written to the
+% MATLAB_LOG_DIR folder by earlier versions of the kernel. Files modified within
+% the last hour are kept, as a kernel of an earlier version sharing this MATLAB
+% may not have read them yet. Runs at most once per hour.
+function deleteOrphanedResultFiles()
+persistent lastRun;
 
-    % Write the JSON to the temporary file.
-    fid = fopen(tname, 'w');
-    fwrite(fid, jsonencode(output));
-    fclose(fid);
+% Durations are in days, as datenum.
+minAge = 1/24;
+if ~isempty(lastRun) && now - lastRun < minAge
+    return
+end
+lastRun = now;
 
-    % Display the path of temporary file so that it is captured as response
-    % to the eval execution request type.
-    disp(tname)
+logDir = getenv("MATLAB_LOG_DIR");
+if isempty(logDir) || ~isfolder(logDir)
+    return
 end
 
+% The files were named using tempname, for example
+% "tp3a0d1c5b_8f0e_4f6c_a7e9_1234abcd5678.txt".
+files = dir(fullfile(logDir, 'tp*.txt'));
+pattern = '^tp[0-9a-f]{8}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{4}_[0-9a-f]{12}\.txt$';
+for ii = 1:length(files)
+    if ~isempty(regexp(files(ii).name, pattern, 'once')) ...
+            && now - files(ii).datenum > minAge
+        try
+            delete(fullfile(logDir, files(ii).name));
+        catch
+            % Ignore files which cannot be deleted.
+        end
+    end
+end
 end
@@ -0,0 +1,194 @@
+# Copyright 2023 The MathWorks, Inc.
+# Latency metrics of the requests handled by the kernel
+
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from jupyter_matlab_kernel import environment_variables as kernel_env
+
+# Upper bounds, in seconds, of the buckets of the latency histograms.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DEFAULT_METRICS_DUMP_INTERVAL = 10
+METRIC_NAME = "jupyter_matlab_kernel_span_duration_seconds"
+
+
+def get_metrics_file():
+    """
+    Returns the path of the file to which the metrics of the kernel are written,
+    or None if metrics are not enabled. Each kernel writes to its own file in the
+    folder set by the user, so that kernels sharing the folder do not overwrite
+    each other's metrics.
+    """
+    metrics_dir = os.environ.get(kernel_env.get_env_name_metrics_dir())
+    if not metrics_dir:
+        return None
+
+    metrics_format = os.environ.get(
+        kernel_env.get_env_name_metrics_format(), "prometheus"
+    ).lower()
+    extension = "json" if metrics_format == "json" else "prom"
+    return os.path.join(metrics_dir, f"jupyter_matlab_kernel-{os.getpid()}.{extension}")
+
+
+class Histogram:
+    """Cumulative histogram of durations, in the style of Prometheus histograms."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for idx, upper_bound in enumerate(BUCKETS):
+            if value <= upper_bound:
+                self.bucket_counts[idx] += 1
+        self.count += 1
+        self.sum += value
+
+
+class KernelMetrics:
+    """
+    Collects the time spent in each stage, or span, of the requests handled by
+    the kernel and periodically writes it to a file as histograms. The file is
+    in the Prometheus text format, to be picked up by the textfile collector of
+    the node exporter, unless its name ends with ".json".
+
+    Args:
+        metrics_file (string): Path of the file to which metrics are written. If
+                               None, metrics are collected but never written.
+        dump_interval (float): Minimum number of seconds between writes.
+        pid (int): Process id of the kernel, with which each series is labelled
+                   so that the series of the kernels sharing the metrics folder
+                   are distinct. Defaults to the id of the current process.
+    """
+
+    def __init__(
+        self,
+        metrics_file=None,
+        dump_interval=DEFAULT_METRICS_DUMP_INTERVAL,
+        pid=None,
+    ):
+        self.metrics_file = metrics_file
+        self.dump_interval = dump_interval
+        self.pid = os.getpid() if pid is None else pid
+        self.histograms = {}
+        self._last_dump_time = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.metrics_file is not None
+
+    def observe(self, span, seconds):
+        """
+        Records the duration of a span.
+
+        Args:
+            span (string): Name of the span, for example "execute.request".
+            seconds (float): Duration of the span in seconds.
+        """
+        with self._lock:
+            histogram = self.histograms.get(span)
+            if histogram is None:
+                histogram = self.histograms[span] = Histogram()
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Context manager which records the time spent in its body as a span."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                span: {
+                    "buckets": dict(zip(map(str, BUCKETS), histogram.bucket_counts)),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                }
+                for span, histogram in sorted(self.histograms.items())
+            }
+
+    def to_prometheus(self):
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in each stage of the requests handled by the MATLAB Kernel.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            for span, histogram in sorted(self.histograms.items()):
+                labels = f'pid="{self.pid}",span="{span}"'
+                for upper_bound, count in zip(BUCKETS, histogram.bucket_counts):
+                    lines.append(
+                        f'{METRIC_NAME}_bucket{{{labels},le="{upper_bound}"}} {count}'
+                    )
+                lines.append(
+                    f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {histogram.count}'
+                )
+                lines.append(f"{METRIC_NAME}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{METRIC_NAME}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, force=False):
+        """
+        Writes the metrics to the metrics file, if the dump interval has elapsed
+        since the last write. The file is replaced atomically, so that readers
+        never see a partially written file.
+
+        Args:
+            force (bool): Write the metrics regardless of the dump interval.
+        """
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+        if (
+            not force
+            and self._last_dump_time is not None
+            and now - self._last_dump_time < self.dump_interval
+        ):
+            return
+        self._last_dump_time = now
+
+        if self.metrics_file.endswith(".json"):
+            content = json.dumps(self.to_dict())
+        else:
+            content = self.to_prometheus()
+
+        metrics_dir = os.path.dirname(self.metrics_file) or "."
+        try:
+            fd, temp_file = tempfile.mkstemp(dir=metrics_dir, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            os.replace(temp_file, self.metrics_file)
+        except OSError:
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+
+    def close(self):
+        """
+        Writes the final metrics of the kernel when they are written as JSON.
+        A file in the Prometheus text format is removed instead, so that the
+        series of a kernel which is gone are no longer collected.
+        """
+        if not self.enabled:
+            return
+        if self.metrics_file.endswith(".json"):
+            self.dump(force=True)
+            return
+        try:
+            os.remove(self.metrics_file)
+        except OSError:
+            pass
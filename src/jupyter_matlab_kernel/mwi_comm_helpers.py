@@ -3,16 +3,117 @@
 
 import json
 import pathlib
+import secrets
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError
+from urllib3.util.retry import Retry
 from matlab_proxy.util.mwi.embedded_connector.helpers import (
-    get_data_to_eval_mcode,
     get_data_to_feval_mcode,
     get_mvm_endpoint,
 )
 
+from jupyter_matlab_kernel import environment_variables as kernel_env
+from jupyter_matlab_kernel import json_decoder
 
-def fetch_matlab_proxy_status(url, headers):
+# Defaults for the connection pool used to communicate with matlab-proxy. A
+# kernel has at most a handful of concurrent requests in flight (execution,
+# completion, interrupt and status checks).
+DEFAULT_HTTP_POOL_SIZE = 4
+DEFAULT_HTTP_MAX_RETRIES = 3
+
+
+def get_http_pool_size():
+    """
+    Returns the number of connections to keep in the pool of a HTTP session.
+    Configured using MWI_KERNEL_HTTP_POOL_SIZE, defaults to 4. Values below 1
+    are raised to 1, as the kernel needs at least one connection.
+    """
+    return max(
+        kernel_env.get_int(
+            kernel_env.get_env_name_http_pool_size(), DEFAULT_HTTP_POOL_SIZE
+        ),
+        1,
+    )
+
+
+class _Retry(Retry):
+    """
+    Retry policy which also retries requests that are not idempotent when
+    matlab-proxy closed the connection without responding. This happens when
+    a keep-alive connection of the pool went stale, in which case matlab-proxy
+    never received the request.
+    """
+
+    def increment(self, method=None, url=None, response=None, error=None, **kwargs):
+        if response is None and _is_connection_reset(error):
+            # Counted as a read error, with any method allowed.
+            retry = Retry.increment(
+                self.new(allowed_methods=None), method, url, response, error, **kwargs
+            )
+            return retry.new(allowed_methods=self.allowed_methods)
+        return super().increment(method, url, response, error, **kwargs)
+
+
+def _is_connection_reset(error):
+    # urllib3 reports the error of the socket wrapped in a ProtocolError.
+    if isinstance(error, ProtocolError) and len(error.args) > 1:
+        error = error.args[1]
+    return isinstance(error, (ConnectionResetError, BrokenPipeError))
+
+
+def create_http_session(pool_size=None, max_retries=None):
+    """
+    Creates a HTTP session which keeps a pool of keep-alive connections to
+    matlab-proxy. Reusing the connections avoids a TCP connection (and a TLS
+    handshake when Jupyter is served over https) for every request.
+
+    Args:
+        pool_size (int): Number of connections to keep in the pool. Defaults to
+                         the value of MWI_KERNEL_HTTP_POOL_SIZE or 4.
+        max_retries (int): Number of times a request is retried when a connection
+                           to matlab-proxy cannot be established. Defaults to the
+                           value of MWI_KERNEL_HTTP_MAX_RETRIES or 3.
+
+    Returns:
+        requests.Session: Session to be passed to the helper functions in this module.
+    """
+    if pool_size is None:
+        pool_size = get_http_pool_size()
+    if max_retries is None:
+        max_retries = kernel_env.get_int(
+            kernel_env.get_env_name_http_max_retries(), DEFAULT_HTTP_MAX_RETRIES
+        )
+
+    # Connection errors, including connections reset before any response, are
+    # retried for all requests as the request never reached matlab-proxy. Other
+    # read errors are only retried for idempotent requests, so that MATLAB code
+    # is never executed twice.
+    retry = _Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=0,
+        backoff_factor=0.1,
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.verify = False
+    return session
+
+
+def _get_http_client(session):
+    # Fallback to module level functions of requests when no session is provided.
+    return requests if session is None else session
+
+
+def fetch_matlab_proxy_status(url, headers, session=None):
     """
     Sends HTTP request to /get_status endpoint of matlab-proxy and returns
     license and MATLAB status.
@@ -20,6 +121,7 @@ def fetch_matlab_proxy_status(url, headers):
     Args:
         url (string): Url of matlab-proxy server
         headers (dict): HTTP headers required for communicating with matlab-proxy.
+        session (requests.Session): Optional session used to send the HTTP request.
 
     Returns:
         Tuple (bool, string):
@@ -31,7 +133,9 @@ def fetch_matlab_proxy_status(url, headers):
     Raises:
         HTTPError: Occurs when connection to matlab-proxy cannot be established.
     """
-    resp = requests.get(url + "/get_status", headers=headers, verify=False)
+    resp = _get_http_client(session).get(
+        url + "/get_status", headers=headers, verify=False
+    )
     if resp.status_code == requests.codes.OK:
         data = resp.json()
         is_matlab_licensed = data["licensing"] != None
@@ -42,7 +146,15 @@ def fetch_matlab_proxy_status(url, headers):
         resp.raise_for_status()
 
 
-def send_execution_request_to_matlab(url, headers, code):
+def send_execution_request_to_matlab(
+    url,
+    headers,
+    code,
+    session=None,
+    add_kernel_path=True,
+    options=None,
+    request_id=None,
+):
     """
     Evaluate MATLAB code and capture results.
 
@@ -51,6 +163,12 @@ def send_execution_request_to_matlab(url, headers, code):
         url (string): Url of matlab-proxy server
         headers (dict): HTTP headers required for communicating with matlab-proxy
         code (string): MATLAB code to be evaluated
+        session (requests.Session): Optional session used to send the HTTP request.
+        add_kernel_path (bool): Whether to add the MATLAB code shipped with the
+                                kernel to the MATLAB path before the request.
+                                Only needs to be done once per MATLAB session.
+        options (dict): Optional execution options, see +jupyter/execute.m
+        request_id (string): Optional id of the request, see generate_request_id.
 
     Returns:
         List(dict): list of outputs captured during evaluation.
@@ -58,10 +176,79 @@ def send_execution_request_to_matlab(url, headers, code):
     Raises:
         HTTPError: Occurs when connection to matlab-proxy cannot be established.
     """
-    return _send_jupyter_request_to_matlab(url, headers, "execute", [code])
+    inputs = [code]
+    if options:
+        inputs.append(json.dumps(options))
+
+    return _send_jupyter_request_to_matlab(
+        url,
+        headers,
+        "execute",
+        inputs,
+        session=session,
+        add_kernel_path=add_kernel_path,
+        request_id=request_id,
+    )
+
+
+def send_batch_execution_request_to_matlab(
+    url,
+    headers,
+    codes,
+    session=None,
+    add_kernel_path=True,
+    options=None,
+    request_id=None,
+):
+    """
+    Evaluate the MATLAB code of several cells, one after the other, in a single
+    request and capture the results of each cell. Execution stops at the first
+    cell which errors.
+
+    Args:
+        url (string): Url of matlab-proxy server
+        headers (dict): HTTP headers required for communicating with matlab-proxy
+        codes (List(string)): MATLAB code of each cell, in execution order.
+        session (requests.Session): Optional session used to send the HTTP request.
+        add_kernel_path (bool): Whether to add the MATLAB code shipped with the
+                                kernel to the MATLAB path before the request.
+        options (dict): Optional execution options, see +jupyter/execute.m
+        request_id (string): Optional id of the request, see generate_request_id.
 
+    Returns:
+        List(dict): result of each executed cell, with the "outputs" captured
+                    during its evaluation and "hasError", true if the cell
+                    errored. Cells after the first cell which errored are not
+                    executed, and have no result in the list.
 
-def send_completion_request_to_matlab(url, headers, code, cursor_pos):
+    Raises:
+        HTTPError: Occurs when connection to matlab-proxy cannot be established.
+    """
+    inputs = [json.dumps(codes)]
+    if options:
+        inputs.append(json.dumps(options))
+
+    results = _send_jupyter_request_to_matlab(
+        url,
+        headers,
+        "execute_batch",
+        inputs,
+        session=session,
+        add_kernel_path=add_kernel_path,
+        request_id=request_id,
+    )
+
+    # Errors of the kernel are returned by MATLAB as a list of outputs, instead
+    # of a list of the results of each cell. They are reported as the outputs of
+    # the first cell, which errored.
+    if results and "outputs" not in results[0]:
+        return [{"outputs": results, "hasError": True}]
+    return results
+
+
+def send_completion_request_to_matlab(
+    url, headers, code, cursor_pos, session=None, add_kernel_path=True, request_id=None
+):
     """
     Fetch Tab completion results.
 
@@ -70,6 +257,10 @@ def send_completion_request_to_matlab(url, headers, code, cursor_pos):
         headers (dict): HTTP headers required for communicating with matlab-proxy
         code (string): MATLAB code on which Tab completion is requested.
         cursor_pos (int): Position of the cursor when Tab completion is requested.
+        session (requests.Session): Optional session used to send the HTTP request.
+        add_kernel_path (bool): Whether to add the MATLAB code shipped with the
+                                kernel to the MATLAB path before the request.
+        request_id (string): Optional id of the request, see generate_request_id.
 
     Returns:
         Dict: Tab completion results similar to ipykernel's do_complete method.
@@ -88,20 +279,233 @@ def send_completion_request_to_matlab(url, headers, code, cursor_pos):
     Raises:
         HTTPError: Occurs when connection to matlab-proxy cannot be established.
     """
-    return _send_jupyter_request_to_matlab(url, headers, "complete", [code, cursor_pos])
-
-
-def send_interrupt_request_to_matlab(url, headers):
-    req_body = {
-        "messages": {
-            "Interrupt": [
-                {
-                    "uuid": "1234",
-                }
-            ]
-        }
-    }
-    resp = requests.post(
+    return _send_jupyter_request_to_matlab(
+        url,
+        headers,
+        "complete",
+        [code, cursor_pos],
+        session=session,
+        add_kernel_path=add_kernel_path,
+        request_id=request_id,
+    )
+
+
+def send_variable_page_request_to_matlab(
+    url,
+    headers,
+    name,
+    start_row,
+    num_rows,
+    session=None,
+    add_kernel_path=True,
+    request_id=None,
+):
+    """
+    Fetch a page of rows of a variable in the MATLAB workspace.
+
+    Args:
+        url (string): Url of matlab-proxy server
+        headers (dict): HTTP headers required for communicating with matlab-proxy
+        name (string): Name of the variable in the MATLAB workspace.
+        start_row (int): First row of the page, starting from 1.
+        num_rows (int): Maximum number of rows in the page.
+        session (requests.Session): Optional session used to send the HTTP request.
+        add_kernel_path (bool): Whether to add the MATLAB code shipped with the
+                                kernel to the MATLAB path before the request.
+        request_id (string): Optional id of the request, see generate_request_id.
+
+    Returns:
+        Dict: The page of the variable. See +jupyter/getVariablePage.m
+              Example: {
+                "name": "x",
+                "rows": 1000,
+                "columns": 3,
+                "startRow": 1,
+                "endRow": 20,
+                "text": "..."
+              }
+
+    Raises:
+        HTTPError: Occurs when connection to matlab-proxy cannot be established.
+        Exception: Occurs when the variable cannot be paged, for example when it
+                   does not exist in the MATLAB workspace.
+    """
+    page = _send_jupyter_request_to_matlab(
+        url,
+        headers,
+        "page",
+        [name, start_row, num_rows],
+        session=session,
+        add_kernel_path=add_kernel_path,
+        request_id=request_id,
+    )
+
+    # Errors are returned by MATLAB as a list with a single stream output.
+    if isinstance(page, list):
+        raise Exception(page[0]["content"]["text"])
+    return page
+
+
+def send_help_request_to_matlab(
+    url, headers, name, session=None, add_kernel_path=True, request_id=None
+):
+    """
+    Fetch the help text of a function, class or package.
+
+    Args:
+        url (string): Url of matlab-proxy server
+        headers (dict): HTTP headers required for communicating with matlab-proxy
+        name (string): Name of the function, class or package.
+        session (requests.Session): Optional session used to send the HTTP request.
+        add_kernel_path (bool): Whether to add the MATLAB code shipped with the
+                                kernel to the MATLAB path before the request.
+        request_id (string): Optional id of the request, see generate_request_id.
+
+    Returns:
+        string: The help text, empty if MATLAB does not know the name.
+
+    Raises:
+        HTTPError: Occurs when connection to matlab-proxy cannot be established.
+        Exception: Occurs when MATLAB fails to fetch the help text.
+    """
+    text = _send_jupyter_request_to_matlab(
+        url,
+        headers,
+        "help",
+        [name],
+        session=session,
+        add_kernel_path=add_kernel_path,
+        request_id=request_id,
+    )
+
+    # Errors are returned by MATLAB as a list with a single stream output.
+    if isinstance(text, list):
+        if text:
+            raise Exception(text[0]["content"]["text"])
+        return ""
+    return text
+
+
+def add_kernel_path_to_matlab(url, headers, session=None):
+    """
+    Adds the MATLAB code shipped with the kernel to the MATLAB path.
+
+    Args:
+        url (string): Url of matlab-proxy server
+        headers (dict): HTTP headers required for communicating with matlab-proxy
+        session (requests.Session): Optional session used to send the HTTP request.
+
+    Raises:
+        HTTPError: Occurs when connection to matlab-proxy cannot be established.
+    """
+    _send_feval_request_to_matlab(
+        url,
+        headers,
+        "addpath",
+        0,
+        _get_kernel_path(),
+        session=session,
+        add_kernel_path=False,
+    )
+
+
+def send_warmup_request_to_matlab(url, headers, session=None, add_kernel_path=True):
+    """
+    Prepares MATLAB for the requests of the kernel. Loads the page which converts
+    symbolic outputs to LaTeX in the background, if Symbolic Math Toolbox is
+    installed.
+
+    Args:
+        url (string): Url of matlab-proxy server
+        headers (dict): HTTP headers required for communicating with matlab-proxy
+        session (requests.Session): Optional session used to send the HTTP request.
+        add_kernel_path (bool): Whether to add the MATLAB code shipped with the
+                                kernel to the MATLAB path before the request.
+
+    Raises:
+        HTTPError: Occurs when connection to matlab-proxy cannot be established.
+    """
+    _send_jupyter_request_to_matlab(
+        url,
+        headers,
+        "warmup",
+        [],
+        session=session,
+        add_kernel_path=add_kernel_path,
+    )
+
+
+def read_streamed_outputs(outputs_file):
+    """
+    Reads the outputs which MATLAB has written to the outputs file of a streaming
+    execution request. MATLAB writes one JSON encoded output per line. A line
+    which is not yet completely written is left to be read by the next call.
+
+    Args:
+        outputs_file (file): File object of the outputs file opened for reading.
+
+    Yields:
+        dict: Output captured during evaluation.
+    """
+    while True:
+        position = outputs_file.tell()
+        line = outputs_file.readline()
+        if not line.endswith("\n"):
+            outputs_file.seek(position)
+            return
+        if line.strip():
+            yield json.loads(line)
+
+
+def reset_matlab_session(url, headers, session=None):
+    """
+    Clears the workspace and closes the figures of MATLAB, so that it can be
+    used by another kernel.
+
+    Args:
+        url (string): Url of matlab-proxy server
+        headers (dict): HTTP headers required for communicating with matlab-proxy
+        session (requests.Session): Optional session used to send the HTTP request.
+
+    Raises:
+        HTTPError: Occurs when connection to matlab-proxy cannot be established.
+    """
+    _send_feval_request_to_matlab(
+        url,
+        headers,
+        "evalin",
+        0,
+        "base",
+        "clear all; close all force; clc",
+        session=session,
+        add_kernel_path=False,
+    )
+
+
+def generate_request_id():
+    """
+    Returns a new id for a request to MATLAB. Ids are 8 characters long like
+    the ids generated by matlab-proxy, and identify the request when it is
+    interrupted.
+    """
+    return secrets.token_hex(4).upper()
+
+
+def send_interrupt_request_to_matlab(url, headers, request_id, session=None):
+    """
+    Interrupts a request which MATLAB is processing or which is queued in MATLAB.
+
+    Args:
+        url (string): Url of matlab-proxy server
+        headers (dict): HTTP headers required for communicating with matlab-proxy
+        request_id (string): Id of the request to interrupt.
+        session (requests.Session): Optional session used to send the HTTP request.
+
+    Raises:
+        HTTPError: Occurs when connection to matlab-proxy cannot be established.
+    """
+    req_body = {"messages": {"Interrupt": [{"uuid": request_id}]}}
+    resp = _get_http_client(session).post(
         get_mvm_endpoint(url),
         headers=headers,
         json=req_body,
@@ -111,29 +515,61 @@ def send_interrupt_request_to_matlab(url, headers):
         resp.raise_for_status()
 
 
-def _send_feval_request_to_matlab(url, headers, fname, nargout, *args):
-    # Add the MATLAB code shipped with kernel to the Path
-    path = [str(pathlib.Path(__file__).parent / "matlab")]
-    req_body = get_data_to_feval_mcode("addpath", *path, nargout=0)
-    original_request = get_data_to_feval_mcode(fname, *args, nargout=nargout)
+def _get_kernel_path():
+    # Path to the MATLAB code shipped with the kernel
+    return str(pathlib.Path(__file__).parent / "matlab")
 
-    # Add the FEval message of original request to the req_body FEval list.
-    req_body["messages"]["FEval"].append(original_request["messages"]["FEval"][0])
+
+def _is_undefined_function_fault(message, fname):
+    # MATLAB reports an undefined function when the MATLAB code shipped with the
+    # kernel is not on the path, for example after MATLAB has been restarted.
+    # Since R2020b, the message is "Unrecognized function or variable".
+    return fname in message and (
+        "Undefined function" in message
+        or "Unrecognized function or variable" in message
+    )
+
+
+def _send_feval_request_to_matlab(
+    url,
+    headers,
+    fname,
+    nargout,
+    *args,
+    session=None,
+    add_kernel_path=True,
+    request_id=None,
+):
+    req_body = get_data_to_feval_mcode(fname, *args, nargout=nargout)
+
+    # The original request is identified by the given id, so that it can be
+    # interrupted.
+    if request_id is not None:
+        req_body["uuid"] = request_id
+        req_body["messages"]["FEval"][0]["uuid"] = request_id
+
+    # Add the MATLAB code shipped with kernel to the Path. The addpath FEval is
+    # executed before the original request.
+    if add_kernel_path:
+        addpath_request = get_data_to_feval_mcode(
+            "addpath", _get_kernel_path(), nargout=0
+        )
+        req_body["messages"]["FEval"].insert(0, addpath_request["messages"]["FEval"][0])
 
     # Set the deque mode to make execution synchronous.
-    req_body["messages"]["FEval"][0]["dequeMode"] = "non_debug_prompt"
-    req_body["messages"]["FEval"][1]["dequeMode"] = "non_debug_prompt"
+    for feval_request in req_body["messages"]["FEval"]:
+        feval_request["dequeMode"] = "non_debug_prompt"
 
-    resp = requests.post(
+    resp = _get_http_client(session).post(
         get_mvm_endpoint(url),
         headers=headers,
         json=req_body,
         verify=False,
     )
     if resp.status_code == requests.codes.OK:
-        response_data = resp.json()
         try:
-            feval_response = response_data["messages"]["FEvalResponse"][1]
+            # The response of the original request is always the last one.
+            feval_response = json_decoder.decode_response(resp, "FEvalResponse")[-1]
         except KeyError:
             # In certain cases when the HTTPResponse is received, it does not
             # contain the expected data. In these cases most likely MATLAB has
@@ -149,8 +585,22 @@ def _send_feval_request_to_matlab(url, headers, fname, nargout, *args):
             # Return empty list if there are no outputs in the repsonse
             return []
 
+        # Retry with the kernel path added, in case MATLAB was restarted since
+        # the path was added.
+        fault_message = feval_response["messageFaults"][0]["message"]
+        if not add_kernel_path and _is_undefined_function_fault(fault_message, fname):
+            return _send_feval_request_to_matlab(
+                url,
+                headers,
+                fname,
+                nargout,
+                *args,
+                session=session,
+                request_id=request_id,
+            )
+
         # Handle error case. This happens when "Interrupt Kernel" is issued.
-        if feval_response["messageFaults"][0]["message"] == "":
+        if fault_message == "":
             error_message = "Failed to execute. Operation may have interrupted by user."
         else:
             error_message = "Failed to execute. Please try again."
@@ -159,98 +609,25 @@ def _send_feval_request_to_matlab(url, headers, fname, nargout, *args):
         raise resp.raise_for_status()
 
 
-def _send_eval_request_to_matlab(url, headers, mcode):
-    # Add the MATLAB code shipped with kernel to the Path
-    path = str(pathlib.Path(__file__).parent / "matlab")
-    mcode = 'addpath("' + path + '")' + ";" + mcode
-
-    req_body = get_data_to_eval_mcode(mcode)
-    resp = requests.post(
-        get_mvm_endpoint(url),
-        headers=headers,
-        json=req_body,
-        verify=False,
-    )
-    if resp.status_code == requests.codes.OK:
-        response_data = resp.json()
-        try:
-            eval_response = response_data["messages"]["EvalResponse"][0]
-        except KeyError:
-            # In certain cases when the HTTPResponse is received, it does not
-            # contain the expected data. In these cases most likely MATLAB has
-            # gone away. Hence we raise the HTTPError to indicate MATLAB is not
-            # available.
-            raise requests.HTTPError()
-
-        # If the eval request succeeded, return the json decoded result.
-        if not eval_response["isError"]:
-            result_filepath = eval_response["responseStr"].strip()
-
-            # If the filepath in the response is not empty, read the result from
-            # file and delete the file.
-            if result_filepath != "":
-                with open(result_filepath, "r") as f:
-                    result = f.read().strip()
-
-                try:
-                    import os
-
-                    os.remove(result_filepath)
-                except Exception:
-                    pass
-            else:
-                result = ""
-
-            # If result is empty, populate dummy json
-            if result == "":
-                result = "[]"
-            return json.loads(result)
-
-        # Handle the error cases
-        if eval_response["messageFaults"]:
-            # This happens when "Interrupt Kernel" is issued from a different
-            # kernel. There may be other cases also.
-            error_message = (
-                "Failed to execute. Operation may have been interrupted by user."
-            )
-        else:
-            # This happens when "Interrupt Kernel" is issued from the same kernel.
-            # The responseStr contains the error message
-            error_message = eval_response["responseStr"].strip()
-        raise Exception(error_message)
-    else:
-        raise resp.raise_for_status()
-
-
-def _send_jupyter_request_to_matlab(url, headers, request_type, inputs):
-    execution_request_type = "feval"
-
+def _send_jupyter_request_to_matlab(
+    url,
+    headers,
+    request_type,
+    inputs,
+    session=None,
+    add_kernel_path=True,
+    request_id=None,
+):
     inputs.insert(0, request_type)
-    inputs.insert(1, execution_request_type)
-
-    if execution_request_type == "feval":
-        resp = _send_feval_request_to_matlab(
-            url, headers, "processJupyterKernelRequest", 1, *inputs
-        )
-    else:
-        user_mcode = inputs[2]
-        # Construct a string which can be evaluated in MATLAB. For example
-        # "processJupyterKernelRequest('execute', 'eval', 'a = "Hello\\n''world''"')".
-        # To achieve this, we need to replace the single-quotes with two single-quotes,
-        # so that MATLAB can properly recognize the single-quotes present in user
-        # code. Also, we need to escape the backslash (\) character so that the
-        # string which needs to be evaluated isn't broken down by MATLAB due to
-        # formatting
-        args = (
-            f"'{request_type}', '{execution_request_type}', '"
-            + json.dumps(user_mcode.replace("'", "''"))
-            + f"'"
-        )
-        if request_type == "complete":
-            cursor_pos = inputs[3]
-            args = args + "," + str(cursor_pos)
-
-        eval_mcode = f"processJupyterKernelRequest({args})"
-        resp = _send_eval_request_to_matlab(url, headers, eval_mcode)
-
-    return resp
+    inputs.insert(1, "feval")
+
+    return _send_feval_request_to_matlab(
+        url,
+        headers,
+        "processJupyterKernelRequest",
+        1,
+        *inputs,
+        session=session,
+        add_kernel_path=add_kernel_path,
+        request_id=request_id,
+    )
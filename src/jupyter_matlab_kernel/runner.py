@@ -0,0 +1,433 @@
+# Copyright 2023 The MathWorks, Inc.
+# Command-line runner which executes MATLAB notebooks in parallel across a pool
+# of MATLAB sessions
+
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import requests
+
+from jupyter_matlab_kernel import figures, mwi_comm_helpers, session_pool
+
+# Default number of MATLAB sessions which execute notebooks in parallel.
+DEFAULT_SESSIONS = 2
+
+# Default number of seconds to wait for the MATLAB of a session to start. Unlike
+# a kernel, the runner usually starts its sessions from scratch.
+DEFAULT_STARTUP_TIMEOUT = 600
+
+# Interval in seconds at which the status of a session is polled while waiting
+# for its MATLAB to start.
+STARTUP_POLL_INTERVAL = 1
+
+# Serializes the progress lines printed by the sessions.
+_print_lock = threading.Lock()
+
+
+def get_runner_pool_dir():
+    """
+    Returns the folder of the pool of MATLAB sessions used by the runner. The
+    sessions are kept warm after a run, so that the next run reuses them until
+    they shut down after being idle.
+    """
+    from jupyter_core.paths import jupyter_runtime_dir
+
+    return os.path.join(jupyter_runtime_dir(), "jupyter_matlab_kernel-runner-pool")
+
+
+def find_notebooks(paths):
+    """
+    Returns the notebooks to execute, given paths of notebooks and of folders
+    which are searched recursively. Checkpoints are skipped.
+
+    Args:
+        paths (List(string)): Paths of notebooks or folders.
+
+    Returns:
+        List(string): Absolute paths of the notebooks, in the order given.
+    """
+    notebooks = []
+    for path in paths:
+        if not os.path.isdir(path):
+            notebooks.append(os.path.abspath(path))
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != ".ipynb_checkpoints")
+            notebooks += [
+                os.path.abspath(os.path.join(root, name))
+                for name in sorted(files)
+                if name.endswith(".ipynb")
+            ]
+    return notebooks
+
+
+def get_output_paths(notebooks, output_dir):
+    """
+    Returns the paths to which the executed notebooks are written. The folder
+    structure of the notebooks, relative to their common folder, is kept.
+    """
+    if not notebooks:
+        return []
+    common_dir = os.path.commonpath([os.path.dirname(nb) for nb in notebooks])
+    return [
+        os.path.join(output_dir, os.path.relpath(nb, common_dir)) for nb in notebooks
+    ]
+
+
+def wait_for_matlab(url, headers, http_session, timeout):
+    """
+    Waits until the MATLAB of a session has started.
+
+    Raises:
+        RuntimeError: Occurs when matlab-proxy reports an error, or when MATLAB
+                      does not start within the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    is_matlab_licensed = False
+    while True:
+        try:
+            (
+                is_matlab_licensed,
+                matlab_status,
+                matlab_proxy_has_error,
+            ) = mwi_comm_helpers.fetch_matlab_proxy_status(url, headers, http_session)
+            if matlab_status == "up":
+                return
+            if matlab_proxy_has_error:
+                raise RuntimeError(f"matlab-proxy at {url} failed to start MATLAB.")
+        except (requests.ConnectionError, requests.HTTPError):
+            # matlab-proxy is still starting.
+            pass
+
+        if time.monotonic() > deadline:
+            reason = "did not start" if is_matlab_licensed else "is not licensed"
+            raise RuntimeError(f"MATLAB {reason} within {timeout} seconds at {url}.")
+        time.sleep(STARTUP_POLL_INTERVAL)
+
+
+def to_notebook_outputs(outputs, execution_count):
+    """
+    Converts the outputs of a cell returned by MATLAB, see +jupyter/execute.m,
+    to notebook outputs.
+
+    Returns:
+        Tuple (List(dict), float): The notebook outputs, and the number of
+                                   seconds spent by MATLAB on the cell.
+    """
+    import nbformat
+
+    notebook_outputs = []
+    matlab_seconds = 0
+    for out in outputs:
+        if not out:
+            continue
+        output_type = out["type"]
+        if output_type == "timings":
+            matlab_seconds += sum(out["content"].values())
+        elif output_type == "execute_result":
+            notebook_outputs.append(
+                nbformat.v4.new_output(
+                    "execute_result",
+                    data=dict(zip(out["mimetype"], out["value"])),
+                    execution_count=execution_count,
+                )
+            )
+        elif output_type == "stream":
+            notebook_outputs.append(
+                nbformat.v4.new_output(
+                    "stream",
+                    name=out["content"]["name"],
+                    text=out["content"]["text"],
+                )
+            )
+        elif output_type in ("display_data", "error"):
+            notebook_outputs.append(
+                nbformat.v4.new_output(output_type, **out["content"])
+            )
+    return notebook_outputs, matlab_seconds
+
+
+def run_notebook(notebook, output_path, url, headers, http_session, add_kernel_path):
+    """
+    Executes the code cells of a notebook in a single request to MATLAB, and
+    writes the executed notebook. Like in a Live Script, execution stops at the
+    first cell which errors.
+
+    Args:
+        notebook (string): Path of the notebook.
+        output_path (string): Path to which the executed notebook is written.
+        url (string): Url of the matlab-proxy of the session.
+        headers (dict): HTTP headers required for communicating with matlab-proxy
+        http_session (requests.Session): Session used to send the HTTP requests.
+        add_kernel_path (bool): Whether to add the MATLAB code shipped with the
+                                kernel to the MATLAB path before the request.
+
+    Returns:
+        dict: Report of the execution of the notebook.
+    """
+    import nbformat
+
+    nb = nbformat.read(notebook, as_version=4)
+    code_cells = [cell for cell in nb.cells if cell.cell_type == "code"]
+
+    start_time = time.perf_counter()
+    results = []
+    if code_cells:
+        results = mwi_comm_helpers.send_batch_execution_request_to_matlab(
+            url,
+            headers,
+            [cell.source for cell in code_cells],
+            http_session,
+            add_kernel_path=add_kernel_path,
+            options=dict(figures.get_figure_options(), collectTimings=True),
+        )
+    seconds = time.perf_counter() - start_time
+
+    cell_reports = []
+    for execution_count, (cell, result) in enumerate(zip(code_cells, results), 1):
+        cell.outputs, matlab_seconds = to_notebook_outputs(
+            result["outputs"], execution_count
+        )
+        cell.execution_count = execution_count
+        cell_reports.append(
+            {
+                "execution_count": execution_count,
+                "matlab_seconds": matlab_seconds,
+                "has_error": bool(result["hasError"]),
+            }
+        )
+    for cell in code_cells[len(results) :]:
+        cell.outputs = []
+        cell.execution_count = None
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    nbformat.write(nb, output_path)
+
+    # A cell which errored may be the last cell, hence the number of executed
+    # cells does not tell whether the notebook errored.
+    has_error = len(results) < len(code_cells) or any(
+        cell["has_error"] for cell in cell_reports
+    )
+
+    return {
+        "notebook": notebook,
+        "output": output_path,
+        "status": "error" if has_error else "ok",
+        "cells": len(code_cells),
+        "executed_cells": len(results),
+        "seconds": seconds,
+        "matlab_seconds": sum(cell["matlab_seconds"] for cell in cell_reports),
+        "cell_timings": cell_reports,
+    }
+
+
+def run_notebooks(notebooks, output_paths, sessions, pool_dir, startup_timeout):
+    """
+    Executes notebooks in parallel, each MATLAB session of the pool executing
+    one notebook at a time. The workspace of a session is cleared between two
+    notebooks.
+
+    Args:
+        notebooks (List(string)): Paths of the notebooks.
+        output_paths (List(string)): Paths to which the executed notebooks are written.
+        sessions (int): Number of MATLAB sessions used in parallel.
+        pool_dir (string): Folder of the pool of MATLAB sessions.
+        startup_timeout (int): Number of seconds to wait for MATLAB to start.
+
+    Returns:
+        List(dict): Report of the execution of each notebook, in the order of
+                    the notebooks.
+    """
+    pool = session_pool.SessionPool(pool_dir, sessions)
+    pending = queue.Queue()
+    for index, (notebook, output_path) in enumerate(zip(notebooks, output_paths)):
+        pending.put((index, notebook, output_path))
+    reports = [None] * len(notebooks)
+    worker_errors = []
+
+    def work(matlab_session):
+        http_session = mwi_comm_helpers.create_http_session(pool_size=1)
+        url, headers = matlab_session["url"], matlab_session["headers"]
+        # A session left by a kernel which did not clear it is cleared before
+        # the first notebook, and each session is cleared between notebooks.
+        needs_reset = matlab_session["needs_reset"]
+        try:
+            try:
+                wait_for_matlab(url, headers, http_session, startup_timeout)
+            except RuntimeError as e:
+                # The notebooks are left to the other sessions.
+                worker_errors.append(e)
+                return
+
+            is_kernel_path_added = False
+            while True:
+                try:
+                    index, notebook, output_path = pending.get_nowait()
+                except queue.Empty:
+                    return
+
+                start_time = time.perf_counter()
+                try:
+                    if needs_reset:
+                        mwi_comm_helpers.reset_matlab_session(
+                            url, headers, http_session
+                        )
+                    needs_reset = True
+                    report = run_notebook(
+                        notebook,
+                        output_path,
+                        url,
+                        headers,
+                        http_session,
+                        add_kernel_path=not is_kernel_path_added,
+                    )
+                    is_kernel_path_added = True
+                except Exception as e:
+                    report = _get_failure_report(notebook, e)
+                    report["seconds"] = time.perf_counter() - start_time
+                report["session"] = matlab_session["id"]
+                reports[index] = report
+                _print_report(report)
+        except Exception as e:
+            # The notebooks are left to the other sessions.
+            worker_errors.append(e)
+        finally:
+            http_session.close()
+            pool.release(matlab_session, is_reset=not needs_reset)
+
+    # Sessions are claimed one after another, before any notebook runs, so
+    # that two workers never share a MATLAB.
+    matlab_sessions = []
+    for _ in range(min(sessions, len(notebooks))):
+        try:
+            matlab_sessions.append(pool.claim())
+        except Exception as e:
+            worker_errors.append(e)
+            break
+
+    workers = [
+        threading.Thread(
+            target=work, args=(matlab_session,), name=f"matlab-runner-{index}"
+        )
+        for index, matlab_session in enumerate(matlab_sessions)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    # Notebooks left when no session could start MATLAB, or when the sessions
+    # failed.
+    while not pending.empty():
+        index, notebook, _ = pending.get_nowait()
+        error = (
+            worker_errors[-1]
+            if worker_errors
+            else RuntimeError("No MATLAB session executed the notebook.")
+        )
+        reports[index] = _get_failure_report(notebook, error)
+        _print_report(reports[index])
+    return reports
+
+
+def _get_failure_report(notebook, error):
+    return {
+        "notebook": notebook,
+        "output": None,
+        "status": "failed",
+        "error": str(error),
+        "seconds": 0,
+    }
+
+
+def _print_report(report):
+    name = os.path.basename(report["notebook"])
+    if report["status"] == "failed":
+        line = f"FAILED {name}: {report['error']}"
+    else:
+        line = (
+            f"{report['status'].upper():6} {name}: {report['executed_cells']}/"
+            f"{report['cells']} cells in {report['seconds']:.2f} s"
+        )
+    with _print_lock:
+        print(line, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="jupyter-matlab-run",
+        description="Executes MATLAB notebooks in parallel across several MATLAB "
+        "sessions, and writes the executed notebooks and a timing report.",
+    )
+    parser.add_argument(
+        "notebooks", nargs="+", help="Notebooks or folders of notebooks."
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        required=True,
+        help="Folder to which the executed notebooks are written.",
+    )
+    parser.add_argument(
+        "-n",
+        "--sessions",
+        type=int,
+        default=DEFAULT_SESSIONS,
+        help="Number of MATLAB sessions executing notebooks in parallel.",
+    )
+    parser.add_argument(
+        "--report",
+        help="File to which the timing report is written. Defaults to "
+        "report.json in the output folder.",
+    )
+    parser.add_argument(
+        "--startup-timeout",
+        type=int,
+        default=DEFAULT_STARTUP_TIMEOUT,
+        help="Number of seconds to wait for MATLAB to start.",
+    )
+    parser.add_argument(
+        "--pool-dir",
+        help="Folder of the pool of MATLAB sessions, shared between runs.",
+    )
+    args = parser.parse_args(argv)
+
+    notebooks = find_notebooks(args.notebooks)
+    output_paths = get_output_paths(notebooks, args.output_dir)
+    sessions = max(args.sessions, 1)
+
+    start_time = time.perf_counter()
+    reports = run_notebooks(
+        notebooks,
+        output_paths,
+        sessions,
+        args.pool_dir or get_runner_pool_dir(),
+        args.startup_timeout,
+    )
+    seconds = time.perf_counter() - start_time
+
+    report_path = args.report or os.path.join(args.output_dir, "report.json")
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(
+            {"sessions": sessions, "seconds": seconds, "notebooks": reports},
+            f,
+            indent=2,
+        )
+
+    failed = [report for report in reports if report["status"] != "ok"]
+    print(
+        f"Executed {len(reports) - len(failed)} of {len(reports)} notebook(s) "
+        f"in {seconds:.2f} s using {sessions} MATLAB session(s). "
+        f"Report written to {report_path}"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
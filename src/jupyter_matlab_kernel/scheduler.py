@@ -0,0 +1,176 @@
+# Copyright 2023 The MathWorks, Inc.
+# Scheduling of the requests which kernels started by the same Jupyter server
+# send to their shared MATLAB
+
+import collections
+import itertools
+import os
+import time
+
+import psutil
+
+# Priorities of requests. Requests with a lower value are sent to MATLAB first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_EXECUTE = 1
+
+# Number of seconds over which the executions of a kernel are counted to order
+# its requests. Only recent executions count, so that a notebook which has been
+# open for a long time is not queued behind notebooks opened since.
+FAIR_SHARE_WINDOW = 60
+
+_TICKET_SUFFIX = ".ticket"
+_ACTIVE_FILE = "active"
+
+
+class RequestScheduler:
+    """
+    Orders the requests of all the kernels which share a MATLAB, so that only
+    one request at a time is sent to MATLAB and waiting requests are sent in a
+    fair order instead of their order of arrival.
+
+    Kernels are separate processes, hence the queue is a folder shared by the
+    kernels. Each waiting request is a ticket file in the folder, and the request
+    being processed by MATLAB holds a lock file. Tickets are ordered by:
+        1. Priority: Interactive requests, such as Tab completion, go ahead of
+           execution requests.
+        2. Number of executions the kernel has sent in the last
+           FAIR_SHARE_WINDOW seconds: A kernel which has sent fewer executions
+           recently goes first, so that a notebook which executes many cells
+           does not starve the other notebooks.
+        3. Time at which the request was made.
+
+    A request which MATLAB is already processing cannot be preempted.
+
+    Args:
+        queue_dir (string): Folder shared by the kernels which share a MATLAB.
+    """
+
+    def __init__(self, queue_dir):
+        self.queue_dir = queue_dir
+        # Times at which the executions sent in the last FAIR_SHARE_WINDOW
+        # seconds were sent.
+        self._served_times = collections.deque()
+        self._pid = os.getpid()
+        self._sequence = itertools.count()
+        os.makedirs(queue_dir, mode=0o700, exist_ok=True)
+
+    def enqueue(self, priority):
+        """
+        Adds a request to the queue.
+
+        Args:
+            priority (int): PRIORITY_INTERACTIVE or PRIORITY_EXECUTE.
+
+        Returns:
+            string: Ticket of the request, to be passed to try_acquire and release.
+        """
+        ticket = "{}-{:010d}-{:020d}-{}-{}{}".format(
+            priority,
+            self.get_recent_count() if priority == PRIORITY_EXECUTE else 0,
+            time.time_ns(),
+            self._pid,
+            next(self._sequence),
+            _TICKET_SUFFIX,
+        )
+        with open(os.path.join(self.queue_dir, ticket), "w"):
+            pass
+        return ticket
+
+    def try_acquire(self, ticket):
+        """
+        Acquires the permission to send a request to MATLAB, if it is the turn
+        of the request.
+
+        Args:
+            ticket (string): Ticket returned by enqueue.
+
+        Returns:
+            Tuple (bool, int): Whether the permission was acquired, and the number
+                               of requests ahead of this request otherwise.
+        """
+        tickets = self._get_tickets()
+        ahead = tickets.index(ticket) if ticket in tickets else 0
+
+        active_owner = self._get_active_owner()
+        if ahead > 0 or active_owner is not None:
+            return False, ahead + (active_owner is not None)
+
+        try:
+            fd = os.open(
+                os.path.join(self.queue_dir, _ACTIVE_FILE),
+                os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                0o600,
+            )
+        except FileExistsError:
+            # Another kernel acquired the permission in the meantime.
+            return False, 1
+
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{self._pid}\n{ticket}")
+        self._remove(ticket)
+        if ticket.startswith(f"{PRIORITY_EXECUTE}-"):
+            self._served_times.append(time.monotonic())
+        return True, 0
+
+    def release(self, ticket):
+        """
+        Removes a request from the queue, and releases the permission to send
+        requests to MATLAB if the request held it.
+
+        Args:
+            ticket (string): Ticket returned by enqueue.
+        """
+        self._remove(ticket)
+        active_file = os.path.join(self.queue_dir, _ACTIVE_FILE)
+        try:
+            with open(active_file) as f:
+                owner = f.read().split("\n")
+        except OSError:
+            return
+        if owner[-1] == ticket:
+            self._remove(_ACTIVE_FILE)
+
+    def get_recent_count(self):
+        """Returns the number of executions sent in the last FAIR_SHARE_WINDOW seconds."""
+        start = time.monotonic() - FAIR_SHARE_WINDOW
+        while self._served_times and self._served_times[0] < start:
+            self._served_times.popleft()
+        return len(self._served_times)
+
+    def _get_tickets(self):
+        try:
+            names = os.listdir(self.queue_dir)
+        except OSError:
+            return []
+
+        tickets = []
+        for name in names:
+            if not name.endswith(_TICKET_SUFFIX):
+                continue
+            # Remove the tickets of kernels which exited without releasing them.
+            pid = int(name.split("-")[3])
+            if pid != self._pid and not psutil.pid_exists(pid):
+                self._remove(name)
+                continue
+            tickets.append(name)
+        return sorted(tickets)
+
+    def _get_active_owner(self):
+        try:
+            with open(os.path.join(self.queue_dir, _ACTIVE_FILE)) as f:
+                pid = int(f.read().split("\n")[0])
+        except (OSError, ValueError):
+            return None
+
+        # Release the permission held by a kernel which exited while MATLAB was
+        # processing its request.
+        if pid != self._pid and not psutil.pid_exists(pid):
+            self._remove(_ACTIVE_FILE)
+            return None
+        return pid
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.queue_dir, name))
+        except OSError:
+            pass
@@ -0,0 +1,296 @@
+# Copyright 2023 The MathWorks, Inc.
+# Pool of MATLAB sessions, each behind its own matlab-proxy, which are dedicated
+# to one kernel at a time
+
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+
+import psutil
+
+# Number of minutes after which an idle MATLAB session of the pool shuts down,
+# unless configured by the user. Sessions are not tied to the Jupyter server,
+# hence this ensures they do not outlive it indefinitely.
+DEFAULT_IDLE_TIMEOUT = 60
+
+# Number of seconds after which a refill of the pool which did not complete is
+# considered abandoned.
+REFILL_LOCK_TIMEOUT = 60
+
+_SESSION_PREFIX = "session-"
+
+
+class SessionPool:
+    """
+    Maintains a pool of MATLAB sessions, each behind its own matlab-proxy, so
+    that each kernel is assigned a dedicated MATLAB and independent notebooks
+    run in parallel.
+
+    The pool is a folder shared by the kernels started by the same Jupyter
+    server. Each session is described by a JSON file in the folder, and the
+    kernel using a session holds a claim file next to it. Sessions which are
+    not claimed are warm spares: matlab-proxy starts MATLAB as soon as it is
+    launched, if licensing information is available.
+
+    A session whose kernel exited without releasing it, or released it without
+    clearing it, is marked by a dirty file, and must be cleared by the next
+    kernel which claims it.
+
+    Args:
+        pool_dir (string): Folder shared by the kernels using the pool.
+        size (int): Number of unclaimed sessions kept ready for new kernels.
+    """
+
+    def __init__(self, pool_dir, size):
+        self.pool_dir = pool_dir
+        self.size = size
+        os.makedirs(pool_dir, mode=0o700, exist_ok=True)
+
+    def claim(self):
+        """
+        Claims an unclaimed session for the current kernel, starting a new
+        session if none is available. The oldest sessions are claimed first,
+        since they are the most likely to have finished starting MATLAB.
+
+        Returns:
+            dict: The claimed session, with the "url" and "headers" required to
+                  send requests to its matlab-proxy, and "needs_reset" set to
+                  True if MATLAB must be cleared before it is used.
+        """
+        for session in self.get_sessions():
+            if self._try_claim(session):
+                return dict(session, needs_reset=self._pop_dirty(session))
+
+        return dict(self._start_session(claim=True), needs_reset=False)
+
+    def refill(self):
+        """
+        Starts new sessions until the number of unclaimed sessions is the size
+        of the pool. The sessions are started in the background and this
+        function returns immediately.
+        """
+        if not self._acquire_refill_lock():
+            return
+        try:
+            missing = self.size - len(self._get_unclaimed_sessions())
+            for _ in range(missing):
+                self._start_session()
+        finally:
+            self._remove("refill.lock")
+
+    def release(self, session, is_reset=True):
+        """
+        Returns a session to the pool, or stops it if the pool already has
+        enough unclaimed sessions.
+
+        Args:
+            session (dict): Session returned by claim.
+            is_reset (bool): Whether MATLAB was cleared before the release. If
+                             not, the next kernel which claims it clears it.
+        """
+        if len(self._get_unclaimed_sessions()) >= self.size:
+            self._stop_session(session)
+            return
+        if not is_reset:
+            self._mark_dirty(session)
+        self._remove(f"{session['id']}.claim")
+
+    def get_sessions(self):
+        """Returns the sessions of the pool whose matlab-proxy is running, oldest first."""
+        sessions = []
+        for name in os.listdir(self.pool_dir):
+            if not (name.startswith(_SESSION_PREFIX) and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.pool_dir, name)) as f:
+                    session = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            # Forget sessions whose matlab-proxy has exited, for example after
+            # being idle for too long.
+            if not psutil.pid_exists(session["pid"]):
+                self._remove_session_files(session)
+                continue
+            sessions.append(session)
+        return sorted(sessions, key=lambda session: session["created"])
+
+    def _get_unclaimed_sessions(self):
+        return [
+            session
+            for session in self.get_sessions()
+            if self._get_claim_owner(session) is None
+        ]
+
+    def _get_claim_owner(self, session):
+        try:
+            with open(os.path.join(self.pool_dir, f"{session['id']}.claim")) as f:
+                pid = int(f.read())
+        except (OSError, ValueError):
+            return None
+
+        # Release the claims of kernels which exited without releasing them.
+        # MATLAB still holds the workspace of the kernel.
+        if not psutil.pid_exists(pid):
+            self._mark_dirty(session)
+            self._remove(f"{session['id']}.claim")
+            return None
+        return pid
+
+    def _mark_dirty(self, session):
+        try:
+            with open(os.path.join(self.pool_dir, f"{session['id']}.dirty"), "w"):
+                pass
+        except OSError:
+            pass
+
+    def _pop_dirty(self, session):
+        try:
+            os.remove(os.path.join(self.pool_dir, f"{session['id']}.dirty"))
+        except FileNotFoundError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    def _try_claim(self, session):
+        # A claim of a kernel which has exited is removed before claiming.
+        if self._get_claim_owner(session) is not None:
+            return False
+        return self._create_claim(session["id"])
+
+    def _create_claim(self, session_id):
+        try:
+            fd = os.open(
+                os.path.join(self.pool_dir, f"{session_id}.claim"),
+                os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                0o600,
+            )
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def _acquire_refill_lock(self):
+        lock_file = os.path.join(self.pool_dir, "refill.lock")
+        try:
+            if time.time() - os.path.getmtime(lock_file) > REFILL_LOCK_TIMEOUT:
+                self._remove("refill.lock")
+        except OSError:
+            pass
+        try:
+            os.close(os.open(lock_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+        except FileExistsError:
+            # Another kernel is refilling the pool.
+            return False
+        return True
+
+    def _start_session(self, claim=False):
+        import matlab_proxy
+
+        from jupyter_matlab_proxy import _get_env
+        from jupyter_matlab_proxy.jupyter_config import config
+
+        enable_token_env_name, token_env_name = _get_auth_token_env_names()
+        session_id = _SESSION_PREFIX + secrets.token_hex(4)
+        port = _find_free_port()
+        token = secrets.token_urlsafe(32)
+
+        env = dict(os.environ)
+        env.update(_get_env(port, "/"))
+        env[enable_token_env_name] = "True"
+        env[token_env_name] = token
+        env.setdefault("MWI_SHUTDOWN_ON_IDLE_TIMEOUT", str(DEFAULT_IDLE_TIMEOUT))
+
+        # The session must outlive the kernel which starts it, hence it is
+        # detached from the process group of the kernel.
+        if sys.platform == "win32":
+            detach_args = {
+                "creationflags": subprocess.CREATE_NEW_PROCESS_GROUP
+                | subprocess.DETACHED_PROCESS
+            }
+        else:
+            detach_args = {"start_new_session": True}
+
+        with open(os.path.join(self.pool_dir, f"{session_id}.log"), "ab") as log:
+            process = subprocess.Popen(
+                [
+                    matlab_proxy.get_executable_name(),
+                    "--config",
+                    config["extension_name"],
+                ],
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                **detach_args,
+            )
+
+        session = {
+            "id": session_id,
+            "pid": process.pid,
+            "url": f"http://127.0.0.1:{port}/matlab",
+            "headers": {"mwi-auth-token": token},
+            "created": time.time(),
+        }
+
+        # A session started for the current kernel is claimed before it is
+        # published, so that no other kernel can claim it in the meantime.
+        if claim and not self._create_claim(session_id):
+            raise RuntimeError(f"The MATLAB session {session_id} is already claimed.")
+
+        # The session file contains the token, hence it is only readable by the
+        # current user.
+        fd = os.open(
+            os.path.join(self.pool_dir, f"{session_id}.json"),
+            os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+            0o600,
+        )
+        with os.fdopen(fd, "w") as f:
+            json.dump(session, f)
+        return session
+
+    def _stop_session(self, session):
+        try:
+            psutil.Process(session["pid"]).terminate()
+        except psutil.Error:
+            pass
+        self._remove_session_files(session)
+
+    def _remove_session_files(self, session):
+        for suffix in (".json", ".claim", ".dirty", ".log"):
+            self._remove(session["id"] + suffix)
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.pool_dir, name))
+        except OSError:
+            pass
+
+
+def _get_auth_token_env_names():
+    # Sessions are protected by a token, which older versions of matlab-proxy
+    # do not support.
+    try:
+        from matlab_proxy.util.mwi import environment_variables as mwi_env
+
+        return (
+            mwi_env.get_env_name_enable_mwi_auth_token(),
+            mwi_env.get_env_name_mwi_auth_token(),
+        )
+    except (ImportError, AttributeError):
+        raise RuntimeError(
+            "The pool of MATLAB sessions requires a version of matlab-proxy "
+            "which supports token authentication. Upgrade matlab-proxy."
+        )
+
+
+def _find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
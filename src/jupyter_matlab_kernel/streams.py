@@ -0,0 +1,165 @@
+# Copyright 2023 The MathWorks, Inc.
+# Coalescing and limits for the stream outputs which MATLAB sends to the notebook
+
+import os
+import tempfile
+import time
+
+from jupyter_matlab_kernel import environment_variables as kernel_env
+
+# Default maximum number of characters of stream outputs published per cell.
+DEFAULT_MAX_STREAM_OUTPUT = 1000000
+
+# Default minimum number of milliseconds between two stream messages. Outputs
+# received in the meantime are published together.
+DEFAULT_STREAM_FLUSH_INTERVAL_MS = 100
+
+
+def create_stream_coalescer():
+    """Returns a StreamCoalescer configured using environment variables."""
+    return StreamCoalescer(
+        max(
+            kernel_env.get_int(
+                kernel_env.get_env_name_max_stream_output(), DEFAULT_MAX_STREAM_OUTPUT
+            ),
+            0,
+        ),
+        max(
+            kernel_env.get_int(
+                kernel_env.get_env_name_stream_flush_interval(),
+                DEFAULT_STREAM_FLUSH_INTERVAL_MS,
+            ),
+            0,
+        )
+        / 1000,
+        os.environ.get(kernel_env.get_env_name_stream_overflow_dir()) or None,
+    )
+
+
+class StreamCoalescer:
+    """
+    Merges consecutive stream outputs of the same stream into a single message,
+    and publishes them at most once per flush interval. Code which displays many
+    small outputs, such as a loop which prints a line per iteration, would
+    otherwise send a message per output to the notebook.
+
+    The characters of stream outputs published per cell are capped. The outputs
+    beyond the cap are suppressed and summarized once the cell is executed, and
+    written to a file if a folder for such files is configured.
+
+    Args:
+        max_output_size (int): Maximum number of characters of stream outputs
+                               published per cell. 0 disables the cap.
+        flush_interval (float): Minimum number of seconds between two messages.
+        overflow_dir (string): Optional folder to which suppressed outputs are
+                               written, one file per cell.
+    """
+
+    def __init__(
+        self,
+        max_output_size=DEFAULT_MAX_STREAM_OUTPUT,
+        flush_interval=DEFAULT_STREAM_FLUSH_INTERVAL_MS / 1000,
+        overflow_dir=None,
+    ):
+        self.max_output_size = max_output_size
+        self.flush_interval = flush_interval
+        self.overflow_dir = overflow_dir
+        self.reset()
+
+    def reset(self):
+        """Starts coalescing the outputs of a new cell."""
+        self._last_flush_time = None
+        self._name = None
+        self._chunks = []
+        self._buffered_size = 0
+        self.published_size = 0
+        self.suppressed_size = 0
+        self.suppressed_lines = 0
+        self.overflow_file = None
+
+    def write(self, name, text):
+        """
+        Records a stream output received from MATLAB.
+
+        Args:
+            name (string): Name of the stream, "stdout" or "stderr".
+            text (string): Text of the output.
+
+        Returns:
+            List(Tuple(string, string)): Name and text of the stream messages to
+                                         publish, in order.
+        """
+        messages = []
+        if name != self._name:
+            messages += self.flush()
+            self._name = name
+
+        if self.max_output_size:
+            remaining = max(
+                self.max_output_size - self.published_size - self._buffered_size, 0
+            )
+            if len(text) > remaining:
+                self._suppress(name, text[remaining:])
+                text = text[:remaining]
+
+        if text:
+            self._chunks.append(text)
+            self._buffered_size += len(text)
+        return messages + self.flush_due()
+
+    def flush_due(self):
+        """Publishes the buffered outputs, if the flush interval has elapsed."""
+        if (
+            self._last_flush_time is not None
+            and time.monotonic() - self._last_flush_time < self.flush_interval
+        ):
+            return []
+        return self.flush()
+
+    def flush(self, final=False):
+        """
+        Publishes the buffered outputs.
+
+        Args:
+            final (bool): Whether the cell is executed. The summary of the
+                          suppressed outputs is published.
+
+        Returns:
+            List(Tuple(string, string)): Name and text of the stream messages to
+                                         publish, in order.
+        """
+        messages = []
+        if self._chunks:
+            text = "".join(self._chunks)
+            self._chunks = []
+            self._buffered_size = 0
+            self.published_size += len(text)
+            self._last_flush_time = time.monotonic()
+            messages.append((self._name, text))
+
+        if final and self.suppressed_size:
+            summary = f"\n... {self.suppressed_lines} line(s) of output suppressed"
+            if self.overflow_file is not None:
+                summary += f". The suppressed output is in {self.overflow_file}"
+            messages.append(("stderr", summary + "\n"))
+        return messages
+
+    def _suppress(self, name, text):
+        self.suppressed_size += len(text)
+        self.suppressed_lines += text.count("\n") + (not text.endswith("\n"))
+
+        if self.overflow_dir is None:
+            return
+        try:
+            if self.overflow_file is None:
+                os.makedirs(self.overflow_dir, exist_ok=True)
+                fd, self.overflow_file = tempfile.mkstemp(
+                    dir=self.overflow_dir,
+                    prefix="jupyter_matlab_kernel_output_",
+                    suffix=".txt",
+                )
+                os.close(fd)
+            with open(self.overflow_file, "a", encoding="utf-8") as f:
+                f.write(text)
+        except OSError:
+            pass
@@ -0,0 +1,123 @@
+# Copyright 2023 The MathWorks, Inc.
+# Cache of the metadata of the MATLAB workspace, used to inspect variables and functions
+
+import collections
+import re
+
+# Default number of help texts of functions cached by the kernel.
+DEFAULT_HELP_CACHE_SIZE = 128
+
+# Names of variables, and of functions possibly in packages, for example
+# "matlab.io.datastore".
+_NAME_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*")
+
+
+def get_name_at_cursor(code, cursor_pos):
+    """
+    Returns the name under the cursor, or right before it, or None if there is
+    no name at the cursor.
+    """
+    for match in _NAME_PATTERN.finditer(code):
+        if match.start() > cursor_pos:
+            break
+        if cursor_pos <= match.end():
+            return match.group()
+    return None
+
+
+class WorkspaceCache:
+    """
+    Metadata (name, class, size and bytes) of the variables of the MATLAB base
+    workspace, and help text of functions. The variables are kept up to date by
+    the changes which MATLAB appends to the outputs of each execution, see
+    +jupyter/getWorkspaceChanges.m, hence inspecting a variable does not require
+    a request to MATLAB.
+
+    Variables changed by the executions of other notebooks sharing the MATLAB
+    are updated by the next execution of the kernel.
+
+    Args:
+        max_help_size (int): Maximum number of cached help texts.
+    """
+
+    def __init__(self, max_help_size=DEFAULT_HELP_CACHE_SIZE):
+        self.max_help_size = max_help_size
+        self.variables = dict()
+        self.is_synced = False
+        self._help = collections.OrderedDict()
+
+    def apply(self, changes):
+        """
+        Updates the variables with the changes received from MATLAB.
+
+        Args:
+            changes (dict): Content of an output of type "workspace".
+        """
+        if changes.get("reset"):
+            self.variables.clear()
+        for variable in _as_list(changes.get("changed")):
+            self.variables[variable["name"]] = variable
+        for name in _as_list(changes.get("removed")):
+            self.variables.pop(name, None)
+        self.is_synced = True
+
+    def invalidate(self):
+        """
+        Requests all the variables with the next execution. Needs to be called
+        when the changes of an execution may have been lost, for example when
+        the execution failed.
+        """
+        self.is_synced = False
+
+    def describe_variable(self, name):
+        """
+        Returns the description of a variable, or None if there is no such
+        variable. The variable of a field or property, for example "s.a", is
+        described for the whole variable.
+        """
+        variable = self.variables.get(name.split(".")[0])
+        if variable is None:
+            return None
+        return (
+            f"{variable['name']}: {variable['size']} {variable['class']}\n"
+            f"Bytes: {variable['bytes']}"
+        )
+
+    def get_help(self, name):
+        """
+        Returns the cached help text of a function, an empty string if MATLAB
+        has no help for the name, or None if not cached.
+        """
+        text = self._help.get(name)
+        if text is not None:
+            self._help.move_to_end(name)
+        return text
+
+    def put_help(self, name, text):
+        """
+        Caches the help text of a function. An empty help text is cached until
+        the next execution, which may define the name.
+        """
+        if self.max_help_size <= 0:
+            return
+        self._help[name] = text or ""
+        self._help.move_to_end(name)
+        while len(self._help) > self.max_help_size:
+            self._help.popitem(last=False)
+
+    def forget_missing_help(self):
+        """
+        Forgets the names for which MATLAB has no help. Needs to be called when
+        code is executed, as it may define functions or change the MATLAB path.
+        """
+        for name in [name for name, text in self._help.items() if not text]:
+            del self._help[name]
+
+
+def _as_list(value):
+    # MATLAB encodes arrays with a single element as the element itself.
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
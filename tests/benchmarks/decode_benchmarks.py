@@ -0,0 +1,101 @@
+# Copyright 2023 The MathWorks, Inc.
+"""Benchmarks of the decoding of responses from MATLAB by each JSON library.
+
+The responses are FEval responses of the MVM endpoint of matlab-proxy which
+carry the outputs of a cell: figures encoded as base64 PNG images and text
+outputs. Each installed JSON library is compared with decoding the body as a
+string first, which is what requests.Response.json does.
+
+Usage:
+    python tests/benchmarks/decode_benchmarks.py
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, os.pardir, "src"))
+
+from jupyter_matlab_kernel import json_decoder
+
+# Name, number of figures, bytes per figure, number of text outputs and
+# characters per text output.
+PAYLOADS = (
+    ("small", 0, 0, 5, 100),
+    ("figures_1mb", 2, 500_000, 1, 100),
+    ("figures_10mb", 5, 2_000_000, 1, 100),
+    ("text_5mb", 0, 0, 5000, 1000),
+)
+
+
+def create_response_body(figures, figure_size, outputs, output_size):
+    results = [
+        {"type": "stream", "content": {"name": "stdout", "text": "x" * output_size}}
+        for _ in range(outputs)
+    ]
+    results += [
+        {
+            "type": "execute_result",
+            "mimetype": ["image/png"],
+            "value": [base64.b64encode(os.urandom(figure_size)).decode()],
+        }
+        for _ in range(figures)
+    ]
+    return json.dumps(
+        {
+            "messages": {
+                "FEvalResponse": [
+                    {"isError": False, "results": [], "messageFaults": []},
+                    {"isError": False, "results": [results], "messageFaults": []},
+                ]
+            }
+        }
+    ).encode("utf-8")
+
+
+def measure(decode, body, iterations):
+    """Returns the median seconds and the peak bytes allocated by a decode."""
+    samples = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        decode(body)
+        samples.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    decode(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return sorted(samples)[len(samples) // 2], peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    decoders = {"requests (str + json)": lambda body: json.loads(body.decode("utf-8"))}
+    for name in json_decoder.SUPPORTED_JSON_DECODERS:
+        decoder_name, decoder = json_decoder.get_json_decoder(name)
+        if decoder_name == name:
+            decoders[name] = decoder
+
+    results = {}
+    for payload_name, *payload in PAYLOADS:
+        body = create_response_body(*payload)
+        results[payload_name] = {"body_bytes": len(body)}
+        for name, decoder in decoders.items():
+            seconds, peak = measure(decoder, body, args.iterations)
+            results[payload_name][name] = {
+                "p50_ms": seconds * 1000,
+                "peak_alloc_bytes": peak,
+            }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+# Copyright 2023 The MathWorks, Inc.
+"""Benchmarks of the MATLAB Kernel against a local stand-in for matlab-proxy.
+
+Kernels are started as separate processes and driven through the Jupyter
+messaging protocol, like Jupyter server does. They connect to the stub
+matlab-proxy in stub_matlab_proxy.py, hence no MATLAB is required.
+
+Usage:
+    python tests/benchmarks/run_benchmarks.py --output results.json
+    python tests/benchmarks/run_benchmarks.py --baseline results.json
+
+The results are written as JSON. When a baseline is given, the command exits
+with a non-zero status if the median latency of any benchmark regressed by
+more than the tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import queue
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(HERE, os.pardir, os.pardir, "src")
+sys.path.insert(0, HERE)
+sys.path.insert(0, SRC_DIR)
+
+from jupyter_client import KernelManager
+
+from stub_matlab_proxy import StubMATLABProxy
+
+KERNEL_NAME = "jupyter_matlab_kernel_benchmark"
+TIMEOUT = 120
+
+
+def summarize(samples):
+    """Returns statistics, in milliseconds, of durations measured in seconds."""
+    samples_ms = sorted(sample * 1000 for sample in samples)
+
+    def percentile(fraction):
+        idx = min(int(round(fraction * (len(samples_ms) - 1))), len(samples_ms) - 1)
+        return samples_ms[idx]
+
+    return {
+        "count": len(samples_ms),
+        "mean_ms": statistics.mean(samples_ms),
+        "min_ms": samples_ms[0],
+        "p50_ms": percentile(0.5),
+        "p90_ms": percentile(0.9),
+        "p99_ms": percentile(0.99),
+        "max_ms": samples_ms[-1],
+    }
+
+
+class BenchmarkEnvironment:
+    """
+    Emulates a Jupyter server which has started the stub matlab-proxy. The
+    kernels find the stub through the runtime file of the emulated Jupyter
+    server, which is this process.
+    """
+
+    def __init__(self, stub, stream_outputs=False, batch_size=1):
+        self.stub = stub
+        self.temp_dir = tempfile.TemporaryDirectory(prefix="jupyter_matlab_benchmark_")
+        self.runtime_dir = os.path.join(self.temp_dir.name, "runtime")
+        kernel_dir = os.path.join(self.temp_dir.name, "kernels", KERNEL_NAME)
+        os.makedirs(self.runtime_dir)
+        os.makedirs(kernel_dir)
+
+        with open(
+            os.path.join(self.runtime_dir, f"jpserver-{os.getpid()}.json"), "w"
+        ) as f:
+            json.dump(
+                {
+                    "pid": os.getpid(),
+                    "port": stub.port,
+                    "base_url": "/",
+                    "secure": False,
+                    "token": "",
+                    "password": False,
+                },
+                f,
+            )
+
+        with open(os.path.join(kernel_dir, "kernel.json"), "w") as f:
+            json.dump(
+                {
+                    "argv": [
+                        sys.executable,
+                        "-m",
+                        "jupyter_matlab_kernel",
+                        "-f",
+                        "{connection_file}",
+                    ],
+                    "display_name": "MATLAB Kernel (benchmark)",
+                    "language": "matlab",
+                    "interrupt_mode": "message",
+                },
+                f,
+            )
+
+        os.environ["JUPYTER_PATH"] = self.temp_dir.name
+        self.kernel_env = dict(
+            os.environ,
+            JUPYTER_RUNTIME_DIR=self.runtime_dir,
+            PYTHONPATH=os.pathsep.join(
+                [os.path.abspath(SRC_DIR), os.environ.get("PYTHONPATH", "")]
+            ),
+            MWI_KERNEL_STREAM_OUTPUTS="true" if stream_outputs else "false",
+            MWI_KERNEL_EXECUTE_BATCH_SIZE=str(batch_size),
+        )
+        self.kernels = []
+
+    def start_kernel(self):
+        manager = KernelManager(kernel_name=KERNEL_NAME)
+        manager.start_kernel(env=self.kernel_env)
+        client = manager.client()
+        client.start_channels()
+        client.wait_for_ready(timeout=TIMEOUT)
+        self.kernels.append((manager, client))
+
+        # The first execution request performs the startup checks.
+        run_cell(client, "%bench latency=0")
+        return manager, client
+
+    def close(self):
+        for manager, client in self.kernels:
+            client.stop_channels()
+            manager.shutdown_kernel(now=True)
+        self.temp_dir.cleanup()
+
+
+def run_cell(client, code):
+    """
+    Executes code and waits until all its outputs are published.
+
+    Returns:
+        Tuple (float, int): Seconds taken and number of bytes of the outputs.
+    """
+    start_time = time.perf_counter()
+    msg_id = client.execute(code)
+    return wait_for_idle(client, msg_id, start_time)
+
+
+def wait_for_idle(client, msg_id, start_time):
+    output_bytes = 0
+    while True:
+        msg = client.get_iopub_msg(timeout=TIMEOUT)
+        if msg["parent_header"].get("msg_id") != msg_id:
+            continue
+        if msg["msg_type"] in ("stream", "execute_result", "display_data"):
+            output_bytes += len(json.dumps(msg["content"]))
+        if msg["msg_type"] == "status" and msg["content"]["execution_state"] == "idle":
+            break
+    elapsed = time.perf_counter() - start_time
+
+    # Discard the execute_reply.
+    while True:
+        reply = client.get_shell_msg(timeout=TIMEOUT)
+        if reply["parent_header"].get("msg_id") == msg_id:
+            break
+    return elapsed, output_bytes
+
+
+def benchmark_execute(client, iterations, code):
+    samples, output_bytes = [], 0
+    for _ in range(iterations):
+        elapsed, output_bytes = run_cell(client, code)
+        samples.append(elapsed)
+    return dict(summarize(samples), output_bytes=output_bytes)
+
+
+def benchmark_run_all(client, iterations, cell_count, code):
+    """Times the execution of cells which are all queued at once, like "Run All"."""
+    samples = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        msg_ids = [client.execute(code) for _ in range(cell_count)]
+        for msg_id in msg_ids:
+            wait_for_idle(client, msg_id, start_time)
+        samples.append(time.perf_counter() - start_time)
+    return dict(summarize(samples), cells=cell_count)
+
+
+def benchmark_complete(client, iterations, cached):
+    samples = []
+    for idx in range(iterations):
+        # Completion results are cached by the kernel until the next execution,
+        # hence the code is varied to measure requests which reach MATLAB.
+        code = "x = pl" if cached else f"x{idx} = pl"
+        start_time = time.perf_counter()
+        msg_id = client.complete(code, len(code))
+        while True:
+            reply = client.get_shell_msg(timeout=TIMEOUT)
+            if reply["parent_header"].get("msg_id") == msg_id:
+                break
+        samples.append(time.perf_counter() - start_time)
+    return summarize(samples)
+
+
+def benchmark_interrupt(manager, client, stub, iterations):
+    samples = []
+    for _ in range(iterations):
+        msg_id = client.execute(f"%bench latency={TIMEOUT}")
+        while stub.in_flight == 0:
+            time.sleep(0.001)
+        start_time = time.perf_counter()
+        manager.interrupt_kernel()
+        elapsed, _ = wait_for_idle(client, msg_id, start_time)
+        samples.append(elapsed)
+    return summarize(samples)
+
+
+def benchmark_throughput(env, kernel_count, cells_per_kernel, code):
+    clients = [client for _, client in env.kernels[:kernel_count]]
+    latencies = queue.Queue()
+
+    def run_cells(client):
+        for _ in range(cells_per_kernel):
+            elapsed, _ = run_cell(client, code)
+            latencies.put(elapsed)
+
+    threads = [threading.Thread(target=run_cells, args=(c,)) for c in clients]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start_time
+
+    samples = [latencies.get() for _ in range(latencies.qsize())]
+    return dict(
+        summarize(samples),
+        kernels=kernel_count,
+        cells_per_second=len(samples) / wall_time,
+    )
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Returns descriptions of the benchmarks whose median latency regressed."""
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous:
+            continue
+        if result["p50_ms"] > previous["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {result['p50_ms']:.2f} ms, baseline {previous['p50_ms']:.2f} ms"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--kernels", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--large-output-size", type=int, default=1_000_000)
+    parser.add_argument("--figure-size", type=int, default=200_000)
+    parser.add_argument("--stream-outputs", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--run-all-cells", type=int, default=100)
+    parser.add_argument(
+        "--serialize-requests",
+        action="store_true",
+        help="Process requests one at a time in the stub, like MATLAB does.",
+    )
+    parser.add_argument("--output", help="File to write the results to.")
+    parser.add_argument("--baseline", help="Results to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    stub = StubMATLABProxy(args.latency, serialize=args.serialize_requests)
+    stub.start()
+    env = BenchmarkEnvironment(
+        stub, stream_outputs=args.stream_outputs, batch_size=args.batch_size
+    )
+    try:
+        manager, client = env.start_kernel()
+        benchmarks = {
+            "execute": benchmark_execute(client, args.iterations, "x = 1"),
+            "execute_large_output": benchmark_execute(
+                client,
+                max(args.iterations // 5, 1),
+                f"%bench outputs=10 output_size={args.large_output_size // 10}",
+            ),
+            "execute_figures": benchmark_execute(
+                client,
+                max(args.iterations // 5, 1),
+                f"%bench outputs=0 figures=5 figure_size={args.figure_size}",
+            ),
+            "run_all": benchmark_run_all(
+                client, max(args.iterations // 10, 1), args.run_all_cells, "x = 1"
+            ),
+            "complete": benchmark_complete(client, args.iterations, cached=False),
+            "complete_cached": benchmark_complete(client, args.iterations, cached=True),
+            "interrupt": benchmark_interrupt(
+                manager, client, stub, max(args.iterations // 5, 1)
+            ),
+        }
+        for _ in range(args.kernels - 1):
+            env.start_kernel()
+        benchmarks["throughput"] = benchmark_throughput(
+            env, args.kernels, args.iterations, "x = 1"
+        )
+    finally:
+        env.close()
+        stub.stop()
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stub_latency_s": args.latency,
+            "stream_outputs": args.stream_outputs,
+            "batch_size": args.batch_size,
+            "serialize_requests": args.serialize_requests,
+        },
+        "benchmarks": benchmarks,
+        "stub_requests": stub.request_counts,
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
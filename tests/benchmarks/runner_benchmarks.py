@@ -0,0 +1,99 @@
+# Copyright 2023 The MathWorks, Inc.
+"""Benchmarks of the throughput of the notebook runner with several sessions.
+
+Each MATLAB session of the runner is a local stand-in for matlab-proxy which
+executes one request at a time, like MATLAB does. The same set of notebooks is
+executed with an increasing number of sessions.
+
+Usage:
+    python tests/benchmarks/runner_benchmarks.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, os.pardir, os.pardir, "src"))
+
+import nbformat
+
+from jupyter_matlab_kernel import runner, session_pool
+from stub_matlab_proxy import StubMATLABProxy
+
+
+def write_notebooks(notebooks_dir, notebooks, cells, latency):
+    for index in range(notebooks):
+        nb = nbformat.v4.new_notebook()
+        nb.cells = [
+            nbformat.v4.new_code_cell(f"%bench latency={latency}\nx = {cell}")
+            for cell in range(cells)
+        ]
+        nbformat.write(nb, os.path.join(notebooks_dir, f"nb{index}.ipynb"))
+
+
+def run(notebooks_dir, output_dir, sessions):
+    stubs = [StubMATLABProxy(serialize=True) for _ in range(sessions)]
+    for stub in stubs:
+        stub.start()
+    free_stubs = list(stubs)
+    lock = threading.Lock()
+
+    def claim(self):
+        with lock:
+            stub = free_stubs.pop()
+        return {
+            "id": f"stub-{stub.port}",
+            "url": f"http://127.0.0.1:{stub.port}/matlab",
+            "headers": {},
+        }
+
+    session_pool.SessionPool.claim = claim
+    session_pool.SessionPool.release = lambda self, session: None
+
+    start_time = time.perf_counter()
+    reports = runner.run_notebooks(
+        runner.find_notebooks([notebooks_dir]),
+        runner.get_output_paths(runner.find_notebooks([notebooks_dir]), output_dir),
+        sessions,
+        os.path.join(output_dir, "pool"),
+        startup_timeout=10,
+    )
+    seconds = time.perf_counter() - start_time
+    for stub in stubs:
+        stub.stop()
+    assert all(report["status"] == "ok" for report in reports)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notebooks", type=int, default=16)
+    parser.add_argument("--cells", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        notebooks_dir = os.path.join(tmp_dir, "notebooks")
+        os.makedirs(notebooks_dir)
+        write_notebooks(notebooks_dir, args.notebooks, args.cells, args.latency)
+        for sessions in args.sessions:
+            seconds = run(
+                notebooks_dir, os.path.join(tmp_dir, f"out{sessions}"), sessions
+            )
+            results[f"sessions_{sessions}"] = {
+                "seconds": seconds,
+                "notebooks_per_second": args.notebooks / seconds,
+            }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+# Copyright 2023 The MathWorks, Inc.
+"""A local stand-in for matlab-proxy, used to benchmark the MATLAB Kernel.
+
+The stub emulates the endpoints of matlab-proxy which are used by the kernel:
+/get_status, /get_env_config and the MVM endpoint which evaluates FEval and
+Interrupt messages. No MATLAB is required.
+
+The response to an execution request is controlled by directives in the code of
+the cell, for example:
+
+    %bench latency=0.5 outputs=10 output_size=1000 figures=2 figure_size=100000
+
+which makes the stub take half a second to respond with 10 stream outputs of
+1000 characters each and 2 PNG figures of 100000 bytes each. Settings which
+are not given in the code fall back to the defaults of the stub.
+"""
+
+import base64
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIRECTIVE_PATTERN = re.compile(r"%\s*bench\s+(.*)")
+
+DEFAULT_SETTINGS = {
+    "latency": 0.0,
+    "outputs": 1,
+    "output_size": 100,
+    "figures": 0,
+    "figure_size": 0,
+}
+
+
+def parse_directives(code, defaults):
+    """
+    Returns the settings of an execution request, read from the "%bench"
+    directives in its code.
+
+    Args:
+        code (string): Code of the cell.
+        defaults (dict): Settings used when they are not given in the code.
+
+    Returns:
+        dict: Settings of the execution request.
+    """
+    settings = dict(defaults)
+    for match in DIRECTIVE_PATTERN.finditer(code):
+        for directive in match.group(1).split():
+            name, _, value = directive.partition("=")
+            if name in settings:
+                settings[name] = type(settings[name])(float(value))
+    return settings
+
+
+class StubMATLABProxy:
+    """
+    HTTP server which emulates matlab-proxy, with MATLAB always up and licensed.
+
+    Args:
+        latency (float): Default number of seconds MATLAB takes to execute code.
+        serialize (bool): Process requests one at a time, like MATLAB does. When
+                          False, requests are processed concurrently which
+                          isolates the overhead of the kernel.
+    """
+
+    def __init__(self, latency=0.0, serialize=False):
+        self.defaults = dict(DEFAULT_SETTINGS, latency=latency)
+        self.serialize = serialize
+        self.request_counts = {}
+        self.in_flight = 0
+        self.interrupt_event = threading.Event()
+        self._matlab_lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubRequestHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count_request(self, name):
+        with self._counts_lock:
+            self.request_counts[name] = self.request_counts.get(name, 0) + 1
+
+    def execute(self, code, options):
+        """Emulates +jupyter/execute.m. Returns None when interrupted."""
+        settings = parse_directives(code, self.defaults)
+
+        lock = self._matlab_lock if self.serialize else _NullLock()
+        with lock:
+            with self._counts_lock:
+                self.in_flight += 1
+            try:
+                self.interrupt_event.clear()
+                if self.interrupt_event.wait(settings["latency"]):
+                    return None
+            finally:
+                with self._counts_lock:
+                    self.in_flight -= 1
+
+        outputs = [
+            {
+                "type": "stream",
+                "content": {"name": "stdout", "text": "x" * settings["output_size"]},
+            }
+            for _ in range(settings["outputs"])
+        ]
+        outputs += [
+            {
+                "type": "execute_result",
+                "mimetype": ["image/png"],
+                "value": [
+                    base64.b64encode(os.urandom(settings["figure_size"])).decode()
+                ],
+            }
+            for _ in range(settings["figures"])
+        ]
+
+        # Streamed outputs are appended to the file, one JSON encoded output per line.
+        if options.get("outputFile"):
+            with open(options["outputFile"], "a", encoding="utf-8") as f:
+                for output in outputs:
+                    f.write(json.dumps(output) + "\n")
+            return []
+        return outputs
+
+    def complete(self, code, cursor_pos):
+        """Emulates +jupyter/complete.m"""
+        match = re.search(r"[A-Za-z_][A-Za-z0-9_]*$", code[:cursor_pos])
+        start = match.start() if match else cursor_pos
+        matches = [(match.group() if match else "") + suffix for suffix in "abcde"]
+        return {
+            "matches": matches,
+            "start": start,
+            "end": cursor_pos,
+            "completions": [
+                {"type": "function", "text": text, "start": start, "end": cursor_pos}
+                for text in matches
+            ],
+        }
+
+    def feval(self, feval_request):
+        function = feval_request["function"]
+        arguments = feval_request["arguments"]
+        self.count_request(function)
+
+        if function != "processJupyterKernelRequest":
+            return {"isError": False, "results": [], "messageFaults": []}
+
+        request_type = arguments[0]
+        if request_type == "execute":
+            options = json.loads(arguments[3]) if len(arguments) > 3 else {}
+            result = self.execute(arguments[2], options)
+            if result is None:
+                # An interrupted FEval has a fault without a message.
+                return {
+                    "isError": True,
+                    "results": [],
+                    "messageFaults": [{"message": ""}],
+                }
+        elif request_type == "execute_batch":
+            options = json.loads(arguments[3]) if len(arguments) > 3 else {}
+            result = []
+            for code in json.loads(arguments[2]):
+                outputs = self.execute(code, options)
+                if outputs is None:
+                    return {
+                        "isError": True,
+                        "results": [],
+                        "messageFaults": [{"message": ""}],
+                    }
+                result.append({"outputs": outputs, "hasError": False})
+        elif request_type == "complete":
+            result = self.complete(arguments[2], arguments[3])
+        else:
+            result = []
+        return {"isError": False, "results": [result], "messageFaults": []}
+
+
+class _NullLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    # Keep connections alive, like matlab-proxy does.
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        stub = self.server.stub
+        if self.path.endswith("/get_status"):
+            stub.count_request("get_status")
+            self._send_json(
+                {
+                    "licensing": {"type": "existing_license"},
+                    "matlab": {"status": "up"},
+                    "error": None,
+                }
+            )
+        elif self.path.endswith("/get_env_config"):
+            stub.count_request("get_env_config")
+            self._send_json({"extension_name": "Jupyter"})
+        else:
+            self._send_json({}, status=404)
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/messageservice/json/secure"):
+            self._send_json({}, status=404)
+            return
+
+        messages = request.get("messages", {})
+        if "Interrupt" in messages:
+            stub.count_request("Interrupt")
+            stub.interrupt_event.set()
+            self._send_json({"messages": {"InterruptResponse": [{}]}})
+        elif "FEval" in messages:
+            self._send_json(
+                {
+                    "messages": {
+                        "FEvalResponse": [
+                            stub.feval(feval_request)
+                            for feval_request in messages["FEval"]
+                        ]
+                    }
+                }
+            )
+        else:
+            self._send_json({}, status=400)
@@ -1,10 +1,23 @@
 # Copyright 2023 The MathWorks, Inc.
 """Mock matlab-proxy HTTP Responses."""
 
+import json
+
 import requests
 from requests.exceptions import HTTPError
 
 
+class MockJSONContent:
+    """
+    Provides the body of a mock response encoded from its json method, as the
+    kernel decodes the body of responses from MATLAB itself.
+    """
+
+    @property
+    def content(self):
+        return json.dumps(self.json()).encode("utf-8")
+
+
 class MockUnauthorisedRequestResponse:
     """
     Emulates an unauthorized request to matlab-proxy.
@@ -23,7 +23,7 @@ PASSWORD = ""
 
 
 @pytest.fixture
-def MockJupyterServerFixture(monkeypatch):
+def MockJupyterServerFixture(monkeypatch, tmp_path):
     """Mock the matlab-proxy integration with JupyterServer.
 
     This fixture provides the mocked calls to emulate that an instance of matlab proxy
@@ -45,6 +45,13 @@ def MockJupyterServerFixture(monkeypatch):
             }
         ]
 
+    class MockEnvConfigResponse:
+        status_code = requests.codes.ok
+
+        @staticmethod
+        def json():
+            return {"extension_name": "Jupyter"}
+
     class MockResponse:
         status_code = requests.codes.ok
         text = "MWI_MATLAB_PROXY_IDENTIFIER"
@@ -54,13 +61,47 @@ def MockJupyterServerFixture(monkeypatch):
             return {
                 "licensing": LICENSING,
                 "matlab": {"status": "up"},
-                "error": False,
+                "error": None,
             }
 
     def mock_get(*args, **kwargs):
+        url = args[-1] if args else kwargs["url"]
+        if url.endswith("/get_env_config"):
+            return MockEnvConfigResponse()
         return MockResponse()
 
+    # Isolate the files which the kernel reads from and writes to the Jupyter
+    # runtime and data directories.
+    monkeypatch.setenv("JUPYTER_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.setenv("JUPYTER_DATA_DIR", str(tmp_path))
     monkeypatch.setattr(serverapp, "list_running_servers", fake_list_running_servers)
     monkeypatch.setattr(os, "getppid", fake_getppid)
     monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(requests.Session, "get", mock_get)
     yield
+
+
+@pytest.fixture
+def MATLABKernelFixture(MockJupyterServerFixture):
+    """Construct a MATLABKernel connected to the mocked Jupyter Server.
+
+    The kernel is not connected to any ZMQ sockets, hence the messages it sends
+    are captured in the "outputs" attribute of the returned kernel.
+    """
+    import logging
+
+    from jupyter_matlab_kernel.kernel import MATLABKernel
+
+    kernel = MATLABKernel()
+    kernel.log = logging.getLogger("MATLABKernelFixture")
+    kernel.outputs = []
+    kernel.send_response = lambda stream, msg_type, content: kernel.outputs.append(
+        (msg_type, content)
+    )
+    yield kernel
+    kernel.executor.shutdown(wait=True)
+    kernel.http_session.close()
+    kernel.interrupt_session.close()
+    kernel.history.close()
+    if kernel.health_monitor is not None:
+        kernel.health_monitor.close()
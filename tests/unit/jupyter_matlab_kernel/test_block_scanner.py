@@ -0,0 +1,136 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.block_scanner
+import pytest
+
+from jupyter_matlab_kernel.block_scanner import INDENT, BlockScanner
+
+# Corpus of MATLAB snippets, with the expected status and indentation level of
+# the next line.
+CORPUS = [
+    # Statements
+    ("", "complete", 0),
+    ("x = 1", "complete", 0),
+    ("x = 1;\ny = 2;", "complete", 0),
+    ("disp('hello')", "complete", 0),
+    ("% just a comment", "complete", 0),
+    # Blocks
+    ("if x > 0", "incomplete", 1),
+    ("if x > 0\n    y = 1;", "incomplete", 1),
+    ("if x > 0\n    y = 1;\nelse\n    y = 2;\nend", "complete", 0),
+    ("if x, y = 1; end", "complete", 0),
+    ("for ii = 1:10\n    if ii > 5", "incomplete", 2),
+    ("for ii = 1:10\n    if ii > 5\n        break\n    end", "incomplete", 1),
+    ("for ii = 1:10\n    if ii > 5\n        break\n    end\nend", "complete", 0),
+    ("parfor ii = 1:4\n    x(ii) = ii;\nend", "complete", 0),
+    ("while true\n    x = x + 1;", "incomplete", 1),
+    ("switch x\n    case 1\n        y = 1;\n    otherwise\n", "incomplete", 1),
+    ("switch x\n    case 1\n        y = 1;\nend", "complete", 0),
+    ("try\n    error('a');\ncatch e\n    disp(e.message)\nend", "complete", 0),
+    ("function y = f(x)\n    y = x;", "incomplete", 1),
+    ("function y = f(x)\n    y = x;\nend", "complete", 0),
+    ("spmd\n    x = labindex;\nend", "complete", 0),
+    # Arguments blocks only open a block inside of a function
+    ("function f(x)\n    arguments\n        x double", "incomplete", 2),
+    ("function f(x)\n    arguments\n        x double\n    end\nend", "complete", 0),
+    ("arguments = 1", "complete", 0),
+    # Class definitions
+    ("classdef Point\n    properties", "incomplete", 2),
+    (
+        "classdef Point\n"
+        "    properties (Access = private)\n"
+        "        X = 0\n"
+        "    end\n"
+        "    methods\n"
+        "        function obj = Point(x)\n"
+        "            obj.X = x;\n"
+        "        end\n"
+        "    end\n"
+        "end",
+        "complete",
+        0,
+    ),
+    ("classdef Color\n    enumeration\n        Red, Green\n    end", "incomplete", 1),
+    ("properties(obj)", "complete", 0),
+    ("methods('double')", "complete", 0),
+    # "end" as an index, and keywords as fields
+    ("x(end)", "complete", 0),
+    ("c{end}", "complete", 0),
+    ("x(end - 1, end)", "complete", 0),
+    ("if x(end) > 0", "incomplete", 1),
+    ("s.if = 1; s.end = 2;", "complete", 0),
+    ("y = s.for", "complete", 0),
+    # Keywords and comment characters inside of strings
+    ("disp('if for while')", "complete", 0),
+    ('disp("end of it")', "complete", 0),
+    ("x = 'it''s 100%'", "complete", 0),
+    ('x = "say ""end"" % here"', "complete", 0),
+    ("x = 'for' % if", "complete", 0),
+    # Transposes and character vectors
+    ("y = x';", "complete", 0),
+    ("y = x'';", "complete", 0),
+    ("y = x(1:2)' + 1", "complete", 0),
+    ("y = [1 2]' * 'a'", "complete", 0),
+    ("y = x.'", "complete", 0),
+    ("y = 2'", "complete", 0),
+    ("y = [x' 'if']", "complete", 0),
+    ("disp 'for'", "complete", 0),
+    # Comments
+    ("x = 1 % if x", "complete", 0),
+    ("if x % end", "incomplete", 1),
+    ("%{\nif x\n%}", "complete", 0),
+    ("%{\nif x", "incomplete", 0),
+    ("%{\n%{\nend\n%}\n", "incomplete", 0),
+    ("%{\n%{\nend\n%}\n%}", "complete", 0),
+    ("if x\n  %{\n  end\n  %}", "incomplete", 1),
+    ("x = 1; %{ not a block comment", "complete", 0),
+    # Continuations and brackets
+    ("x = 1 + ...", "incomplete", 0),
+    ("x = 1 + ...\n    2", "complete", 0),
+    ("x = [1, 2, ... end\n     3]", "complete", 0),
+    ("x = [1 2\n     3 4", "incomplete", 0),
+    ("x = [1 2\n     3 4]", "complete", 0),
+    ("c = {'a', ...\n     'b'};", "complete", 0),
+    ("if x\n    y = f(1, ...", "incomplete", 1),
+    ("y = 1.5 + .5e-3 + 2i", "complete", 0),
+    # Invalid code
+    ("end", "invalid", 0),
+    ("if x\nend\nend", "invalid", 0),
+    ("x = 1)", "invalid", 0),
+    ("x = 'abc", "invalid", 0),
+    ('x = "abc', "invalid", 0),
+]
+
+
+@pytest.mark.parametrize("code, status, level", CORPUS)
+def test_check_corpus(code, status, level):
+    """
+    This test checks the status and the indentation of the next line for a
+    corpus of MATLAB snippets.
+    """
+    expected_indent = INDENT * level if status == "incomplete" else ""
+    assert BlockScanner().check(code) == (status, expected_indent)
+
+
+@pytest.mark.parametrize("code, status, level", CORPUS)
+def test_check_incrementally(code, status, level):
+    """
+    This test checks that code which grows line by line, as typed in a console,
+    has the same status as the same code scanned at once.
+    """
+    scanner = BlockScanner()
+    lines = code.split("\n")
+    for count in range(1, len(lines) + 1):
+        partial_code = "\n".join(lines[:count])
+        assert scanner.check(partial_code) == BlockScanner().check(partial_code)
+
+
+def test_check_edited_code():
+    """
+    This test checks that the state of the previous code is not reused when an
+    earlier line changes.
+    """
+    scanner = BlockScanner()
+    assert scanner.check("if x\n    y = 1;\n") == ("incomplete", INDENT)
+    assert scanner.check("x = 1\n    y = 1;\n") == ("complete", "")
+    assert scanner.check("x = 1\n    y = 1;\nend") == ("invalid", "")
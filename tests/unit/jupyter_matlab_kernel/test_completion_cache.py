@@ -0,0 +1,86 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.completion_cache
+from jupyter_matlab_kernel.completion_cache import CompletionCache
+
+
+def get_completion_results(matches, start, end):
+    return {
+        "matches": matches,
+        "start": start,
+        "end": end,
+        "completions": [
+            {"type": "function", "text": match, "start": start, "end": end}
+            for match in matches
+        ],
+    }
+
+
+def test_exact_hit():
+    """
+    This test checks that results are returned for the same code and cursor position.
+    """
+    cache = CompletionCache(10)
+    results = get_completion_results(["plot", "plot3"], 2, 4)
+    cache.put("x=pl", 4, results)
+
+    assert cache.get("x=pl", 4) == results
+    assert cache.get("y=pl", 4) is None
+
+
+def test_refinement_of_longer_prefix():
+    """
+    This test checks that cached matches are narrowed down locally when more
+    characters of the same identifier are typed.
+    """
+    cache = CompletionCache(10)
+    cache.put("x=pl;", 4, get_completion_results(["plot", "plot3", "Plus"], 2, 4))
+
+    assert cache.get("x=plo;", 5) == get_completion_results(["plot", "plot3"], 2, 5)
+    assert cache.get("x=plot3;", 7) == get_completion_results(["plot3"], 2, 7)
+
+    # No cached match for the longer prefix, hence MATLAB needs to be asked.
+    assert cache.get("x=plx;", 5) is None
+
+    # Removing characters from the prefix cannot be served from the cache.
+    assert cache.get("x=p;", 3) is None
+
+
+def test_refinement_requires_completion_of_identifier():
+    """
+    This test checks that results are not refined when the cached results do not
+    replace the identifier being completed, for example file name completions.
+    """
+    cache = CompletionCache(10)
+    cache.put("load('da", 8, get_completion_results(["'data.mat'"], 5, 8))
+
+    assert cache.get("load('dat", 9) is None
+
+
+def test_lru_eviction():
+    """
+    This test checks that the least recently used results are evicted.
+    """
+    cache = CompletionCache(2)
+    cache.put("x=a", 3, get_completion_results(["abs"], 2, 3))
+    cache.put("y=b", 3, get_completion_results(["bar"], 2, 3))
+    cache.get("x=a", 3)
+    cache.put("z=c", 3, get_completion_results(["cos"], 2, 3))
+
+    assert len(cache) == 2
+    assert cache.get("y=b", 3) is None
+    assert cache.get("x=a", 3) is not None
+
+
+def test_clear_and_disabled_cache():
+    """
+    This test checks that the cache can be cleared and disabled.
+    """
+    cache = CompletionCache(10)
+    cache.put("a", 1, get_completion_results(["abs"], 0, 1))
+    cache.clear()
+    assert cache.get("a", 1) is None
+
+    disabled_cache = CompletionCache(0)
+    disabled_cache.put("a", 1, get_completion_results(["abs"], 0, 1))
+    assert disabled_cache.get("a", 1) is None
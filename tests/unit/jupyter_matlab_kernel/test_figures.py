@@ -0,0 +1,70 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.figures
+from jupyter_matlab_kernel import figures
+
+
+def get_figure_output(value, mimetype="image/png", original_size=None):
+    out = {"type": "execute_result", "mimetype": [mimetype], "value": [value]}
+    if original_size is not None:
+        out["originalSize"] = original_size
+    return out
+
+
+def test_default_figure_options():
+    """
+    This test checks that no figure options are sent to MATLAB by default.
+    """
+    assert figures.get_figure_options() == {}
+    assert figures.is_figure_deduplication_enabled()
+
+
+def test_figure_options(monkeypatch):
+    """
+    This test checks that the figure options are read from the environment variables.
+    """
+    monkeypatch.setenv("MWI_KERNEL_FIGURE_FORMAT", "JPG")
+    monkeypatch.setenv("MWI_KERNEL_FIGURE_JPEG_QUALITY", "150")
+    monkeypatch.setenv("MWI_KERNEL_FIGURE_MAX_WIDTH", "800")
+    monkeypatch.setenv("MWI_KERNEL_FIGURE_MAX_HEIGHT", "invalid")
+    monkeypatch.setenv("MWI_KERNEL_DEDUPLICATE_FIGURES", "False")
+
+    assert figures.get_figure_options() == {
+        "figureFormat": "jpeg",
+        "figureQuality": 100,
+        "figureMaxWidth": 800,
+    }
+    assert not figures.is_figure_deduplication_enabled()
+
+
+def test_duplicate_figures_are_skipped():
+    """
+    This test checks that identical figures are only published once per cell
+    and that the bytes saved are accounted for.
+    """
+    tracker = figures.FigureTracker()
+
+    assert tracker.track(get_figure_output("AAAA", original_size=10))
+    assert tracker.track(get_figure_output("BBBB"))
+    assert not tracker.track(get_figure_output("AAAA", original_size=10))
+    assert tracker.track(get_figure_output("AAAA", mimetype="image/jpeg"))
+    assert tracker.track(
+        {"type": "execute_result", "mimetype": ["text/plain"], "value": ["AAAA"]}
+    )
+    assert (tracker.figure_count, tracker.duplicate_count) == (3, 1)
+    assert tracker.bytes_saved == 6 + 6 + 4
+
+    tracker.reset()
+    assert tracker.track(get_figure_output("AAAA"))
+    assert tracker.bytes_saved == 0
+
+
+def test_deduplication_disabled():
+    """
+    This test checks that identical figures are published when deduplication is disabled.
+    """
+    tracker = figures.FigureTracker(deduplicate=False)
+
+    assert tracker.track(get_figure_output("AAAA"))
+    assert tracker.track(get_figure_output("AAAA"))
+    assert tracker.duplicate_count == 0
@@ -0,0 +1,137 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.health
+import pytest
+import requests
+
+from jupyter_matlab_kernel import health, mwi_comm_helpers
+from jupyter_matlab_kernel.health import HealthMonitor
+
+URL = "http://localhost:1234/matlab"
+
+
+@pytest.fixture
+def matlab_proxy(monkeypatch):
+    """
+    Mocks the status reported by matlab-proxy. Set "status" to None to make
+    matlab-proxy unreachable. The number of status requests is counted.
+    """
+    state = {"status": (True, "up", False), "requests": 0}
+
+    def mock_fetch_status(url, headers, session=None):
+        state["requests"] += 1
+        if state["status"] is None:
+            raise requests.ConnectionError("Connection refused")
+        return state["status"]
+
+    monkeypatch.setattr(
+        mwi_comm_helpers, "fetch_matlab_proxy_status", mock_fetch_status
+    )
+    return state
+
+
+def test_breaker_trips_and_resets(monkeypatch, matlab_proxy):
+    """
+    This test checks that the breaker trips when a request fails, stays tripped
+    while matlab-proxy does not respond, and resets once MATLAB is up again.
+    """
+    monitor = HealthMonitor(URL, {})
+    monitor.check()
+    assert monitor.get_failure() is None
+
+    matlab_proxy["status"] = None
+    monitor.trip(requests.HTTPError("503 Server Error"))
+    assert "503 Server Error" in monitor.get_failure()
+
+    # A status checked before the breaker tripped is checked again right away.
+    monitor.check()
+    assert matlab_proxy["requests"] == 2
+    failure = monitor.get_failure()
+    assert "matlab-proxy did not respond" in failure
+    assert "checked 0 s ago" in failure
+
+    matlab_proxy["status"] = (True, "starting", False)
+    monkeypatch.setattr(health, "RECOVERY_CHECK_INTERVAL", 0)
+    monitor.check()
+    assert monitor.get_failure() is None
+    monitor.close()
+
+
+@pytest.mark.parametrize(
+    "statuses, is_tripped",
+    [
+        ([(True, "up", False), (True, "down", False)], True),
+        ([(True, "up", False), (True, "up", True)], True),
+        ([(False, "down", False), (True, "starting", False)], False),
+        ([(True, "starting", False), (True, "down", False)], False),
+    ],
+)
+def test_breaker_follows_status(statuses, is_tripped):
+    """
+    This test checks that the breaker trips when MATLAB goes down after having
+    been up, or when matlab-proxy reports an error, but not while MATLAB is
+    waiting for licensing information or starting.
+    """
+    monitor = HealthMonitor(URL, {})
+    for status in statuses:
+        monitor.update(*status)
+    assert monitor.is_tripped is is_tripped
+    monitor.close()
+
+
+def test_breaker_disabled(matlab_proxy):
+    """
+    This test checks that executions are never failed fast when the checks are
+    disabled.
+    """
+    monitor = HealthMonitor(URL, {}, interval=0)
+    monitor.update(True, "up", False)
+    monitor.update(True, "down", True)
+    monitor.trip(requests.HTTPError("503 Server Error"))
+    assert monitor.get_failure() is None
+    monitor.start()
+    assert matlab_proxy["requests"] == 0
+    monitor.close()
+
+
+def test_status_shared_between_kernels(matlab_proxy, tmp_path):
+    """
+    This test checks that the kernels using the same matlab-proxy share its
+    status, so that it is only requested once per interval.
+    """
+    status_file = health.get_status_file(str(tmp_path), URL)
+    assert status_file != health.get_status_file(str(tmp_path), URL + "2")
+
+    monitors = [HealthMonitor(URL, {}, status_file) for _ in range(5)]
+    for monitor in monitors:
+        monitor.check()
+    assert matlab_proxy["requests"] == 1
+    assert all(monitor.status["matlab_status"] == "up" for monitor in monitors)
+
+    # A kernel which sees MATLAB go down shares it with the other kernels.
+    monitors[0].update(True, "down", False)
+    monitors[1].check()
+    assert monitors[1].is_tripped
+    assert matlab_proxy["requests"] == 1
+    for monitor in monitors:
+        monitor.close()
+
+
+def test_on_down_is_called_when_matlab_is_not_up(matlab_proxy, tmp_path):
+    """
+    This test checks that the monitor tells the kernel when MATLAB is not up,
+    including when the status is checked by another kernel.
+    """
+    calls = []
+    status_file = health.get_status_file(str(tmp_path), URL)
+    monitor = HealthMonitor(URL, {}, status_file, on_down=lambda: calls.append(1))
+    other_monitor = HealthMonitor(URL, {}, status_file)
+
+    monitor.update(True, "up", False)
+    assert calls == []
+
+    other_monitor.update(True, "starting", False)
+    monitor.check()
+    assert calls == [1]
+    monitor.close()
+    other_monitor.close()
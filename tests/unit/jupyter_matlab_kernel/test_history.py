@@ -0,0 +1,109 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.history
+import pytest
+
+from jupyter_matlab_kernel import history
+from jupyter_matlab_kernel.history import HistoryStore
+
+
+@pytest.fixture
+def history_file(tmp_path):
+    return str(tmp_path / "history" / "history.sqlite")
+
+
+def get(store, hist_access_type, **kwargs):
+    return store.request(hist_access_type, **kwargs).result(timeout=5)
+
+
+def test_history_across_sessions(history_file):
+    """
+    This test checks that the code stored by a kernel is available to the next
+    kernel using the same database, as a previous session.
+    """
+    first = HistoryStore(history_file)
+    first.store(1, "x = 1")
+    first.store(2, "y = x + 1")
+    first.close()
+
+    second = HistoryStore(history_file)
+    second.store(1, "disp(y)")
+    try:
+        assert get(second, "tail", n=2) == [
+            (first.session, 2, "y = x + 1"),
+            (second.session, 1, "disp(y)"),
+        ]
+        assert get(second, "range", session=0, start=1) == [
+            (second.session, 1, "disp(y)")
+        ]
+        assert get(second, "range", session=-1, start=2) == [
+            (first.session, 2, "y = x + 1")
+        ]
+        assert get(second, "range", session=first.session, start=1, stop=2) == [
+            (first.session, 1, "x = 1")
+        ]
+    finally:
+        second.close()
+
+
+def test_search_history(history_file):
+    """
+    This test checks that searches match glob patterns, return the most recent
+    matches in the order of execution, and omit duplicates if requested.
+    """
+    store = HistoryStore(history_file)
+    for line, source in enumerate(
+        ["plot(x)", "x = 1", "plot(y)", "plot(x)", "surf(z)"], 1
+    ):
+        store.store(line, source)
+    try:
+        matches = get(store, "search", pattern="plot*")
+        # The session is known once the database is opened.
+        session = store.session
+        assert matches == [
+            (session, 1, "plot(x)"),
+            (session, 3, "plot(y)"),
+            (session, 4, "plot(x)"),
+        ]
+        assert get(store, "search", pattern="plot*", unique=True) == [
+            (session, 3, "plot(y)"),
+            (session, 4, "plot(x)"),
+        ]
+        assert get(store, "search", pattern="*(*", n=2) == [
+            (session, 4, "plot(x)"),
+            (session, 5, "surf(z)"),
+        ]
+        assert get(store, "search", pattern="PLOT*") == []
+    finally:
+        store.close()
+
+
+def test_history_without_database(tmp_path):
+    """
+    This test checks that the kernel keeps working, without history, when the
+    database cannot be opened.
+    """
+    not_a_folder = tmp_path / "file"
+    not_a_folder.write_text("")
+    store = HistoryStore(str(not_a_folder / "history.sqlite"))
+    store.store(1, "x = 1")
+    assert get(store, "tail", n=10) == []
+    assert not store.enabled
+    store.close()
+
+    assert get(HistoryStore(None), "tail", n=10) == []
+
+
+def test_get_history_file(monkeypatch, tmp_path):
+    """
+    This test checks that the database is in the Jupyter data directory, unless
+    set by the user.
+    """
+    monkeypatch.setenv("JUPYTER_DATA_DIR", str(tmp_path))
+    monkeypatch.delenv("MWI_KERNEL_HISTORY_FILE", raising=False)
+    assert history.get_history_file() == str(
+        tmp_path / "jupyter_matlab_kernel" / "history.sqlite"
+    )
+
+    monkeypatch.setenv("MWI_KERNEL_HISTORY_FILE", str(tmp_path / "custom.sqlite"))
+    assert history.get_history_file() == str(tmp_path / "custom.sqlite")
@@ -0,0 +1,53 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.json_decoder
+import importlib
+import json
+
+import pytest
+
+from jupyter_matlab_kernel import json_decoder
+
+
+def test_get_json_decoder(monkeypatch):
+    """
+    This test checks that the configured JSON library is used, and that the
+    fastest installed library is used when the configured one is not installed.
+    """
+    monkeypatch.setenv("MWI_KERNEL_JSON_DECODER", "json")
+    assert json_decoder.get_json_decoder() == ("json", json.loads)
+
+    import_module = importlib.import_module
+
+    def mock_import_module(name):
+        if name in ("orjson", "ujson"):
+            raise ImportError(name)
+        return import_module(name)
+
+    monkeypatch.setattr(importlib, "import_module", mock_import_module)
+    assert json_decoder.get_json_decoder("orjson")[0] == "json"
+    assert json_decoder.get_json_decoder("auto")[0] == "json"
+
+
+@pytest.mark.parametrize("name", json_decoder.SUPPORTED_JSON_DECODERS)
+def test_decode_response(name, monkeypatch):
+    """
+    This test checks that the responses of the MVM endpoint are decoded from the
+    bytes of the body by all the supported libraries which are installed.
+    """
+    decoder_name, decoder = json_decoder.get_json_decoder(name)
+    if decoder_name != name:
+        pytest.skip(f"{name} is not installed")
+    monkeypatch.setattr(json_decoder, "_decoder", decoder)
+
+    class MockResponse:
+        content = json.dumps(
+            {"messages": {"FEvalResponse": [{}, {"results": ["é"]}]}}
+        ).encode("utf-8")
+
+    assert json_decoder.decode_response(MockResponse(), "FEvalResponse") == [
+        {},
+        {"results": ["é"]},
+    ]
+    with pytest.raises(KeyError):
+        json_decoder.decode_response(MockResponse(), "EvalResponse")
@@ -5,11 +5,23 @@ from jupyter_matlab_kernel.kernel import (
     start_matlab_proxy,
     MATLABConnectionError,
 )
+import jupyter_matlab_kernel.kernel as kernel_module
 
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from unittest import mock
+
+import ipykernel.kernelbase
 import pytest
 from jupyter_server import serverapp
-from mocks.mock_jupyter_server import MockJupyterServerFixture
+from mocks.mock_jupyter_server import MockJupyterServerFixture, MATLABKernelFixture
 import mocks.mock_jupyter_server as MockJupyterServer
+from jupyter_matlab_kernel import health, mwi_comm_helpers
+from requests.exceptions import HTTPError
 
 
 def test_start_matlab_proxy_without_jupyter_server():
@@ -84,3 +96,1064 @@ def test_start_matlab_proxy_jh_api_token(monkeypatch, MockJupyterServerFixture):
     monkeypatch.setenv("JUPYTERHUB_API_TOKEN", "test_jh_token")
     _, _, headers = start_matlab_proxy()
     assert headers == {"Authorization": "token test_jh_token"}
+
+
+def test_start_matlab_proxy_reads_jupyter_runtime_file(
+    monkeypatch, tmp_path, MockJupyterServerFixture
+):
+    """
+    This test checks that start_matlab_proxy reads the runtime file of the Jupyter
+    server which started the kernel, without listing all the running servers.
+    """
+
+    def fail_list_running_servers(*args, **kwargs):
+        raise AssertionError("list_running_servers should not be called")
+
+    monkeypatch.setattr(serverapp, "list_running_servers", fail_list_running_servers)
+    (tmp_path / f"jpserver-{MockJupyterServer.PID}.json").write_text(
+        json.dumps(
+            {
+                "pid": MockJupyterServer.PID,
+                "port": MockJupyterServer.PORT,
+                "base_url": MockJupyterServer.BASE_URL,
+                "secure": True,
+                "token": MockJupyterServer.TEST_TOKEN,
+                "password": MockJupyterServer.PASSWORD,
+            }
+        )
+    )
+
+    url, _, headers = start_matlab_proxy()
+    assert url.startswith("https://localhost:")
+    assert headers == MockJupyterServer.AUTHORISED_HEADERS
+
+
+def test_start_matlab_proxy_reuses_cached_connection(
+    monkeypatch, tmp_path, MockJupyterServerFixture
+):
+    """
+    This test checks that the connection information resolved by a kernel is
+    reused by the kernels started later by the same Jupyter server.
+    """
+    expected = start_matlab_proxy()
+    cache_file = tmp_path / f"jupyter_matlab_kernel-{MockJupyterServer.PID}.json"
+    assert cache_file.exists()
+    if os.name == "posix":
+        assert cache_file.stat().st_mode & 0o777 == 0o600
+
+    def fail_list_running_servers(*args, **kwargs):
+        raise AssertionError("list_running_servers should not be called")
+
+    monkeypatch.setattr(serverapp, "list_running_servers", fail_list_running_servers)
+    assert start_matlab_proxy() == expected
+
+
+def test_start_matlab_proxy_with_invalid_token(monkeypatch, MockJupyterServerFixture):
+    """
+    This test checks that start_matlab_proxy raises an exception when the response
+    is not from matlab-proxy, as is the case when the Jupyter token is invalid.
+    """
+
+    class MockLoginPageResponse:
+        status_code = 200
+
+        @staticmethod
+        def json():
+            raise ValueError("Not JSON")
+
+    monkeypatch.setattr(
+        kernel_module.requests, "get", lambda *args, **kwargs: MockLoginPageResponse()
+    )
+
+    with pytest.raises(MATLABConnectionError) as exceptionInfo:
+        start_matlab_proxy()
+
+    assert "invalid jupyter security tokens" in str(exceptionInfo.value)
+
+
+def test_do_execute_runs_request_off_the_event_loop(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that do_execute is a coroutine which sends the execution
+    request to MATLAB from a worker thread, leaving the event loop free.
+    """
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    request_threads = []
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        request_threads.append(threading.current_thread())
+        return [{"type": "stream", "content": {"name": "stdout", "text": code}}]
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+
+    reply = asyncio.run(kernel.do_execute("disp(1)", False))
+
+    assert reply["status"] == "ok"
+    assert request_threads[0] is not threading.main_thread()
+    assert ("stream", {"name": "stdout", "text": "disp(1)"}) in kernel.outputs
+
+
+@pytest.fixture
+def MockSessionPoolFixture(monkeypatch, MockJupyterServerFixture):
+    """
+    Replaces the pool of MATLAB sessions with a single session, which is only
+    claimed once "is_claimable" is set, and records the requests sent to MATLAB.
+    """
+    from jupyter_matlab_kernel import session_pool
+
+    state = {
+        "is_claimable": threading.Event(),
+        "needs_reset": True,
+        "requests": [],
+        "released": [],
+    }
+
+    def mock_claim(self):
+        state["is_claimable"].wait(5)
+        return {
+            "id": "session-1",
+            "url": "http://127.0.0.1:1/matlab",
+            "headers": {"mwi-auth-token": "token"},
+            "needs_reset": state["needs_reset"],
+        }
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        state["requests"].append((url, code))
+        return []
+
+    def mock_reset(url, headers, session=None):
+        state["requests"].append((url, "reset"))
+
+    monkeypatch.setenv("MWI_KERNEL_SESSION_POOL_SIZE", "1")
+    monkeypatch.setattr(session_pool.SessionPool, "claim", mock_claim)
+    monkeypatch.setattr(session_pool.SessionPool, "refill", lambda self: None)
+    monkeypatch.setattr(
+        session_pool.SessionPool,
+        "release",
+        lambda self, session, is_reset=True: state["released"].append(is_reset),
+    )
+    monkeypatch.setattr(kernel_module, "_wait_for_matlab_proxy", mock.Mock())
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+    monkeypatch.setattr(mwi_comm_helpers, "reset_matlab_session", mock_reset)
+    yield state
+
+
+def test_matlab_session_is_claimed_in_background(MockSessionPoolFixture):
+    """
+    This test checks that the kernel starts without waiting for its MATLAB
+    session, that the first execution waits for it, and that a session left
+    by a kernel which did not clear it is cleared first.
+    """
+    state = MockSessionPoolFixture
+    kernel = kernel_module.MATLABKernel(log=logging.getLogger(__name__))
+    kernel.send_response = lambda stream, msg_type, content: None
+    try:
+        assert not kernel.session_future.done()
+        state["is_claimable"].set()
+
+        reply = asyncio.run(kernel.do_execute("x = 1", False))
+
+        assert reply["status"] == "ok"
+        assert kernel.murl == "http://127.0.0.1:1/matlab"
+        assert state["requests"] == [
+            ("http://127.0.0.1:1/matlab", "reset"),
+            ("http://127.0.0.1:1/matlab", "x = 1"),
+        ]
+        assert kernel.health_monitor is not None
+    finally:
+        kernel.do_shutdown(False)
+    assert state["released"] == [True]
+
+
+def test_matlab_session_claim_fails(monkeypatch, MockSessionPoolFixture):
+    """
+    This test checks that an error while claiming the MATLAB session, such as
+    an unsupported version of matlab-proxy, is reported by the first execution
+    instead of preventing the kernel from starting.
+    """
+    from jupyter_matlab_kernel import session_pool
+
+    def mock_claim(self):
+        raise AttributeError("get_env_name_mwi_auth_token")
+
+    monkeypatch.setattr(session_pool.SessionPool, "claim", mock_claim)
+    kernel = kernel_module.MATLABKernel(log=logging.getLogger(__name__))
+    outputs = []
+    kernel.send_response = lambda stream, msg_type, content: outputs.append(content)
+    try:
+        asyncio.run(kernel.do_execute("x = 1", False))
+        completion = asyncio.run(kernel.do_complete("x", 1))
+    finally:
+        kernel.do_shutdown(False)
+
+    assert isinstance(kernel.startup_error, MATLABConnectionError)
+    assert "get_env_name_mwi_auth_token" in outputs[-1]["text"]
+    assert completion["matches"] == []
+    assert MockSessionPoolFixture["requests"] == []
+
+
+def test_kernel_path_is_added_once_per_matlab_session(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that the MATLAB code shipped with the kernel is only added
+    to the MATLAB path for the first request, and again after MATLAB restarts.
+    """
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    add_kernel_path_values = []
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        add_kernel_path_values.append(kwargs["add_kernel_path"])
+        return []
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+
+    asyncio.run(kernel.do_execute("a = 1", False))
+    asyncio.run(kernel.do_execute("b = 1", False))
+
+    # MATLAB is restarted
+    kernel.update_matlab_status(True, "starting", False)
+    asyncio.run(kernel.do_execute("c = 1", False))
+
+    assert add_kernel_path_values == [True, False, True]
+
+
+def test_do_execute_with_streaming(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that outputs written by MATLAB to the outputs file of a
+    streaming execution are published, and that the file is removed afterwards.
+    """
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    kernel.stream_outputs = True
+    outputs_file_paths = []
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        outputs_file_path = kwargs["options"]["outputFile"]
+        outputs_file_paths.append(outputs_file_path)
+        with open(outputs_file_path, "a", encoding="utf-8") as f:
+            for section in code.split("%%"):
+                output = {
+                    "type": "stream",
+                    "content": {"name": "stdout", "text": section},
+                }
+                f.write(json.dumps(output) + "\n")
+        return []
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+
+    asyncio.run(kernel.do_execute("a%%b", False))
+
+    assert kernel.outputs == [
+        ("clear_output", {"wait": False}),
+        ("stream", {"name": "stdout", "text": "a"}),
+        ("stream", {"name": "stdout", "text": "b"}),
+    ]
+    assert not os.path.exists(outputs_file_paths[0])
+
+
+def test_completion_results_are_cached_until_execution(
+    monkeypatch, MATLABKernelFixture
+):
+    """
+    This test checks that Tab completion results are served from the cache until
+    code is executed.
+    """
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    completion_requests = []
+
+    def mock_send_completion_request(url, headers, code, cursor_pos, *args, **kwargs):
+        completion_requests.append(code)
+        return {
+            "matches": ["plot", "plot3"],
+            "start": 0,
+            "end": cursor_pos,
+            "completions": [],
+        }
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_completion_request_to_matlab",
+        mock_send_completion_request,
+    )
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        lambda *args, **kwargs: [],
+    )
+
+    asyncio.run(kernel.do_complete("pl", 2))
+    reply = asyncio.run(kernel.do_complete("plot", 4))
+    assert completion_requests == ["pl"]
+    assert reply["matches"] == ["plot", "plot3"]
+    assert reply["cursor_end"] == 4
+
+    asyncio.run(kernel.do_execute("plot = 1;", False))
+    asyncio.run(kernel.do_complete("plot", 4))
+    assert completion_requests == ["pl", "plot"]
+
+
+def test_wait_for_matlab_startup(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that the kernel waits until MATLAB is up, polling with a
+    growing interval, and records the duration of the startup phases.
+    """
+    kernel = MATLABKernelFixture
+    statuses = [
+        (False, "down", False),
+        (True, "starting", False),
+        (True, "starting", False),
+        (True, "up", False),
+    ]
+    sleep_intervals = []
+
+    def mock_fetch_matlab_proxy_status(*args, **kwargs):
+        return statuses.pop(0)
+
+    async def mock_sleep(interval):
+        sleep_intervals.append(interval)
+
+    monkeypatch.setattr(
+        mwi_comm_helpers, "fetch_matlab_proxy_status", mock_fetch_matlab_proxy_status
+    )
+    monkeypatch.setattr(kernel_module.asyncio, "sleep", mock_sleep)
+
+    asyncio.run(kernel.perform_startup_checks())
+
+    assert kernel.matlab_status == "up"
+    assert sleep_intervals == [0.1, 0.1, 0.15000000000000002]
+    assert set(kernel.startup_timings) == {"licensing", "matlab_startup"}
+    assert ("stream", {"name": "stdout", "text": "Starting MATLAB ...\n"}) in (
+        kernel.outputs
+    )
+
+
+def test_wait_for_matlab_startup_timeout(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that a MATLABConnectionError is raised if MATLAB does not
+    start within the startup timeout.
+    """
+    kernel = MATLABKernelFixture
+    kernel.matlab_startup_timeout = 0
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "fetch_matlab_proxy_status",
+        lambda *args, **kwargs: (True, "starting", False),
+    )
+
+    with pytest.raises(MATLABConnectionError):
+        asyncio.run(kernel.perform_startup_checks())
+
+
+def test_eager_start(monkeypatch, MockJupyterServerFixture):
+    """
+    This test checks that with MWI_KERNEL_EAGER_START set, the kernel waits for
+    MATLAB, adds its MATLAB code to the path and warms up MATLAB in the
+    background, so that the first execution request does not need to. The
+    background startup must not wait for the workers of the kernel, of which
+    there may be only one, nor change the state of the kernel from its thread.
+    """
+    monkeypatch.setenv("MWI_KERNEL_EAGER_START", "true")
+    monkeypatch.setenv("MWI_KERNEL_HTTP_POOL_SIZE", "1")
+    add_kernel_path_requests = []
+    warmup_requests = []
+    add_kernel_path_values = []
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "fetch_matlab_proxy_status",
+        lambda *args, **kwargs: (True, "up", False),
+    )
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "add_kernel_path_to_matlab",
+        lambda *args, **kwargs: add_kernel_path_requests.append(args),
+    )
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_warmup_request_to_matlab",
+        lambda *args, **kwargs: warmup_requests.append(kwargs),
+    )
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        add_kernel_path_values.append(kwargs["add_kernel_path"])
+        return []
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+
+    kernel = kernel_module.MATLABKernel(log=logging.getLogger("test_eager_start"))
+    kernel.send_response = lambda *args: None
+    try:
+        kernel.prewarm_future.result(timeout=5)
+        assert len(add_kernel_path_requests) == 1
+        assert warmup_requests == [{"add_kernel_path": False}]
+        assert kernel.is_kernel_path_added is False
+
+        asyncio.run(kernel.do_execute("x = 1", False))
+        assert add_kernel_path_values == [False]
+    finally:
+        kernel.executor.shutdown(wait=True)
+
+
+def test_figure_options_and_duplicate_figures(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that the figure options are sent to MATLAB and that identical
+    figures are only published once per cell.
+    """
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    kernel.figure_options = {"figureFormat": "jpeg", "figureQuality": 75}
+    sent_options = []
+    figure = {"type": "execute_result", "mimetype": ["image/jpeg"], "value": ["AAAA"]}
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        sent_options.append(kwargs["options"])
+        return [figure, figure]
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+
+    for _ in range(2):
+        asyncio.run(kernel.do_execute("plot(1:10)", False))
+
+    # The workspace is requested in full since MATLAB did not send its changes.
+    assert (
+        sent_options
+        == [
+            dict(
+                kernel.figure_options,
+                workspaceKey=kernel.workspace_key,
+                workspaceReset=True,
+            )
+        ]
+        * 2
+    )
+    published = [out for out in kernel.outputs if out[0] == "execute_result"]
+    assert len(published) == 2
+    assert kernel.figure_tracker.duplicate_count == 1
+
+
+def test_fetch_variable_page(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that pages of large variables are fetched from MATLAB and
+    that the outputs of large variables tell the frontend how to request them.
+    """
+    kernel = MATLABKernelFixture
+    page_requests = []
+
+    def mock_send_variable_page_request(
+        url, headers, name, start_row, num_rows, session=None, **kwargs
+    ):
+        page_requests.append((name, start_row, num_rows))
+        if name != "x":
+            raise Exception("Variable 'y' does not exist in the MATLAB workspace.")
+        return {
+            "name": name,
+            "rows": 100,
+            "columns": 1,
+            "startRow": start_row,
+            "endRow": start_row + num_rows - 1,
+            "text": "page",
+        }
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_variable_page_request_to_matlab",
+        mock_send_variable_page_request,
+    )
+
+    page = asyncio.run(
+        kernel.fetch_variable_page({"variable": "x", "start_row": 21, "page_size": 1e9})
+    )
+    assert page["start_row"] == 21
+    assert page["end_row"] == 20 + kernel_module.MAX_VARIABLE_PAGE_SIZE
+    assert page["text"] == "page"
+
+    page = asyncio.run(kernel.fetch_variable_page({"variable": "y"}))
+    assert "does not exist" in page["error"]
+    assert page_requests[-1] == ("y", 1, kernel_module.DEFAULT_VARIABLE_PAGE_SIZE)
+
+    kernel.display_output(
+        {
+            "type": "execute_result",
+            "mimetype": ["text/plain"],
+            "value": ["x = 100x1 double..."],
+            "pageable": {"name": "x", "rows": 100, "columns": 1},
+        }
+    )
+    metadata = kernel.outputs[-1][1]["metadata"][kernel_module.VARIABLE_PAGER_TARGET]
+    assert metadata["variable"] == "x"
+    assert metadata["rows"] == 100
+
+
+def test_execution_metrics(monkeypatch, tmp_path, MATLABKernelFixture):
+    """
+    This test checks that the timings of an execution request are recorded,
+    including the timings returned by MATLAB, which are not displayed.
+    """
+    from jupyter_matlab_kernel import metrics
+
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    kernel.metrics = metrics.KernelMetrics(str(tmp_path / "kernel.json"))
+    sent_options = []
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        sent_options.append(kwargs["options"])
+        return [
+            {"type": "stream", "content": {"name": "stdout", "text": "a = 1"}},
+            {"type": "timings", "content": {"evaluate": 0.5, "process_outputs": 0}},
+        ]
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+
+    asyncio.run(kernel.do_execute("a = 1", False))
+
+    assert sent_options[0]["collectTimings"] is True
+    assert "timings" not in [msg_type for msg_type, _ in kernel.outputs]
+    with open(tmp_path / "kernel.json") as f:
+        spans = json.load(f)
+    assert spans["matlab.evaluate"]["sum"] == 0.5
+    for span in ["execute", "execute.request", "execute.publish"]:
+        assert spans[span]["count"] == 1
+
+
+def test_scheduled_execution(monkeypatch, tmp_path, MATLABKernelFixture):
+    """
+    This test checks that an execution waits for its turn when requests are
+    scheduled, and tells the user that it is waiting while it waits.
+    """
+    from jupyter_matlab_kernel.scheduler import PRIORITY_EXECUTE, RequestScheduler
+
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    queue_dir = tmp_path / "queue"
+    kernel.scheduler = RequestScheduler(str(queue_dir))
+    monkeypatch.setattr(kernel_module, "SCHEDULER_WAIT_NOTICE_DELAY", 0)
+
+    # Outputs of the previous cell were published just before.
+    kernel.stream_coalescer.flush_interval = 60
+    kernel.display_output(
+        {"type": "stream", "content": {"name": "stdout", "text": "x"}}
+    )
+
+    # Another request is being processed by MATLAB.
+    other_ticket = kernel.scheduler.enqueue(PRIORITY_EXECUTE)
+    assert kernel.scheduler.try_acquire(other_ticket)[0]
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        return [{"type": "stream", "content": {"name": "stdout", "text": code}}]
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+
+    async def execute():
+        execution = asyncio.ensure_future(kernel.do_execute("disp(1)", False))
+        await asyncio.sleep(0.1)
+        assert not execution.done()
+        assert "Waiting for MATLAB" in kernel.outputs[-1][1]["text"]
+        kernel.scheduler.release(other_ticket)
+        return await execution
+
+    reply = asyncio.run(execute())
+
+    assert reply["status"] == "ok"
+    assert "Waiting for MATLAB" in kernel.outputs[1][1]["text"]
+    assert ("stream", {"name": "stdout", "text": "disp(1)"}) in kernel.outputs
+    assert os.listdir(queue_dir) == []
+
+
+def test_queued_executions_are_batched(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that cells queued behind the cell being executed are sent
+    to MATLAB in the same request, that their outputs are published when their
+    turn comes, and that cells which MATLAB did not execute because a previous
+    cell errored are sent again.
+    """
+    from jupyter_client.session import Session
+    import zmq
+
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    kernel.execute_batch_size = 3
+    kernel.session = Session(key=b"")
+
+    # Shell messages as received by the kernel.
+    def queue_message(msg_type, content):
+        msg = kernel.session.msg(msg_type, content)
+        frames = [zmq.Frame(part) for part in kernel.session.serialize(msg)]
+        kernel.queued_shell_messages.append(kernel.peek_shell_message(frames))
+        return msg["header"]["msg_id"]
+
+    msg_ids = [
+        queue_message("execute_request", {"code": code, "silent": False})
+        for code in ("a = 1", "b = 2", "error('c')", "d = 4")
+    ]
+    queue_message("complete_request", {"code": "x", "cursor_pos": 1})
+    queue_message("execute_request", {"code": "f = 6", "silent": False})
+    assert [message["code"] for message in kernel.queued_shell_messages] == [
+        "a = 1",
+        "b = 2",
+        "error('c')",
+        "d = 4",
+        None,
+        "f = 6",
+    ]
+
+    batches = []
+
+    def mock_send_batch_execution_request(url, headers, codes, session=None, **kwargs):
+        batches.append(codes)
+        # The second cell errors, hence MATLAB does not execute the third one.
+        return [
+            {
+                "outputs": [
+                    {"type": "stream", "content": {"name": "stdout", "text": code}}
+                ],
+                "hasError": code.startswith("error"),
+            }
+            for code in codes[:2]
+        ]
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_batch_execution_request_to_matlab",
+        mock_send_batch_execution_request,
+    )
+
+    codes = ["a = 1", "b = 2", "error('c')", "d = 4"]
+    for msg_id, code in zip(msg_ids, codes):
+        kernel.set_parent([], {"header": {"msg_id": msg_id}}, channel="shell")
+        kernel.outputs.clear()
+        asyncio.run(kernel.do_execute(code, False))
+        assert ("stream", {"name": "stdout", "text": code}) in kernel.outputs
+        kernel.queued_shell_messages.pop(0)
+
+    # Batches are limited to the batch size, and end at any message which is not
+    # an execution request.
+    assert batches == [["a = 1", "b = 2", "error('c')"], ["error('c')", "d = 4"]]
+    assert kernel.batched_outputs == {}
+
+
+def test_requests_handled_while_executing(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that completion, inspection and kernel info requests are
+    handled right away while a cell is being executed, instead of waiting for
+    the execution to complete, and that other shell messages wait for their turn.
+    """
+    from jupyter_client.session import Session
+    import zmq
+
+    kernel = MATLABKernelFixture
+    kernel.session = Session(key=b"")
+    handled = []
+
+    async def mock_shell_main(self, subshell_id, msg):
+        handled.append("queued")
+
+    async def mock_dispatch_shell(msg, subshell_id=None):
+        handled.append("concurrent")
+
+    monkeypatch.setattr(ipykernel.kernelbase.Kernel, "shell_main", mock_shell_main)
+    monkeypatch.setattr(kernel, "dispatch_shell", mock_dispatch_shell)
+
+    def handle(msg_type, content):
+        msg = kernel.session.msg(msg_type, content)
+        frames = [zmq.Frame(part) for part in kernel.session.serialize(msg)]
+        handled.clear()
+        asyncio.run(kernel.shell_main(None, frames))
+        return handled[0]
+
+    complete = ("complete_request", {"code": "x", "cursor_pos": 1})
+    assert handle(*complete) == "queued"
+
+    kernel.is_executing = True
+    assert handle(*complete) == "concurrent"
+    assert handle("inspect_request", {"code": "x", "cursor_pos": 1}) == "concurrent"
+    assert handle("kernel_info_request", {}) == "concurrent"
+    assert handle("execute_request", {"code": "x", "silent": False}) == "queued"
+    assert handle("history_request", {"hist_access_type": "tail"}) == "queued"
+
+
+def test_batching_without_shell_main_hook(monkeypatch, MockJupyterServerFixture):
+    """
+    This test checks that cells are executed one at a time, and that interrupts
+    still work, with versions of ipykernel which do not hand the queued shell
+    messages to the kernel or do not provide a way to abort them.
+    """
+    monkeypatch.setenv("MWI_KERNEL_EXECUTE_BATCH_SIZE", "4")
+    monkeypatch.setattr(kernel_module, "HAS_SHELL_MAIN_HOOK", False)
+    monkeypatch.delattr(ipykernel.kernelbase.Kernel, "_abort_queues")
+
+    kernel = kernel_module.MATLABKernel(log=logging.getLogger(__name__))
+    try:
+        assert kernel.execute_batch_size == 1
+        kernel.cancel_queued_executions()
+    finally:
+        kernel.do_shutdown(False)
+
+
+def test_stream_outputs_are_coalesced(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that many small stream outputs of a cell are published as
+    a few messages, and that the outputs beyond the limit are suppressed.
+    """
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    kernel.stream_coalescer.max_output_size = 1000
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        return [
+            {"type": "stream", "content": {"name": "stdout", "text": f"{idx}\n"}}
+            for idx in range(50000)
+        ]
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+
+    asyncio.run(kernel.do_execute("for idx = 0:49999, disp(idx), end", False))
+
+    streams = [content for msg_type, content in kernel.outputs if msg_type == "stream"]
+    assert len(streams) <= 3
+    assert sum(len(s["text"]) for s in streams if s["name"] == "stdout") == 1000
+    assert "line(s) of output suppressed" in streams[-1]["text"]
+
+
+def test_interrupt_cancels_queued_executions(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that an interrupt targets the request of the cell being
+    executed, that the cell confirms the interrupt with the time MATLAB took to
+    stop, and that the cells queued behind it are aborted.
+    """
+    from jupyter_client.session import Session
+
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    is_interrupted = threading.Event()
+    execution_ids = []
+    interrupted_ids = []
+    replies = []
+    aborts = []
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        assert kernel.inflight_requests == {kwargs["request_id"]: mock.ANY}
+        execution_ids.append(kwargs["request_id"])
+        is_interrupted.wait(5)
+        raise Exception("Failed to execute. Operation may have interrupted by user.")
+
+    def mock_send_interrupt_request(url, headers, request_id, session=None):
+        assert session is kernel.interrupt_session
+        interrupted_ids.append(request_id)
+        is_interrupted.set()
+
+    def mock_send(stream, msg_type, content, parent, ident=None):
+        replies.append((msg_type, content))
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_interrupt_request_to_matlab",
+        mock_send_interrupt_request,
+    )
+    kernel.session = Session(key=b"")
+    monkeypatch.setattr(kernel.session, "send", mock_send)
+    monkeypatch.setattr(kernel, "_abort_queues", lambda: aborts.append(True))
+
+    async def execute():
+        execution = asyncio.ensure_future(kernel.do_execute("pause(60)", False))
+        while not kernel.inflight_requests:
+            await asyncio.sleep(0.01)
+        await kernel.interrupt_request(None, [], {})
+        return await execution
+
+    reply = asyncio.run(execute())
+
+    assert reply["status"] == "ok"
+    assert interrupted_ids == [execution_ids[0]]
+    assert replies == [("interrupt_reply", {"status": "ok"})]
+    assert "MATLAB stopped" in kernel.outputs[-1][1]["text"]
+    assert kernel.inflight_requests == {}
+    assert aborts == [True]
+
+
+def test_interrupt_without_request_in_flight(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that no interrupt is sent to MATLAB, which may be running
+    a request of another kernel, when no request of the kernel is in flight,
+    and that executions waiting for their turn are cancelled.
+    """
+    from jupyter_client.session import Session
+
+    kernel = MATLABKernelFixture
+    replies = []
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_interrupt_request_to_matlab",
+        mock.Mock(side_effect=AssertionError("MATLAB must not be interrupted")),
+    )
+    kernel.session = Session(key=b"")
+    monkeypatch.setattr(
+        kernel.session,
+        "send",
+        lambda stream, msg_type, content, parent, ident=None: replies.append(
+            (msg_type, content)
+        ),
+    )
+
+    async def interrupt():
+        start_time = time.perf_counter()
+        await kernel.interrupt_request(None, [], {})
+        return kernel.is_interrupted_since(start_time)
+
+    assert asyncio.run(interrupt())
+    assert replies == [("interrupt_reply", {"status": "ok"})]
+
+
+def test_current_request_id(MATLABKernelFixture):
+    """
+    This test checks that an interrupt targets the execution in flight rather
+    than a completion or an inspection sent after it.
+    """
+    from jupyter_matlab_kernel import scheduler
+
+    kernel = MATLABKernelFixture
+    assert kernel.get_current_request_id() is None
+    kernel.inflight_requests["A"] = scheduler.PRIORITY_EXECUTE
+    kernel.inflight_requests["B"] = scheduler.PRIORITY_INTERACTIVE
+    assert kernel.get_current_request_id() == "A"
+    del kernel.inflight_requests["A"]
+    assert kernel.get_current_request_id() == "B"
+    kernel.inflight_requests.clear()
+
+
+def test_inspect_uses_workspace_cache(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that variables are inspected using the changes of the
+    workspace received with the outputs of executions, and that the help of a
+    function is only fetched from MATLAB once, as is the missing help of an
+    unknown name until the next execution.
+    """
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    sent_options = []
+    help_requests = []
+    workspace_changes = [
+        {
+            "reset": True,
+            "changed": [
+                {"name": "x", "class": "double", "size": "3x3", "bytes": 72},
+                {"name": "s", "class": "struct", "size": "1x1", "bytes": 176},
+            ],
+            "removed": [],
+        },
+        {
+            "reset": False,
+            "changed": {"name": "x", "class": "single", "size": "1x1", "bytes": 4},
+            "removed": "s",
+        },
+    ]
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        sent_options.append(kwargs["options"])
+        return [{"type": "workspace", "content": workspace_changes.pop(0)}]
+
+    def mock_send_help_request(url, headers, name, session=None, **kwargs):
+        help_requests.append(name)
+        return " plot   Linear plot." if name == "plot" else ""
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+    monkeypatch.setattr(
+        mwi_comm_helpers, "send_help_request_to_matlab", mock_send_help_request
+    )
+
+    def inspect(code, cursor_pos):
+        return asyncio.run(kernel.do_inspect(code, cursor_pos))
+
+    asyncio.run(kernel.do_execute("x = eye(3); s.a = 1;", False))
+    assert inspect("y = x + 1", 5)["data"] == {"text/plain": "x: 3x3 double\nBytes: 72"}
+    assert inspect("s.a", 3)["data"]["text/plain"].startswith("s: 1x1 struct")
+
+    asyncio.run(kernel.do_execute("x = single(1); clear s", False))
+    assert sent_options[0]["workspaceReset"] is True
+    assert "workspaceReset" not in sent_options[1]
+    assert inspect("x", 1)["data"]["text/plain"].startswith("x: 1x1 single")
+    assert inspect("s", 1)["found"] is False
+    assert inspect("s", 1)["found"] is False
+
+    for _ in range(2):
+        reply = inspect("plot(x)", 2)
+        assert reply["found"] is True
+        assert "Linear plot" in reply["data"]["text/plain"]
+    assert help_requests == ["s", "plot"]
+
+    workspace_changes.append({"reset": False, "changed": [], "removed": []})
+    asyncio.run(kernel.do_execute("s = @() 1;", False))
+    assert inspect("s", 1)["found"] is False
+    assert help_requests == ["s", "plot", "s"]
+    assert all(msg_type != "workspace" for msg_type, _ in kernel.outputs)
+
+
+def test_is_complete_without_matlab(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that code completeness is answered without a request to
+    MATLAB, with the indentation of the next line when the code is incomplete.
+    """
+    kernel = MATLABKernelFixture
+
+    def mock_send_request(*args, **kwargs):
+        raise AssertionError("Unexpected request to MATLAB")
+
+    monkeypatch.setattr(
+        mwi_comm_helpers, "_send_jupyter_request_to_matlab", mock_send_request
+    )
+
+    assert kernel.do_is_complete("for ii = 1:3\n    if ii > 1") == {
+        "status": "incomplete",
+        "indent": "        ",
+    }
+    assert kernel.do_is_complete("x(end) = 1;") == {"status": "complete"}
+    assert kernel.do_is_complete("end") == {"status": "invalid"}
+
+
+def test_history_of_executions(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that the code of executions which are stored in the
+    history is returned by history requests.
+    """
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        lambda *args, **kwargs: [],
+    )
+
+    for code, silent, store_history in [
+        ("x = 1", False, True),
+        ("y = 2", True, True),
+        ("z = 3", False, False),
+        ("disp(x)", False, True),
+    ]:
+        kernel.execution_count += 1
+        asyncio.run(kernel.do_execute(code, silent, store_history))
+
+    reply = asyncio.run(kernel.do_history("tail", False, True, n=10))
+    assert reply["status"] == "ok"
+    assert [entry[1:] for entry in reply["history"]] == [(1, "x = 1"), (4, "disp(x)")]
+
+    reply = asyncio.run(
+        kernel.do_history("search", True, True, pattern="disp*", unique=True)
+    )
+    assert [entry[1:] for entry in reply["history"]] == [(4, ("disp(x)", None))]
+
+
+def test_execute_fails_fast_while_matlab_is_down(monkeypatch, MATLABKernelFixture):
+    """
+    This test checks that once a request to MATLAB fails, executions fail right
+    away while MATLAB is down, without waiting for MATLAB to start, and resume
+    once MATLAB is up again.
+    """
+    kernel = MATLABKernelFixture
+    kernel.startup_checks_completed = True
+    # The status of MATLAB is checked by the test instead of the watchdog.
+    kernel.health_monitor.close()
+    matlab_status = {"value": "up"}
+    startup_checks = []
+
+    def mock_send_execution_request(url, headers, code, session=None, **kwargs):
+        if matlab_status["value"] != "up":
+            raise HTTPError("503 Server Error: Service Unavailable")
+        return [{"type": "stream", "content": {"name": "stdout", "text": code}}]
+
+    async def mock_perform_startup_checks():
+        startup_checks.append(True)
+
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_execution_request_to_matlab",
+        mock_send_execution_request,
+    )
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "fetch_matlab_proxy_status",
+        lambda *args, **kwargs: (True, matlab_status["value"], False),
+    )
+    monkeypatch.setattr(kernel, "perform_startup_checks", mock_perform_startup_checks)
+
+    matlab_status["value"] = "down"
+    asyncio.run(kernel.do_execute("x = 1", False))
+    assert "503 Server Error" in kernel.outputs[-1][1]["text"]
+
+    kernel.health_monitor.check()
+    start_time = time.perf_counter()
+    asyncio.run(kernel.do_execute("x = 2", False))
+    assert time.perf_counter() - start_time < 1
+    assert "Reason: MATLAB is down." in kernel.outputs[-1][1]["text"]
+    assert startup_checks == []
+
+    matlab_status["value"] = "up"
+    monkeypatch.setattr(health, "RECOVERY_CHECK_INTERVAL", 0)
+    kernel.health_monitor.check()
+    asyncio.run(kernel.do_execute("x = 3", False))
+    assert startup_checks == [True]
+    assert kernel.outputs[-1] == ("stream", {"name": "stdout", "text": "x = 3"})
+
+
+def test_notices_are_published_right_away(MATLABKernelFixture):
+    """
+    This test checks that a notice of the kernel is published right away, even
+    when stream outputs were published within the flush interval.
+    """
+    kernel = MATLABKernelFixture
+    kernel.stream_coalescer.flush_interval = 60
+    kernel.display_output(
+        {"type": "stream", "content": {"name": "stdout", "text": "x"}}
+    )
+    kernel.display_notice("Starting MATLAB ...\n")
+
+    assert [content["text"] for _, content in kernel.outputs] == [
+        "x",
+        "Starting MATLAB ...\n",
+    ]
@@ -0,0 +1,87 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.metrics
+import json
+import os
+
+from jupyter_matlab_kernel import metrics
+
+
+def test_get_metrics_file(monkeypatch, tmp_path):
+    """
+    This test checks that each kernel writes its metrics to its own file in the
+    folder set by the user.
+    """
+    assert metrics.get_metrics_file() is None
+
+    monkeypatch.setenv("MWI_KERNEL_METRICS_DIR", str(tmp_path))
+    assert metrics.get_metrics_file() == str(
+        tmp_path / f"jupyter_matlab_kernel-{os.getpid()}.prom"
+    )
+
+    monkeypatch.setenv("MWI_KERNEL_METRICS_FORMAT", "JSON")
+    assert metrics.get_metrics_file().endswith(".json")
+
+
+def test_prometheus_dump(tmp_path):
+    """
+    This test checks that the histograms are written in the Prometheus text
+    format, with series labelled with the process id of the kernel, and that
+    the file is removed when the kernel shuts down.
+    """
+    metrics_file = str(tmp_path / "kernel.prom")
+    kernel_metrics = metrics.KernelMetrics(metrics_file, pid=1234)
+    kernel_metrics.observe("execute", 0.2)
+    kernel_metrics.observe("execute", 3)
+    with kernel_metrics.span("complete"):
+        pass
+
+    kernel_metrics.dump()
+    with open(metrics_file) as f:
+        text = f.read()
+
+    name = metrics.METRIC_NAME
+    assert f"# TYPE {name} histogram" in text
+    assert f'{name}_bucket{{pid="1234",span="execute",le="0.1"}} 0' in text
+    assert f'{name}_bucket{{pid="1234",span="execute",le="0.25"}} 1' in text
+    assert f'{name}_bucket{{pid="1234",span="execute",le="+Inf"}} 2' in text
+    assert f'{name}_sum{{pid="1234",span="execute"}} 3.2' in text
+    assert f'{name}_count{{pid="1234",span="complete"}} 1' in text
+    series = [line for line in text.splitlines() if not line.startswith("#")]
+    assert all('pid="1234"' in line for line in series)
+    assert os.listdir(tmp_path) == ["kernel.prom"]
+
+    kernel_metrics.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_json_dump_interval(tmp_path):
+    """
+    This test checks that the metrics are written as JSON, at most once per
+    dump interval unless forced.
+    """
+    metrics_file = str(tmp_path / "kernel.json")
+    kernel_metrics = metrics.KernelMetrics(metrics_file, dump_interval=3600)
+    kernel_metrics.observe("execute", 1)
+    kernel_metrics.dump()
+    kernel_metrics.observe("execute", 1)
+    kernel_metrics.dump()
+
+    with open(metrics_file) as f:
+        assert json.load(f)["execute"]["count"] == 1
+
+    kernel_metrics.observe("execute", 1)
+    kernel_metrics.close()
+    with open(metrics_file) as f:
+        assert json.load(f)["execute"]["count"] == 3
+
+
+def test_disabled_metrics(tmp_path):
+    """
+    This test checks that nothing is written when no metrics file is set.
+    """
+    kernel_metrics = metrics.KernelMetrics()
+    kernel_metrics.observe("execute", 1)
+    kernel_metrics.dump(force=True)
+
+    assert not kernel_metrics.enabled
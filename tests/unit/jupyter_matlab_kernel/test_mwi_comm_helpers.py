@@ -2,22 +2,132 @@
 
 # This file contains tests for jupyter_matlab_kernel.mwi_comm_helpers
 from jupyter_matlab_kernel.mwi_comm_helpers import (
+    create_http_session,
+    get_http_pool_size,
     fetch_matlab_proxy_status,
+    read_streamed_outputs,
+    send_batch_execution_request_to_matlab,
     send_interrupt_request_to_matlab,
     send_execution_request_to_matlab,
+    send_variable_page_request_to_matlab,
+    send_warmup_request_to_matlab,
 )
 
+import http.server
+import threading
+
 import pytest
 import requests
 from requests.exceptions import HTTPError
 
 from mocks.mock_http_responses import (
+    MockJSONContent,
     MockUnauthorisedRequestResponse,
     MockMatlabProxyStatusResponse,
     MockSimpleBadResponse,
 )
 
 
+# Testing create_http_session
+def test_create_http_session(monkeypatch):
+    """
+    This test checks that create_http_session returns a session whose connection
+    pool size and retry policy are read from the environment.
+    """
+    monkeypatch.setenv("MWI_KERNEL_HTTP_POOL_SIZE", "8")
+    monkeypatch.setenv("MWI_KERNEL_HTTP_MAX_RETRIES", "5")
+
+    session = create_http_session()
+    adapter = session.get_adapter("https://localhost:8888/matlab")
+
+    assert adapter._pool_maxsize == 8
+    assert adapter.max_retries.total == 5
+    assert session.verify == False
+
+
+@pytest.mark.parametrize("pool_size", ["0", "-2"])
+def test_create_http_session_invalid_pool_size(monkeypatch, pool_size):
+    """
+    This test checks that a pool size below 1 is raised to 1, so that the
+    kernel can start.
+    """
+    monkeypatch.setenv("MWI_KERNEL_HTTP_POOL_SIZE", pool_size)
+
+    assert get_http_pool_size() == 1
+    adapter = create_http_session().get_adapter("http://localhost:8888/matlab")
+    assert adapter._pool_maxsize == 1
+
+
+def test_post_retried_on_stale_connection():
+    """
+    This test checks that a POST request is retried when matlab-proxy closes
+    the connection without responding, as it does for a stale keep-alive
+    connection, but not when the response is cut short.
+    """
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        requests_received = []
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.requests_received.append(self.path)
+            if self.path == "/stale" and len(self.requests_received) == 1:
+                # Close the connection without responding.
+                self.close_connection = True
+                return
+            if self.path == "/truncated":
+                self.send_response(200)
+                self.send_header("Content-Length", "100")
+                self.end_headers()
+                self.wfile.write(b"{")
+                self.close_connection = True
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    session = create_http_session(pool_size=1, max_retries=2)
+    try:
+        assert session.post(url + "/stale", json={}).json() == {}
+        assert Handler.requests_received == ["/stale", "/stale"]
+
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            session.post(url + "/truncated", json={}).json()
+        assert Handler.requests_received[2:] == ["/truncated"]
+    finally:
+        session.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetch_matlab_proxy_status_uses_session():
+    """
+    This test checks that fetch_matlab_proxy_status sends the HTTP request using
+    the provided session instead of opening a new connection.
+    """
+
+    class MockSession:
+        def __init__(self):
+            self.urls = []
+
+        def get(self, url, *args, **kwargs):
+            self.urls.append(url)
+            return MockMatlabProxyStatusResponse(True, "up", False)
+
+    session = MockSession()
+    fetch_matlab_proxy_status("http://localhost", {}, session)
+    assert session.urls == ["http://localhost/get_status"]
+
+
 # Testing fetch_matlab_proxy_status
 def test_fetch_matlab_proxy_status_unauth_request(monkeypatch):
     """
@@ -69,10 +179,47 @@ def test_interrupt_request_bad_request(monkeypatch):
     monkeypatch.setattr(requests, "post", mock_post)
 
     with pytest.raises(HTTPError) as exceptionInfo:
-        send_interrupt_request_to_matlab("", {})
+        send_interrupt_request_to_matlab("", {}, "A1B2C3D4")
     assert mock_exception_message in str(exceptionInfo.value)
 
 
+def test_interrupt_targets_requests(monkeypatch):
+    """
+    This test checks that a request to MATLAB is identified by the given id,
+    and that send_interrupt_request_to_matlab only interrupts the given
+    request.
+    """
+    requests_sent = []
+
+    class MockResponse(MockJSONContent):
+        status_code = requests.codes.ok
+
+        @staticmethod
+        def json():
+            return {
+                "messages": {
+                    "FEvalResponse": [
+                        {"isError": False, "results": [[]], "messageFaults": []}
+                    ]
+                }
+            }
+
+    def mock_post(*args, **kwargs):
+        requests_sent.append(kwargs["json"])
+        return MockResponse()
+
+    monkeypatch.setattr(requests, "post", mock_post)
+
+    send_execution_request_to_matlab(
+        "", {}, "x = 1", add_kernel_path=False, request_id="A1B2C3D4"
+    )
+    send_interrupt_request_to_matlab("", {}, "A1B2C3D4")
+
+    assert requests_sent[0]["uuid"] == "A1B2C3D4"
+    assert requests_sent[0]["messages"]["FEval"][0]["uuid"] == "A1B2C3D4"
+    assert requests_sent[1] == {"messages": {"Interrupt": [{"uuid": "A1B2C3D4"}]}}
+
+
 # Testing send_execution_request_to_matlab
 def test_execution_request_bad_request(monkeypatch):
     """
@@ -101,7 +248,7 @@ def test_execution_request_invalid_feval_response(monkeypatch):
     """
     mock_exception_message = "Mock exception thrown due to invalid feval response."
 
-    class MockSimpleInvalidFevalResponse:
+    class MockSimpleInvalidFevalResponse(MockJSONContent):
         status_code = requests.codes.ok
 
         def raise_for_status(self):
@@ -132,7 +279,7 @@ def test_execution_interrupt(monkeypatch):
 
     mock_exception_message = "Mock exception thrown due to bad request status."
 
-    class MockResponse:
+    class MockResponse(MockJSONContent):
         status_code = requests.codes.ok
 
         def raise_for_status(self):
@@ -172,7 +319,7 @@ def test_execution_success(monkeypatch):
     from a valid response from MATLAB.
     """
 
-    class MockResponse:
+    class MockResponse(MockJSONContent):
         status_code = requests.codes.ok
 
         @staticmethod
@@ -204,3 +351,256 @@ def test_execution_success(monkeypatch):
         pytest.fail("Unexpected failured in execution request")
 
     assert "Mock results from feval" in outputs
+
+
+def test_execution_request_without_kernel_path(monkeypatch):
+    """
+    This test checks that send_execution_request_to_matlab only sends the
+    processJupyterKernelRequest FEval when the kernel path is already added.
+    """
+    request_bodies = []
+
+    class MockResponse(MockJSONContent):
+        status_code = requests.codes.ok
+
+        @staticmethod
+        def json():
+            return {
+                "messages": {
+                    "FEvalResponse": [
+                        {
+                            "isError": False,
+                            "results": ["Mock results from feval"],
+                            "messageFaults": [],
+                        },
+                    ],
+                }
+            }
+
+    def mock_post(*args, **kwargs):
+        request_bodies.append(kwargs["json"])
+        return MockResponse()
+
+    monkeypatch.setattr(requests, "post", mock_post)
+
+    outputs = send_execution_request_to_matlab("", {}, "x = 1", add_kernel_path=False)
+
+    fevals = request_bodies[0]["messages"]["FEval"]
+    assert [feval["function"] for feval in fevals] == ["processJupyterKernelRequest"]
+    assert outputs == "Mock results from feval"
+
+
+@pytest.mark.parametrize(
+    "fault_message",
+    [
+        "Undefined function 'processJupyterKernelRequest' for input arguments of type 'char'.",
+        "Unrecognized function or variable 'processJupyterKernelRequest'.",
+    ],
+)
+def test_execution_request_adds_kernel_path_after_matlab_restart(
+    monkeypatch, fault_message
+):
+    """
+    This test checks that send_execution_request_to_matlab retries with the kernel
+    path added if MATLAB cannot find the MATLAB code shipped with the kernel, as
+    reported by MATLAB releases before and since R2020b.
+    """
+    request_bodies = []
+
+    class MockResponse(MockJSONContent):
+        status_code = requests.codes.ok
+
+        def __init__(self, feval_responses):
+            self.feval_responses = feval_responses
+
+        def json(self):
+            return {"messages": {"FEvalResponse": self.feval_responses}}
+
+    def mock_post(*args, **kwargs):
+        request_bodies.append(kwargs["json"])
+        if len(request_bodies) == 1:
+            return MockResponse(
+                [
+                    {
+                        "isError": True,
+                        "results": [],
+                        "messageFaults": [{"message": fault_message}],
+                    }
+                ]
+            )
+        return MockResponse(
+            [
+                {"isError": False, "results": [], "messageFaults": []},
+                {"isError": False, "results": [["output"]], "messageFaults": []},
+            ]
+        )
+
+    monkeypatch.setattr(requests, "post", mock_post)
+
+    outputs = send_execution_request_to_matlab("", {}, "x = 1", add_kernel_path=False)
+
+    assert len(request_bodies) == 2
+    assert request_bodies[1]["messages"]["FEval"][0]["function"] == "addpath"
+    assert outputs == ["output"]
+
+
+def test_variable_page_request(monkeypatch):
+    """
+    This test checks that send_variable_page_request_to_matlab returns the page
+    received from MATLAB, and raises the error message received from MATLAB when
+    the variable cannot be paged.
+    """
+    page = {"name": "x", "rows": 100, "columns": 1, "startRow": 21, "endRow": 40}
+    error = [
+        {
+            "type": "stream",
+            "content": {"name": "stderr", "text": "MATLAB Kernel Error: Undefined"},
+        }
+    ]
+    requests_sent = []
+
+    def mock_post(*args, **kwargs):
+        requests_sent.append(kwargs["json"])
+        result = page if len(requests_sent) == 1 else error
+
+        class MockResponse(MockJSONContent):
+            status_code = requests.codes.ok
+
+            @staticmethod
+            def json():
+                return {
+                    "messages": {
+                        "FEvalResponse": [
+                            {
+                                "isError": False,
+                                "results": [result],
+                                "messageFaults": [],
+                            }
+                        ]
+                    }
+                }
+
+        return MockResponse()
+
+    monkeypatch.setattr(requests, "post", mock_post)
+
+    assert (
+        send_variable_page_request_to_matlab("", {}, "x", 21, 20, add_kernel_path=False)
+        == page
+    )
+    feval = requests_sent[0]["messages"]["FEval"][-1]
+    assert feval["arguments"] == ["page", "feval", "x", 21, 20]
+
+    with pytest.raises(Exception, match="Undefined"):
+        send_variable_page_request_to_matlab("", {}, "y", 1, 20, add_kernel_path=False)
+
+
+def test_batch_execution_request(monkeypatch):
+    """
+    This test checks that send_batch_execution_request_to_matlab sends the code
+    of all the cells in a single request, and returns the outputs of each cell.
+    Errors of the kernel are returned as the outputs of the first cell.
+    """
+    error = {
+        "type": "stream",
+        "content": {"name": "stderr", "text": "MATLAB Kernel Error: Failed"},
+    }
+    results = [
+        [
+            {"outputs": [], "hasError": False},
+            {
+                "outputs": [{"type": "stream", "content": {"name": "stdout"}}],
+                "hasError": True,
+            },
+        ],
+        [error],
+    ]
+    requests_sent = []
+
+    def mock_post(*args, **kwargs):
+        requests_sent.append(kwargs["json"])
+        result = results[len(requests_sent) - 1]
+
+        class MockResponse(MockJSONContent):
+            status_code = requests.codes.ok
+
+            @staticmethod
+            def json():
+                return {
+                    "messages": {
+                        "FEvalResponse": [
+                            {
+                                "isError": False,
+                                "results": [result],
+                                "messageFaults": [],
+                            }
+                        ]
+                    }
+                }
+
+        return MockResponse()
+
+    monkeypatch.setattr(requests, "post", mock_post)
+
+    codes = ["a = 1;", "disp(a)"]
+    assert (
+        send_batch_execution_request_to_matlab("", {}, codes, add_kernel_path=False)
+        == results[0]
+    )
+    assert len(requests_sent[0]["messages"]["FEval"]) == 1
+    feval = requests_sent[0]["messages"]["FEval"][0]
+    assert feval["arguments"] == ["execute_batch", "feval", '["a = 1;", "disp(a)"]']
+
+    assert send_batch_execution_request_to_matlab(
+        "", {}, codes, add_kernel_path=False
+    ) == [{"outputs": [error], "hasError": True}]
+
+
+def test_warmup_request(monkeypatch):
+    """
+    This test checks that send_warmup_request_to_matlab sends a warmup request
+    to processJupyterKernelRequest.
+    """
+    requests_sent = []
+
+    class MockResponse(MockJSONContent):
+        status_code = requests.codes.ok
+
+        @staticmethod
+        def json():
+            return {
+                "messages": {
+                    "FEvalResponse": [
+                        {"isError": False, "results": [[]], "messageFaults": []}
+                    ]
+                }
+            }
+
+    def mock_post(*args, **kwargs):
+        requests_sent.append(kwargs["json"])
+        return MockResponse()
+
+    monkeypatch.setattr(requests, "post", mock_post)
+
+    send_warmup_request_to_matlab("", {}, add_kernel_path=False)
+    feval = requests_sent[0]["messages"]["FEval"][-1]
+    assert feval["function"] == "processJupyterKernelRequest"
+    assert feval["arguments"] == ["warmup", "feval"]
+
+
+def test_read_streamed_outputs(tmp_path):
+    """
+    This test checks that read_streamed_outputs only returns the outputs which
+    have been completely written by MATLAB.
+    """
+    outputs_file_path = tmp_path / "outputs.jsonl"
+    outputs_file_path.write_text('{"type": "stream"}\n{"type": "exec')
+
+    with open(outputs_file_path, "r", encoding="utf-8") as outputs_file:
+        assert list(read_streamed_outputs(outputs_file)) == [{"type": "stream"}]
+
+        with open(outputs_file_path, "a", encoding="utf-8") as f:
+            f.write('ute_result"}\n')
+
+        assert list(read_streamed_outputs(outputs_file)) == [{"type": "execute_result"}]
+        assert list(read_streamed_outputs(outputs_file)) == []
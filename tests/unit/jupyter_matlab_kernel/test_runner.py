@@ -0,0 +1,372 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.runner
+import json
+import os
+import subprocess
+import threading
+import time
+
+import nbformat
+import pytest
+
+from jupyter_matlab_kernel import mwi_comm_helpers, runner, session_pool
+
+
+def write_notebook(path, sources):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [nbformat.v4.new_markdown_cell("# Report")] + [
+        nbformat.v4.new_code_cell(source) for source in sources
+    ]
+    nbformat.write(nb, str(path))
+
+
+def mock_send_batch_execution_request(url, headers, codes, session=None, **kwargs):
+    results = []
+    for code in codes:
+        has_error = code.startswith("error")
+        results.append(
+            {
+                "outputs": [
+                    {"type": "stream", "content": {"name": "stdout", "text": code}},
+                    {
+                        "type": "execute_result",
+                        "mimetype": ["text/plain"],
+                        "value": [f"{url}: {code}"],
+                    },
+                    {"type": "timings", "content": {"evaluate": 0.5}},
+                ],
+                "hasError": has_error,
+            }
+        )
+        # Like in +jupyter/executeBatch.m, execution stops at the first error.
+        if has_error:
+            break
+    return results
+
+
+@pytest.fixture
+def MockSessionPoolFixture(monkeypatch):
+    """
+    Replaces the MATLAB sessions of the pool with fake sessions, and records
+    the requests sent to each session.
+    """
+    requests_sent = []
+    lock = threading.Lock()
+    claimed = []
+
+    def mock_claim(self):
+        with lock:
+            session = {
+                "id": f"session-{len(claimed)}",
+                "url": f"session-{len(claimed)}",
+                "headers": {},
+                "needs_reset": False,
+            }
+            claimed.append(session)
+        return session
+
+    def mock_send_batch(url, headers, codes, session=None, **kwargs):
+        with lock:
+            requests_sent.append((url, "execute", kwargs["add_kernel_path"]))
+        return mock_send_batch_execution_request(url, headers, codes, session)
+
+    def mock_reset(url, headers, session=None):
+        with lock:
+            requests_sent.append((url, "reset", None))
+
+    monkeypatch.setattr(runner.session_pool.SessionPool, "claim", mock_claim)
+    monkeypatch.setattr(
+        runner.session_pool.SessionPool,
+        "release",
+        lambda self, session, is_reset=True: None,
+    )
+    monkeypatch.setattr(
+        runner, "wait_for_matlab", lambda url, headers, session, timeout: None
+    )
+    monkeypatch.setattr(
+        mwi_comm_helpers, "send_batch_execution_request_to_matlab", mock_send_batch
+    )
+    monkeypatch.setattr(mwi_comm_helpers, "reset_matlab_session", mock_reset)
+    yield requests_sent
+
+
+def test_run_notebook(monkeypatch, tmp_path):
+    """
+    This test checks that run_notebook writes the outputs of each executed cell,
+    and that execution stops at the first cell which errors.
+    """
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_batch_execution_request_to_matlab",
+        mock_send_batch_execution_request,
+    )
+    write_notebook(tmp_path / "in.ipynb", ["x = 1", "error('y')", "z = 3"])
+
+    report = runner.run_notebook(
+        str(tmp_path / "in.ipynb"),
+        str(tmp_path / "out" / "out.ipynb"),
+        "url",
+        {},
+        None,
+        add_kernel_path=True,
+    )
+
+    nb = nbformat.read(str(tmp_path / "out" / "out.ipynb"), as_version=4)
+    nbformat.validate(nb)
+    x, y, z = nb.cells[1:]
+    assert x.execution_count == 1
+    assert [output.output_type for output in x.outputs] == ["stream", "execute_result"]
+    assert x.outputs[1].data == {"text/plain": "url: x = 1"}
+    assert y.execution_count == 2
+    assert z.execution_count is None and z.outputs == []
+
+    assert report["status"] == "error"
+    assert report["cells"] == 3
+    assert report["executed_cells"] == 2
+    assert report["matlab_seconds"] == 1
+
+
+def test_notebooks_run_in_parallel_sessions(MockSessionPoolFixture, tmp_path):
+    """
+    This test checks that the notebooks are spread over the sessions, that the
+    workspace of a session is cleared between two notebooks, and that the
+    executed notebooks and the report are written.
+    """
+    requests_sent = MockSessionPoolFixture
+    for index in range(4):
+        write_notebook(tmp_path / "in" / "sub" / f"nb{index}.ipynb", [f"a = {index}"])
+        write_notebook(tmp_path / "in" / f"nb{index}.ipynb", [f"b = {index}"])
+    write_notebook(tmp_path / "in" / ".ipynb_checkpoints" / "nb0.ipynb", ["c = 0"])
+
+    exit_code = runner.main(
+        [
+            str(tmp_path / "in"),
+            "--output-dir",
+            str(tmp_path / "out"),
+            "--sessions",
+            "2",
+            "--pool-dir",
+            str(tmp_path / "pool"),
+        ]
+    )
+
+    assert exit_code == 0
+    with open(tmp_path / "out" / "report.json") as f:
+        report = json.load(f)
+    assert report["sessions"] == 2
+    assert len(report["notebooks"]) == 8
+    assert all(nb["status"] == "ok" for nb in report["notebooks"])
+    assert (tmp_path / "out" / "sub" / "nb3.ipynb").exists()
+
+    sessions = {url for url, _, _ in requests_sent}
+    assert sessions == {"session-0", "session-1"}
+    for session in sessions:
+        session_requests = [
+            (request, add_kernel_path)
+            for url, request, add_kernel_path in requests_sent
+            if url == session
+        ]
+        # The kernel path is added once, and the workspace is cleared between
+        # two notebooks.
+        assert session_requests[0] == ("execute", True)
+        for previous, current in zip(session_requests, session_requests[1:]):
+            assert previous[0] != current[0]
+            if current[0] == "execute":
+                assert current[1] is False
+
+
+def test_notebooks_fail_when_no_session_starts(
+    monkeypatch, MockSessionPoolFixture, tmp_path
+):
+    """
+    This test checks that the notebooks are reported as failed when MATLAB does
+    not start in any session.
+    """
+
+    def mock_wait_for_matlab(url, headers, session, timeout):
+        raise RuntimeError("MATLAB is not licensed")
+
+    monkeypatch.setattr(runner, "wait_for_matlab", mock_wait_for_matlab)
+    write_notebook(tmp_path / "nb.ipynb", ["a = 1"])
+
+    exit_code = runner.main(
+        [
+            str(tmp_path / "nb.ipynb"),
+            "-o",
+            str(tmp_path / "out"),
+            "--pool-dir",
+            str(tmp_path / "pool"),
+        ]
+    )
+
+    assert exit_code == 1
+    with open(tmp_path / "out" / "report.json") as f:
+        report = json.load(f)
+    assert report["notebooks"][0]["status"] == "failed"
+    assert "not licensed" in report["notebooks"][0]["error"]
+
+
+@pytest.mark.parametrize(
+    "sources, status",
+    [
+        (["error('x')"], "error"),
+        (["x = 1", "error('y')"], "error"),
+        (["x = 1", "y = 2"], "ok"),
+    ],
+)
+def test_run_notebook_status(monkeypatch, tmp_path, sources, status):
+    """
+    This test checks that a notebook is reported as errored when any cell
+    errors, including its last cell.
+    """
+    monkeypatch.setattr(
+        mwi_comm_helpers,
+        "send_batch_execution_request_to_matlab",
+        mock_send_batch_execution_request,
+    )
+    write_notebook(tmp_path / "in.ipynb", sources)
+
+    report = runner.run_notebook(
+        str(tmp_path / "in.ipynb"),
+        str(tmp_path / "out.ipynb"),
+        "url",
+        {},
+        None,
+        add_kernel_path=True,
+    )
+
+    assert report["status"] == status
+    assert report["executed_cells"] == len(sources)
+
+
+def test_dirty_session_is_cleared(monkeypatch, MockSessionPoolFixture, tmp_path):
+    """
+    This test checks that a session left by a kernel which did not clear it is
+    cleared before the first notebook, and that a session is returned to the
+    pool as not cleared after the last notebook.
+    """
+    requests_sent = MockSessionPoolFixture
+    released = []
+
+    def mock_claim(self):
+        return {
+            "id": "session-0",
+            "url": "session-0",
+            "headers": {},
+            "needs_reset": True,
+        }
+
+    monkeypatch.setattr(runner.session_pool.SessionPool, "claim", mock_claim)
+    monkeypatch.setattr(
+        runner.session_pool.SessionPool,
+        "release",
+        lambda self, session, is_reset=True: released.append(is_reset),
+    )
+    write_notebook(tmp_path / "nb.ipynb", ["a = 1"])
+
+    runner.run_notebooks(
+        [str(tmp_path / "nb.ipynb")],
+        [str(tmp_path / "out" / "nb.ipynb")],
+        1,
+        str(tmp_path / "pool"),
+        startup_timeout=1,
+    )
+
+    assert [request for _, request, _ in requests_sent] == ["reset", "execute"]
+    assert released == [False]
+
+
+def test_notebooks_fail_when_sessions_fail(
+    monkeypatch, MockSessionPoolFixture, tmp_path
+):
+    """
+    This test checks that the notebooks are reported as failed when the
+    sessions fail for another reason than MATLAB not starting.
+    """
+
+    def mock_claim(self):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(runner.session_pool.SessionPool, "claim", mock_claim)
+    write_notebook(tmp_path / "nb.ipynb", ["a = 1"])
+
+    reports = runner.run_notebooks(
+        [str(tmp_path / "nb.ipynb")],
+        [str(tmp_path / "out" / "nb.ipynb")],
+        1,
+        str(tmp_path / "pool"),
+        startup_timeout=1,
+    )
+
+    assert reports[0]["status"] == "failed"
+    assert "No space left" in reports[0]["error"]
+
+
+def test_workers_claim_distinct_sessions_from_cold_pool(monkeypatch, tmp_path):
+    """
+    This test checks that the workers are each assigned a different session
+    of an empty pool, as the sessions are claimed one at a time.
+    """
+    executed = []
+
+    class MockProcess:
+        # Use the process id of the test, so that the session is considered alive.
+        pid = os.getpid()
+
+    def mock_send_batch(url, headers, codes, session=None, **kwargs):
+        executed.append(url)
+        return mock_send_batch_execution_request(url, headers, codes, session)
+
+    start_session = session_pool.SessionPool._start_session
+    starting = []
+    concurrent_starts = []
+    started = []
+
+    def mock_start_session(self, **kwargs):
+        # Leave time for a concurrent claim to find the session being started.
+        starting.append(None)
+        concurrent_starts.append(len(starting))
+        time.sleep(0.05)
+        try:
+            session = start_session(self, **kwargs)
+            started.append(session["id"])
+            return session
+        finally:
+            starting.pop()
+
+    monkeypatch.setattr(subprocess, "Popen", lambda *args, **kwargs: MockProcess())
+    monkeypatch.setattr(session_pool.SessionPool, "_start_session", mock_start_session)
+    monkeypatch.setattr(
+        session_pool.SessionPool,
+        "release",
+        lambda self, session, is_reset=True: None,
+    )
+    monkeypatch.setattr(
+        runner, "wait_for_matlab", lambda url, headers, session, timeout: None
+    )
+    monkeypatch.setattr(
+        mwi_comm_helpers, "send_batch_execution_request_to_matlab", mock_send_batch
+    )
+    monkeypatch.setattr(
+        mwi_comm_helpers, "reset_matlab_session", lambda url, headers, session: None
+    )
+    notebooks = []
+    for index in range(6):
+        write_notebook(tmp_path / "in" / f"nb{index}.ipynb", [f"a = {index}"])
+        notebooks.append(str(tmp_path / "in" / f"nb{index}.ipynb"))
+
+    reports = runner.run_notebooks(
+        notebooks,
+        [str(tmp_path / "out" / f"nb{index}.ipynb") for index in range(6)],
+        3,
+        str(tmp_path / "pool"),
+        startup_timeout=1,
+    )
+
+    assert concurrent_starts == [1, 1, 1]
+    assert len(set(started)) == 3
+    assert all(report["status"] == "ok" for report in reports)
+    assert {report["session"] for report in reports} <= set(started)
+    assert len(executed) == 6
@@ -0,0 +1,103 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.scheduler
+import os
+import time
+
+import psutil
+
+from jupyter_matlab_kernel import scheduler
+from jupyter_matlab_kernel.scheduler import (
+    PRIORITY_EXECUTE,
+    PRIORITY_INTERACTIVE,
+    RequestScheduler,
+)
+
+
+def test_one_request_at_a_time(tmp_path):
+    """
+    This test checks that only one request at a time acquires the permission to
+    be sent to MATLAB, and that the queue is empty once requests are released.
+    """
+    first_kernel = RequestScheduler(str(tmp_path))
+    second_kernel = RequestScheduler(str(tmp_path))
+
+    first_ticket = first_kernel.enqueue(PRIORITY_EXECUTE)
+    assert first_kernel.try_acquire(first_ticket) == (True, 0)
+
+    second_ticket = second_kernel.enqueue(PRIORITY_EXECUTE)
+    assert second_kernel.try_acquire(second_ticket) == (False, 1)
+
+    first_kernel.release(first_ticket)
+    assert second_kernel.try_acquire(second_ticket) == (True, 0)
+    second_kernel.release(second_ticket)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_fair_order(tmp_path):
+    """
+    This test checks that interactive requests go ahead of executions, and that
+    executions of kernels which have recently sent fewer requests go first.
+    """
+    busy_kernel = RequestScheduler(str(tmp_path))
+    other_kernel = RequestScheduler(str(tmp_path))
+    for _ in range(3):
+        ticket = busy_kernel.enqueue(PRIORITY_EXECUTE)
+        assert busy_kernel.try_acquire(ticket)[0]
+        busy_kernel.release(ticket)
+
+    busy_ticket = busy_kernel.enqueue(PRIORITY_EXECUTE)
+    other_ticket = other_kernel.enqueue(PRIORITY_EXECUTE)
+    completion_ticket = busy_kernel.enqueue(PRIORITY_INTERACTIVE)
+
+    assert busy_kernel.try_acquire(busy_ticket) == (False, 2)
+    assert other_kernel.try_acquire(other_ticket) == (False, 1)
+    assert busy_kernel.try_acquire(completion_ticket) == (True, 0)
+    busy_kernel.release(completion_ticket)
+
+    assert busy_kernel.try_acquire(busy_ticket)[0] is False
+    assert other_kernel.try_acquire(other_ticket)[0] is True
+    assert busy_kernel.get_recent_count() == 3
+
+
+def test_old_executions_are_not_counted(monkeypatch, tmp_path):
+    """
+    This test checks that executions sent before the fair share window do not
+    queue a kernel behind kernels opened since.
+    """
+    old_kernel = RequestScheduler(str(tmp_path))
+    for _ in range(3):
+        ticket = old_kernel.enqueue(PRIORITY_EXECUTE)
+        assert old_kernel.try_acquire(ticket)[0]
+        old_kernel.release(ticket)
+
+    now = time.monotonic() + scheduler.FAIR_SHARE_WINDOW + 1
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    assert old_kernel.get_recent_count() == 0
+
+    new_kernel = RequestScheduler(str(tmp_path))
+    old_ticket = old_kernel.enqueue(PRIORITY_EXECUTE)
+    new_ticket = new_kernel.enqueue(PRIORITY_EXECUTE)
+    assert new_kernel.try_acquire(new_ticket) == (False, 1)
+    assert old_kernel.try_acquire(old_ticket) == (True, 0)
+    old_kernel.release(old_ticket)
+    new_kernel.release(new_ticket)
+
+
+def test_requests_of_exited_kernels_are_removed(monkeypatch, tmp_path):
+    """
+    This test checks that tickets and permissions left behind by kernels which
+    exited are removed.
+    """
+    dead_pid = 999999
+    (tmp_path / f"1-0000000000-00000000000000000001-{dead_pid}-0.ticket").touch()
+    (tmp_path / "active").write_text(f"{dead_pid}\nticket")
+    monkeypatch.setattr(psutil, "pid_exists", lambda pid: pid != dead_pid)
+
+    kernel = RequestScheduler(str(tmp_path))
+    ticket = kernel.enqueue(PRIORITY_EXECUTE)
+    assert kernel.try_acquire(ticket) == (True, 0)
+    kernel.release(ticket)
+
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,182 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.session_pool
+import multiprocessing
+import os
+import subprocess
+
+import psutil
+import pytest
+
+from jupyter_matlab_kernel import session_pool
+from jupyter_matlab_kernel.session_pool import SessionPool
+
+
+@pytest.fixture
+def launched_commands(monkeypatch):
+    """Replaces the launch of matlab-proxy processes, and records their environment."""
+    launched = []
+
+    class MockProcess:
+        # Use the process id of the test, so that the session is considered alive.
+        pid = os.getpid()
+
+    def mock_popen(command, env, **kwargs):
+        launched.append(env)
+        return MockProcess()
+
+    monkeypatch.setattr(subprocess, "Popen", mock_popen)
+    return launched
+
+
+def test_claim_starts_session_when_pool_is_empty(tmp_path, launched_commands):
+    """
+    This test checks that a session is started and claimed when there are no
+    unclaimed sessions, and that the pool is refilled.
+    """
+    pool = SessionPool(str(tmp_path), 2)
+
+    session = pool.claim()
+    pool.refill()
+
+    assert len(launched_commands) == 3
+    env = launched_commands[0]
+    assert env["MWI_AUTH_TOKEN"] == session["headers"]["mwi-auth-token"]
+    assert session["url"] == f"http://127.0.0.1:{env['MWI_APP_PORT']}/matlab"
+    assert len(pool.get_sessions()) == 3
+    assert len(pool._get_unclaimed_sessions()) == 2
+
+
+def test_claim_reuses_warm_session(tmp_path, launched_commands):
+    """
+    This test checks that kernels claim the oldest unclaimed session, and that
+    a claimed session is not assigned to another kernel.
+    """
+    pool = SessionPool(str(tmp_path), 2)
+    pool.refill()
+    oldest = pool.get_sessions()[0]
+
+    claimed = pool.claim()
+    assert claimed["id"] == oldest["id"]
+    assert claimed["needs_reset"] is False
+    assert pool.claim()["id"] != oldest["id"]
+    assert len(launched_commands) == 2
+
+
+def test_release(tmp_path, launched_commands, monkeypatch):
+    """
+    This test checks that a released session returns to the pool, unless the
+    pool already has enough unclaimed sessions, in which case it is stopped.
+    """
+    terminated = []
+
+    class MockProcess:
+        def __init__(self, pid):
+            self.pid = pid
+
+        def terminate(self):
+            terminated.append(self.pid)
+
+    monkeypatch.setattr(psutil, "Process", MockProcess)
+    pool = SessionPool(str(tmp_path), 1)
+    first = pool.claim()
+    second = pool.claim()
+
+    pool.release(first)
+    assert [session["id"] for session in pool._get_unclaimed_sessions()] == [
+        first["id"]
+    ]
+
+    pool.release(second)
+    assert len(terminated) == 1
+    assert [session["id"] for session in pool.get_sessions()] == [first["id"]]
+
+
+def test_sessions_and_claims_of_exited_processes(
+    tmp_path, launched_commands, monkeypatch
+):
+    """
+    This test checks that sessions whose matlab-proxy exited are forgotten, and
+    that sessions claimed by kernels which exited can be claimed again, once
+    cleared.
+    """
+    pool = SessionPool(str(tmp_path), 0)
+    session = pool.claim()
+    (tmp_path / f"{session['id']}.claim").write_text("999999")
+    monkeypatch.setattr(psutil, "pid_exists", lambda pid: pid != 999999)
+
+    claimed = pool.claim()
+    assert claimed["id"] == session["id"]
+    assert claimed["needs_reset"] is True
+
+    monkeypatch.setattr(psutil, "pid_exists", lambda pid: False)
+    assert pool.get_sessions() == []
+    assert os.listdir(tmp_path) == []
+
+
+def test_sessions_released_without_reset(tmp_path, launched_commands):
+    """
+    This test checks that a session released without being cleared is cleared
+    by the next kernel which claims it, and only by that kernel.
+    """
+    pool = SessionPool(str(tmp_path), 1)
+    session = pool.claim()
+    pool.release(session, is_reset=False)
+
+    assert pool.claim()["needs_reset"] is True
+    pool.release(session)
+    assert pool.claim()["needs_reset"] is False
+
+
+def test_start_session_requires_auth_token_support(
+    tmp_path, launched_commands, monkeypatch
+):
+    """
+    This test checks that sessions are not started without a token, when the
+    installed matlab-proxy does not support token authentication.
+    """
+    from matlab_proxy.util.mwi import environment_variables as mwi_env
+
+    monkeypatch.delattr(mwi_env, "get_env_name_mwi_auth_token")
+    pool = SessionPool(str(tmp_path), 1)
+
+    with pytest.raises(RuntimeError, match="token authentication"):
+        pool.claim()
+    assert launched_commands == []
+
+
+def _claim_sessions(pool_dir, count, barrier, claimed, done):
+    # Claims sessions from a separate process, which holds its claims until the
+    # test is done.
+    pool = SessionPool(pool_dir, 0)
+    barrier.wait()
+    claimed.put([pool.claim()["id"] for _ in range(count)])
+    done.wait()
+
+
+def test_concurrent_claims_on_cold_pool(tmp_path, launched_commands):
+    """
+    This test checks that kernels which claim sessions at the same time from an
+    empty pool are never assigned the same session.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("The mocked launch of matlab-proxy requires forked processes")
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(2)
+    claimed = context.Queue()
+    done = context.Event()
+    processes = [
+        context.Process(
+            target=_claim_sessions, args=(str(tmp_path), 100, barrier, claimed, done)
+        )
+        for _ in range(2)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        ids = claimed.get(timeout=30) + claimed.get(timeout=30)
+    finally:
+        done.set()
+        for process in processes:
+            process.join(timeout=30)
+    assert len(set(ids)) == len(ids) == 200
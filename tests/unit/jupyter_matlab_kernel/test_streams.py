@@ -0,0 +1,90 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.streams
+from jupyter_matlab_kernel import streams
+from jupyter_matlab_kernel.streams import StreamCoalescer
+
+
+def test_create_stream_coalescer(monkeypatch, tmp_path):
+    """
+    This test checks that the limits of the stream coalescer are read from the
+    environment variables.
+    """
+    coalescer = streams.create_stream_coalescer()
+    assert coalescer.max_output_size == streams.DEFAULT_MAX_STREAM_OUTPUT
+    assert coalescer.flush_interval == 0.1
+    assert coalescer.overflow_dir is None
+
+    monkeypatch.setenv("MWI_KERNEL_MAX_STREAM_OUTPUT", "0")
+    monkeypatch.setenv("MWI_KERNEL_STREAM_FLUSH_INTERVAL", "250")
+    monkeypatch.setenv("MWI_KERNEL_STREAM_OVERFLOW_DIR", str(tmp_path))
+    coalescer = streams.create_stream_coalescer()
+    assert coalescer.max_output_size == 0
+    assert coalescer.flush_interval == 0.25
+    assert coalescer.overflow_dir == str(tmp_path)
+
+
+def test_consecutive_outputs_are_merged():
+    """
+    This test checks that consecutive outputs of the same stream are published
+    as a single message, and that the order of the streams is preserved.
+    """
+    coalescer = StreamCoalescer(flush_interval=60)
+    messages = []
+    for idx in range(1000):
+        messages += coalescer.write("stdout", f"{idx}\n")
+    messages += coalescer.write("stderr", "error\n")
+    messages += coalescer.write("stdout", "done\n")
+    messages += coalescer.flush(final=True)
+
+    # The first output is published immediately.
+    assert messages == [
+        ("stdout", "0\n"),
+        ("stdout", "".join(f"{idx}\n" for idx in range(1, 1000))),
+        ("stderr", "error\n"),
+        ("stdout", "done\n"),
+    ]
+
+
+def test_outputs_are_published_after_flush_interval(monkeypatch):
+    """
+    This test checks that buffered outputs are published once the flush interval
+    has elapsed since the last message.
+    """
+    now = [0.0]
+    monkeypatch.setattr(streams.time, "monotonic", lambda: now[0])
+    coalescer = StreamCoalescer(flush_interval=0.1)
+
+    assert coalescer.write("stdout", "a") == [("stdout", "a")]
+    assert coalescer.write("stdout", "b") == []
+    now[0] = 0.05
+    assert coalescer.flush_due() == []
+    now[0] = 0.2
+    assert coalescer.flush_due() == [("stdout", "b")]
+
+
+def test_outputs_beyond_limit_are_suppressed(tmp_path):
+    """
+    This test checks that the outputs of a cell beyond the limit are suppressed,
+    summarized once the cell is executed and written to a file.
+    """
+    coalescer = StreamCoalescer(
+        max_output_size=10, flush_interval=60, overflow_dir=str(tmp_path)
+    )
+    messages = []
+    for _ in range(5):
+        messages += coalescer.write("stdout", "line\n")
+    messages += coalescer.flush(final=True)
+
+    assert messages[:2] == [("stdout", "line\n"), ("stdout", "line\n")]
+    assert messages[2][0] == "stderr"
+    assert "3 line(s) of output suppressed" in messages[2][1]
+    assert coalescer.overflow_file in messages[2][1]
+    with open(coalescer.overflow_file) as f:
+        assert f.read() == "line\n" * 3
+
+    # The limit applies to each cell, and the first output of a cell is
+    # published immediately.
+    coalescer.reset()
+    assert coalescer.write("stdout", "line\n") == [("stdout", "line\n")]
+    assert coalescer.flush(final=True) == []
@@ -0,0 +1,81 @@
+# Copyright 2023 The MathWorks, Inc.
+
+# This file contains tests for jupyter_matlab_kernel.workspace_cache
+import pytest
+
+from jupyter_matlab_kernel.workspace_cache import WorkspaceCache, get_name_at_cursor
+
+
+@pytest.mark.parametrize(
+    "code, cursor_pos, name",
+    [
+        ("plot(x)", 0, "plot"),
+        ("plot(x)", 4, "plot"),
+        ("plot(x)", 6, "x"),
+        ("y = s.field + 1", 7, "s.field"),
+        ("matlab.io.datastore", 19, "matlab.io.datastore"),
+        ("a + b", 2, None),
+        ("", 0, None),
+    ],
+)
+def test_get_name_at_cursor(code, cursor_pos, name):
+    """
+    This test checks that the name under the cursor, or right before it, is
+    inspected.
+    """
+    assert get_name_at_cursor(code, cursor_pos) == name
+
+
+def test_apply_workspace_changes():
+    """
+    This test checks that the variables follow the changes received from
+    MATLAB, and that a reset replaces all the variables.
+    """
+    cache = WorkspaceCache()
+    assert not cache.is_synced
+
+    x = {"name": "x", "class": "double", "size": "1x1", "bytes": 8}
+    y = {"name": "y", "class": "char", "size": "1x5", "bytes": 10}
+    cache.apply({"reset": True, "changed": [x, y], "removed": []})
+    assert cache.is_synced
+    assert set(cache.variables) == {"x", "y"}
+
+    cache.apply({"reset": False, "changed": [], "removed": ["y"]})
+    assert set(cache.variables) == {"x"}
+
+    cache.invalidate()
+    assert not cache.is_synced
+    cache.apply({"reset": True, "changed": y, "removed": []})
+    assert set(cache.variables) == {"y"}
+    assert cache.describe_variable("y") == "y: 1x5 char\nBytes: 10"
+    assert cache.describe_variable("x") is None
+
+
+def test_help_cache_is_bounded():
+    """
+    This test checks that the least recently used help texts are evicted.
+    """
+    cache = WorkspaceCache(max_help_size=2)
+    cache.put_help("plot", "plot help")
+    cache.put_help("disp", "disp help")
+    assert cache.get_help("plot") == "plot help"
+    cache.put_help("sum", "sum help")
+
+    assert cache.get_help("disp") is None
+    assert cache.get_help("plot") == "plot help"
+    assert cache.get_help("sum") == "sum help"
+
+
+def test_missing_help_is_cached_until_execution():
+    """
+    This test checks that names which MATLAB has no help for are cached, and
+    forgotten once code is executed, while help texts are kept.
+    """
+    cache = WorkspaceCache(max_help_size=2)
+    cache.put_help("plot", "plot help")
+    cache.put_help("unknown", "")
+    assert cache.get_help("unknown") == ""
+
+    cache.forget_missing_help()
+    assert cache.get_help("unknown") is None
+    assert cache.get_help("plot") == "plot help"